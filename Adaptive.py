@@ -0,0 +1,248 @@
+"""
+自適應細分取樣：先解一個粗網格 (各軸的點數取自 params 的 N)，再只細分變化劇烈的 cell。
+  - 每個 cell 解中心點，與角點的多線性內插比較 8 個偏振通道的穿透率差與相位差
+    (比較複數穿透係數的相位，不受 2π 折返影響)
+  - 超過容許值的 cell 切成 2^R 個子 cell (R 為有多個數值的掃描軸數)，直到 max_level 或點數預算用完
+所有點都落在最細層的格點 (lattice) 上：第 d 軸有 (N_d - 1) * 2^max_level + 1 個格點。
+結果是 scattered 資料集 (Scattered)，另外保存格點座標 (lattice_tensor) 與葉節點 cell (leaf_tensor)，
+AdaptiveInterpolator 以葉節點 cell 的角點做多線性內插。
+"""
+import itertools
+
+import numpy as np
+
+from Jones import channel_amplitudes
+from Scattered import scattered_data_sheet
+from SweepEngine import SweepEngine
+
+# 預設容許值：穿透率差與相位差 (rad)
+TRANSMISSION_TOL = 0.01
+PHASE_TOL = 0.05
+# 兩邊的振幅平方都低於此值時相位沒有意義，不列入相位差
+TRANSMISSION_FLOOR = 1e-3
+MAX_LEVEL = 4
+
+
+def _corner_offsets(dims):
+    """{0, 1}^dims 的所有組合，shape (2^dims, dims)。"""
+    return np.array(list(itertools.product((0, 1), repeat=dims)), dtype=np.int64).reshape(-1, dims)
+
+
+def cell_error(center, corners, transmission_tol=TRANSMISSION_TOL, phase_tol=PHASE_TOL):
+    """
+    center: (K, 2, 2) 中心點的 Jones 矩陣；corners: (K, 2^R, 2, 2) 角點。
+    回傳 (K,) 的相對誤差 (> 1 代表需要細分)；有 NaN (幾何無效) 的 cell 為 0，不細分。
+    """
+    t_center = channel_amplitudes(center)
+    t_interp = channel_amplitudes(corners.mean(axis=1))
+    transmission_error = np.abs(np.abs(t_center)**2 - np.abs(t_interp)**2)
+    phase_error = np.abs(np.angle(t_center * np.conj(t_interp)))
+    meaningful = np.minimum(np.abs(t_center), np.abs(t_interp))**2 >= TRANSMISSION_FLOOR
+    phase_error = np.where(meaningful, phase_error, 0.)
+    error = np.maximum(transmission_error / transmission_tol, phase_error / phase_tol).max(axis=-1)
+    return np.nan_to_num(error, nan=0.)
+
+
+class AdaptiveSweep:
+    """
+    params 與 SweepEngine 相同 (各軸的 min / max / N，N 為粗網格的點數)，
+    其餘的 engine_kwargs (cache、workers、dtype、symmetry …) 直接交給內部的 SweepEngine 求解。
+    """
+    def __init__(self, params, transmission_tol=TRANSMISSION_TOL, phase_tol=PHASE_TOL,
+                 max_level=MAX_LEVEL, max_points=None, **engine_kwargs):
+        self.engine = SweepEngine(params, **engine_kwargs)
+        self.axes = self.engine.axes
+        self.refine_dims = [d for d, axis in enumerate(self.axes) if len(axis.values) > 1]
+        if not self.refine_dims:
+            raise ValueError("自適應取樣至少需要一個掃描軸有兩個以上的數值")
+        if any(len(axis.values) == 0 for axis in self.axes):
+            raise ValueError("每個掃描軸至少需要一個數值")
+        self.transmission_tol = transmission_tol
+        self.phase_tol = phase_tol
+        self.max_level = int(max_level)
+        self.max_points = max_points
+        self.coarse = np.array([len(self.axes[d].values) for d in self.refine_dims], dtype=np.int64)
+        self.fine = (self.coarse - 1) * 2**self.max_level + 1
+        self.points = {}
+        self.jones = []
+
+    def lattice_values(self, lattice):
+        """(M, R) 格點座標 -> (M, D) 各軸數值。"""
+        lattice = np.asarray(lattice, dtype=float)
+        values = np.empty((len(lattice), len(self.axes)))
+        for d, axis in enumerate(self.axes):
+            values[:, d] = axis.values[0]
+        for r, d in enumerate(self.refine_dims):
+            low, high = self.axes[d].values[0], self.axes[d].values[-1]
+            values[:, d] = low + (high - low) * lattice[:, r] / (self.fine[r] - 1)
+        return values
+
+    def solve(self, lattice, pool, on_point=None):
+        """解尚未解過的格點，回傳 False 代表中止。"""
+        missing = [point for point in dict.fromkeys(map(tuple, np.asarray(lattice).tolist()))
+                   if point not in self.points]
+        values = self.lattice_values(np.array(missing, dtype=np.int64).reshape(-1, len(self.refine_dims)))
+        batch_size = self.engine.batch_size
+        for start in range(0, len(missing), batch_size):
+            stop = min(start + batch_size, len(missing))
+            kwargs_list = []
+            for row in values[start:stop]:
+                kwargs = dict(self.engine.fixed_kwargs)
+                kwargs.update({axis.param: value for axis, value in zip(self.axes, row)})
+                kwargs_list.append(kwargs)
+            jones = self.engine.solve_many(kwargs_list, pool)
+            for point, result in zip(missing[start:stop], jones):
+                self.points[point] = len(self.jones)
+                self.jones.append(result)
+            if on_point is not None and on_point(len(self.jones), self.budget) is False:
+                return False
+        return True
+
+    @property
+    def budget(self):
+        return self.max_points or int(np.prod(self.fine))
+
+    def lookup(self, lattice):
+        """(..., R) 格點座標 -> (..., 2, 2) Jones 矩陣。"""
+        shape = lattice.shape[:-1]
+        rows = [self.points[point] for point in map(tuple, lattice.reshape(-1, lattice.shape[-1]).tolist())]
+        return np.asarray(self.jones)[rows].reshape(shape + (2, 2))
+
+    def run(self, on_point=None):
+        """
+        執行自適應取樣，回傳 scattered data_sheet；on_point(done, budget) 回傳 False 時中止並回傳 None。
+        """
+        dims = len(self.refine_dims)
+        offsets = _corner_offsets(dims)
+        step = 2**self.max_level
+        self.engine.reset_representatives()
+        with self.engine.worker_pool() as pool:
+            coarse = np.array(list(itertools.product(*[range(n) for n in self.coarse])), dtype=np.int64) * step
+            if not self.solve(coarse, pool, on_point):
+                return None
+            cells = np.array(list(itertools.product(*[range(n - 1) for n in self.coarse])), dtype=np.int64)
+            cells = cells.reshape(-1, dims)
+            leaves = []
+            for level in range(self.max_level + 1):
+                if len(cells) == 0:
+                    break
+                remaining = self.budget - len(self.jones)
+                if level == self.max_level or len(cells) > remaining:
+                    leaves.append((level, cells))
+                    break
+                size = 2**(self.max_level - level)
+                lower = cells * size
+                centers = lower + size // 2
+                if not self.solve(centers, pool, on_point):
+                    return None
+                corners = lower[:, None, :] + offsets[None] * size
+                error = cell_error(self.lookup(centers), self.lookup(corners), self.transmission_tol, self.phase_tol)
+                # 子 cell 的角點：{0, size/2, size}^R
+                grid = np.array(list(itertools.product((0, 1, 2), repeat=dims)), dtype=np.int64) * (size // 2)
+                refine = self.select(lower, grid, error)
+                leaves.append((level, cells[~refine]))
+                if refine.any():
+                    new_points = (lower[refine][:, None, :] + grid[None]).reshape(-1, dims)
+                    if not self.solve(new_points, pool, on_point):
+                        return None
+                cells = (cells[refine][:, None, :] * 2 + offsets[None]).reshape(-1, dims)
+        return self.data_sheet(leaves)
+
+    def select(self, lower, grid, error):
+        """要細分的 cell：誤差 > 1 者依誤差由大到小，直到新增的點數超過剩下的預算。"""
+        remaining = self.budget - len(self.jones)
+        needed = set()
+        selected = np.zeros(len(lower), dtype=bool)
+        for i in np.argsort(-error):
+            if error[i] <= 1.:
+                break
+            new = {point for point in map(tuple, (lower[i] + grid).tolist())
+                   if point not in self.points and point not in needed}
+            if len(needed) + len(new) > remaining:
+                break
+            needed |= new
+            selected[i] = True
+        return selected
+
+    def data_sheet(self, leaves):
+        lattice = np.array(list(self.points), dtype=np.int64).reshape(-1, len(self.refine_dims))
+        samples = self.lattice_values(lattice)
+        display_axes = list(self.axes)
+        for r, d in enumerate(self.refine_dims):
+            axis = self.axes[d]
+            display_axes[d] = axis._replace(values=np.linspace(axis.values[0], axis.values[-1], int(self.fine[r])))
+        leaf_rows = [np.column_stack([np.full(len(cells), level), cells]) for level, cells in leaves if len(cells)]
+        leaf_tensor = np.concatenate(leaf_rows).astype(np.int32) if leaf_rows else np.zeros((0, 1 + len(self.refine_dims)), np.int32)
+        return scattered_data_sheet(
+            self.engine.shape_type, display_axes, self.engine.fixed_kwargs, samples, np.asarray(self.jones),
+            Sampling="adaptive",
+            Lattice={"coarse": self.coarse.tolist(), "max_level": self.max_level, "refine_dims": self.refine_dims},
+            Tolerance={"transmission": self.transmission_tol, "phase": self.phase_tol},
+            lattice_tensor=lattice.astype(np.int32),
+            leaf_tensor=leaf_tensor,
+        )
+
+
+class AdaptiveInterpolator:
+    """
+    自適應資料集的內插：找到查詢點所在的葉節點 cell，以其 2^R 個角點做多線性內插 (複數 Jones 矩陣)。
+    """
+    def __init__(self, bounds, coarse, max_level, refine_dims, lattice, jones, leaves):
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.coarse = np.asarray(coarse, dtype=np.int64)
+        self.max_level = int(max_level)
+        self.refine_dims = list(refine_dims)
+        self.fine = (self.coarse - 1) * 2**self.max_level + 1
+        lattice = np.asarray(lattice, dtype=np.int64)
+        codes = np.ravel_multi_index(tuple(lattice.T), tuple(self.fine))
+        order = np.argsort(codes)
+        self.codes = codes[order]
+        self.jones = np.asarray(jones)[order]
+        leaves = np.asarray(leaves, dtype=np.int64)
+        self.leaf_codes = []
+        for level in range(self.max_level + 1):
+            cells = leaves[leaves[:, 0] == level, 1:]
+            counts = (self.coarse - 1) * 2**level
+            self.leaf_codes.append(np.sort(np.ravel_multi_index(tuple(cells.T), tuple(counts))))
+        self.offsets = _corner_offsets(len(self.refine_dims))
+
+    @classmethod
+    def from_data_sheet(cls, data_sheet):
+        from SweepEngine import data_sheet_axes
+        lattice_info = data_sheet["Lattice"]
+        axes = data_sheet_axes(data_sheet)
+        bounds = [(axes[d].values[0], axes[d].values[-1]) for d in lattice_info["refine_dims"]]
+        return cls(bounds, lattice_info["coarse"], lattice_info["max_level"], lattice_info["refine_dims"],
+                   np.asarray(data_sheet["lattice_tensor"]), np.asarray(data_sheet["jones_tensor"]),
+                   np.asarray(data_sheet["leaf_tensor"]))
+
+    def __call__(self, points):
+        """points: (M, D) 各軸數值 (範圍外的點夾到邊界)，回傳 (M, 2, 2) complex64。"""
+        points = np.asarray(points, dtype=float)
+        low, high = self.bounds[:, 0], self.bounds[:, 1]
+        position = (points[:, self.refine_dims] - low) / (high - low) * (self.fine - 1)
+        position = np.clip(position, 0, self.fine - 1)
+        level_of = np.full(len(points), -1)
+        cell_of = np.zeros(position.shape, dtype=np.int64)
+        for level in range(self.max_level + 1):
+            todo = np.flatnonzero(level_of < 0)
+            if len(todo) == 0:
+                break
+            size = 2**(self.max_level - level)
+            counts = (self.coarse - 1) * 2**level
+            cells = np.minimum(np.floor(position[todo] / size).astype(np.int64), counts - 1)
+            found = np.isin(np.ravel_multi_index(tuple(cells.T), tuple(counts)), self.leaf_codes[level])
+            level_of[todo[found]] = level
+            cell_of[todo[found]] = cells[found]
+        if (level_of < 0).any():
+            raise ValueError("查詢點不在任何葉節點 cell 中，資料集的細分樹不完整")
+        size = (2**(self.max_level - level_of))[:, None]
+        lower = cell_of * size
+        local = (position - lower) / size
+        out = np.zeros((len(points), 2, 2), dtype=np.complex128)
+        for offset in self.offsets:
+            corner = lower + offset * size
+            rows = np.searchsorted(self.codes, np.ravel_multi_index(tuple(corner.T), tuple(self.fine)))
+            weight = np.prod(np.where(offset, local, 1. - local), axis=1)
+            out += weight[:, None, None] * self.jones[rows]
+        return out.astype(np.complex64)
@@ -0,0 +1,84 @@
+import os
+import time
+import json
+import hashlib
+import numpy as np
+
+
+def sweep_signature(engine):
+    """
+    以掃描的完整定義 (非掃描參數 + 每個軸的數值) 算出 sha256，
+    用來確認 checkpoint 與目前的掃描是同一個。
+    """
+    definition = {
+        name: str(value) for name, value in engine.fixed_kwargs.items() if name != "device"
+    }
+    definition["axes"] = {axis.key: np.asarray(axis.values).tolist() for axis in engine.axes}
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode()).hexdigest()
+
+
+class Checkpoint:
+    """
+    掃描進度的定期存檔：
+      - completed : 每個點是否已算完的 bitmap (np.packbits)
+      - 已算完部分的 Jones 矩陣 (結果在磁碟 memmap 上時只需 flush，不另存一份)
+    每 every_points 個點或 every_seconds 秒寫一次，先寫暫存檔再以 os.replace 原子性地取代。
+    """
+    def __init__(self, file_path, every_points=500, every_seconds=300.):
+        self.file_path = file_path
+        self.every_points = every_points
+        self.every_seconds = every_seconds
+        self.points_since_save = 0
+        self.last_save_time = time.monotonic()
+
+    def exists(self):
+        return os.path.exists(self.file_path)
+
+    def load(self, engine):
+        """
+        讀取 checkpoint；若與 engine 的掃描定義不同則回傳 None，
+        否則回傳 (completed, jones)；結果存在 memmap 時 jones 為 None。
+        """
+        with np.load(self.file_path) as data:
+            if str(data["signature"]) != sweep_signature(engine):
+                return None
+            completed = np.unpackbits(data["completed"], count=engine.total).astype(bool)
+            if "jones" not in data:
+                return completed, None
+            return completed, data["jones"]
+
+    def tick(self, points=1):
+        self.points_since_save += points
+
+    def due(self):
+        """是否到了該存檔的時候。"""
+        if self.points_since_save <= 0:
+            return False
+        return (self.points_since_save >= self.every_points or
+                time.monotonic() - self.last_save_time >= self.every_seconds)
+
+    def save(self, engine, completed, store):
+        arrays = {}
+        if store.on_disk:
+            # bitmap 必須在結果落地之後才寫
+            store.flush()
+        else:
+            arrays = {"jones": store.jones}
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                signature=np.array(sweep_signature(engine)),
+                completed=np.packbits(completed),
+                **arrays
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.file_path)
+        self.points_since_save = 0
+        self.last_save_time = time.monotonic()
+
+    def clear(self):
+        """掃描完成後刪除 checkpoint。"""
+        if self.exists():
+            os.remove(self.file_path)
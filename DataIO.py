@@ -0,0 +1,428 @@
+import os
+import bz2
+import json
+import lzma
+import time
+import zlib
+import itertools
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from Jones import jones_to_channels, normalize_key
+
+# ============== 分塊資料集格式 (.rcwad) ==============
+# 檔案結構：MAGIC | chunk 0 | chunk 1 | ... | footer (JSON) | footer 長度 (8 bytes, little endian)
+# footer 記錄 data_sheet 的非陣列欄位 (shape_type、各軸數值、Parameters...)，
+# 以及每個 *_tensor 陣列的 shape / dtype / chunk shape / codec 與每個 chunk 的位置、CRC32。
+# 讀取時只解碼被切片到的 chunk，並先檢查 CRC32。
+MAGIC = b"RCWAD1\n"
+DATASET_EXTENSION = ".rcwad"
+
+# codec -> (encode(data, level), decode(data))；zlib level 1 最快，lzma 壓縮率最高但最慢
+CODECS = {
+    "none": (lambda data, level: data, lambda data: data),
+    "zlib": (lambda data, level: zlib.compress(data, level), zlib.decompress),
+    "bz2": (lambda data, level: bz2.compress(data, level), bz2.decompress),
+    "lzma": (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+
+
+def parse_codec(codec):
+    """'zlib:6' -> ('zlib', 6)；未指定 level 時 zlib 用 1、bz2 / lzma 用 6。"""
+    name, _, level = codec.partition(":")
+    if name not in CODECS:
+        raise ValueError(f"未知的 codec: {name}，可用的有 {list(CODECS)}")
+    if level:
+        return name, int(level)
+    return name, {"none": 0, "zlib": 1}.get(name, 6)
+
+
+def parse_lossy(codec):
+    """'q16+zlib:6' -> (16, 'zlib:6')；沒有 q 前綴時為 (None, codec)。"""
+    if codec.startswith("q") and "+" in codec:
+        bits, _, codec = codec.partition("+")
+        bits = int(bits[1:])
+        if not 2 <= bits <= 16:
+            raise ValueError("量化位元數必須介於 2 ~ 16")
+        return bits, codec
+    return None, codec
+
+
+# ============== 有誤差上限的有損壓縮 (複數陣列) ==============
+# 振幅量化成 [0, amp_max] 上的 2**bits - 1 階 (最高一階保留給 NaN，即幾何無效的點)、相位量化成 [-pi, pi) 上的 2**bits 階，
+# 保證 |振幅誤差| <= amp_max / (2 * (2**bits - 2))、|相位誤差| <= pi / 2**bits。
+# 量化後沿 chunk 中變化最快的掃描軸做差分 (uint16 環繞運算)，平滑的資料差分後多半接近 0，再交給 codec 壓縮。
+def _amp_levels(bits):
+    return 2**bits - 2
+
+
+def quantize_chunk(data, bits, amp_max, delta_axis):
+    levels = 2**bits
+    top = _amp_levels(bits)
+    magnitude = np.abs(data)
+    invalid = np.isnan(magnitude)
+    amplitude = np.rint(np.where(invalid, 0., magnitude) / amp_max * top) if amp_max > 0 else np.zeros(data.shape)
+    amplitude[invalid] = levels - 1
+    phase = np.rint((np.where(invalid, 0., np.angle(data)) + np.pi) / (2 * np.pi) * levels) % levels
+    q = np.stack([amplitude, phase]).astype(np.uint16)
+    return np.diff(q, axis=delta_axis + 1, prepend=np.zeros_like(np.take(q, [0], axis=delta_axis + 1)))
+
+
+def dequantize_chunk(q, bits, amp_max, delta_axis, dtype):
+    levels = 2**bits
+    q = np.cumsum(q, axis=delta_axis + 1, dtype=np.uint16)
+    amplitude = q[0].astype(np.float64) * (amp_max / _amp_levels(bits))
+    amplitude[q[0] == levels - 1] = np.nan
+    phase = q[1].astype(np.float64) * (2 * np.pi / levels) - np.pi
+    return (amplitude * np.exp(1j * phase)).astype(dtype)
+
+
+def error_bounds(bits, amp_max):
+    """量化後的 (最大振幅誤差, 最大相位誤差 rad)。"""
+    return amp_max / (2 * _amp_levels(bits)), np.pi / 2**bits
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: _to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    return value
+
+
+def default_chunks(shape, itemsize, sweep_dims, chunk_bytes=1 << 20):
+    """
+    沿掃描維度切塊：反覆把最大的掃描維度減半，直到一個 chunk 不超過 chunk_bytes。
+    sweep_dims 之後的維度 (例如 Jones 的 2x2) 不切。
+    """
+    chunks = list(shape)
+    while int(np.prod(chunks)) * itemsize > chunk_bytes:
+        d = int(np.argmax(chunks[:sweep_dims]))
+        if chunks[d] <= 1:
+            break
+        chunks[d] = (chunks[d] + 1) // 2
+    return [max(1, c) for c in chunks]
+
+
+def _chunk_slices(shape, chunks):
+    grid = [range(0, n, c) for n, c in zip(shape, chunks)]
+    for starts in itertools.product(*grid):
+        yield tuple(slice(s, min(s + c, n)) for s, c, n in zip(starts, chunks, shape))
+
+
+def tensor_keys(data_sheet):
+    return [key for key in data_sheet if key.endswith("_tensor")]
+
+
+class DatasetWriter:
+    """
+    把 data_sheet 寫成分塊資料集。陣列逐 chunk 讀取、以 workers 條執行緒壓縮後依序寫出，
+    來源是 memmap 或 ChunkedArray 時不需要整份載入記憶體。
+    start() 在背景執行緒中寫檔，可由 progress / done / error 查詢狀態；run() 則同步執行。
+    寫完後 verify=True 會重新讀回每個 chunk 比對 CRC32。
+    codec 加上 q<bits>+ 前綴 (例如 "q16+zlib:6") 時，複數陣列以有誤差上限的量化方式儲存。
+    """
+    def __init__(self, file_path, data_sheet, codec="zlib", chunk_bytes=1 << 20, workers=4, verify=True):
+        self.file_path = file_path
+        self.data_sheet = data_sheet
+        self.quantize_bits, codec = parse_lossy(codec)
+        self.codec, self.level = parse_codec(codec)
+        self.chunk_bytes = chunk_bytes
+        self.workers = workers
+        self.verify = verify
+        self.bytes_raw = 0
+        self.bytes_written = 0
+        self.chunks_done = 0
+        self.chunks_total = 0
+        self.elapsed = 0.
+        self.done = False
+        self.error = None
+        self.thread = None
+        self.error_bounds = {}
+
+    @property
+    def progress(self):
+        return self.chunks_done / self.chunks_total if self.chunks_total else 0.
+
+    def stats(self):
+        mb = self.bytes_written / 2**20
+        ratio = self.bytes_raw / self.bytes_written if self.bytes_written else 0.
+        speed = self.bytes_raw / 2**20 / self.elapsed if self.elapsed > 0 else 0.
+        text = (f"{self.file_path}: {mb:.1f} MB written ({self.codec}:{self.level}, ratio {ratio:.2f}x), "
+                f"{self.elapsed:.2f} s, {speed:.1f} MB/s")
+        for key, (amp_error, phase_error) in self.error_bounds.items():
+            text += f"\n  {key}: q{self.quantize_bits}, max amplitude error {amp_error:.2e}, max phase error {phase_error:.2e} rad"
+        return text
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run_safely, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run_safely(self):
+        try:
+            self.run()
+        except Exception as e:
+            self.error = e
+            self.done = True
+
+    def _plan(self):
+        data_sheet = self.data_sheet
+        sweep_dims = len(data_sheet.get("Dimension_name", [])) or None
+        if data_sheet.get("Layout") == "scattered":
+            # scattered 資料集 (Scattered) 的陣列以取樣點為第一維
+            sweep_dims = 1
+        plan = []
+        for key in tensor_keys(data_sheet):
+            array = data_sheet[key]
+            dtype = np.dtype(array.dtype)
+            shape = tuple(array.shape)
+            chunks = default_chunks(shape, dtype.itemsize, sweep_dims or len(shape), self.chunk_bytes)
+            quantize = None
+            if self.quantize_bits is not None and dtype.kind == "c":
+                # 先掃過一次求振幅上限 (逐 chunk 讀取，略過 NaN)
+                amp_max = max(
+                    float(np.fmax.reduce(np.abs(np.asarray(array[slices])), axis=None, initial=0.))
+                    for slices in _chunk_slices(shape, chunks)
+                )
+                amp_error, phase_error = error_bounds(self.quantize_bits, amp_max)
+                self.error_bounds[key] = (amp_error, phase_error)
+                quantize = {
+                    "bits": self.quantize_bits, "amp_max": amp_max,
+                    "delta_axis": (sweep_dims or 1) - 1,
+                    "amp_error": amp_error, "phase_error": phase_error,
+                }
+            plan.append((key, array, dtype, shape, chunks, quantize))
+            self.chunks_total += int(np.prod([-(-n // c) for n, c in zip(shape, chunks)]))
+        return plan
+
+    def run(self):
+        start = time.perf_counter()
+        encode, _ = CODECS[self.codec]
+        data_sheet = self.data_sheet
+        footer = {
+            "attributes": {k: _to_json(v) for k, v in data_sheet.items() if k not in tensor_keys(data_sheet)},
+            "arrays": {},
+        }
+
+        def encode_chunk(array, dtype, slices, quantize):
+            data = np.ascontiguousarray(np.asarray(array[slices]), dtype=dtype)
+            raw_length = data.nbytes
+            if quantize is not None:
+                data = quantize_chunk(data, quantize["bits"], quantize["amp_max"], quantize["delta_axis"])
+            raw = data.tobytes()
+            blob = encode(raw, self.level)
+            return raw_length, blob, zlib.crc32(blob)
+
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, "wb") as f, ThreadPoolExecutor(self.workers) as executor:
+            f.write(MAGIC)
+            for key, array, dtype, shape, chunks, quantize in self._plan():
+                index = {}
+                pending = deque()
+
+                def write_next():
+                    name, future = pending.popleft()
+                    raw_length, blob, crc = future.result()
+                    index[name] = [f.tell(), len(blob), crc]
+                    f.write(blob)
+                    self.bytes_raw += raw_length
+                    self.bytes_written += len(blob)
+                    self.chunks_done += 1
+
+                # 最多同時壓縮 2 * workers 個 chunk，避免整份資料排隊在記憶體中
+                for slices in _chunk_slices(shape, chunks):
+                    name = ".".join(str(s.start // c) for s, c in zip(slices, chunks))
+                    pending.append((name, executor.submit(encode_chunk, array, dtype, slices, quantize)))
+                    if len(pending) >= 2 * self.workers:
+                        write_next()
+                while pending:
+                    write_next()
+                footer["arrays"][key] = {
+                    "shape": list(shape), "dtype": dtype.str, "chunks": chunks,
+                    "codec": self.codec, "index": index,
+                }
+                if quantize is not None:
+                    footer["arrays"][key]["quantize"] = quantize
+            footer_bytes = json.dumps(footer).encode()
+            f.write(footer_bytes)
+            f.write(len(footer_bytes).to_bytes(8, "little"))
+            self.bytes_written += len(MAGIC) + len(footer_bytes) + 8
+            f.flush()
+            os.fsync(f.fileno())
+        if self.verify:
+            verify_dataset(tmp_path)
+        os.replace(tmp_path, self.file_path)
+        self.elapsed = time.perf_counter() - start
+        self.done = True
+        print(f"Dataset saved to {self.stats()}")
+        return self.file_path
+
+
+def write_dataset(file_path, data_sheet, codec="zlib", chunk_bytes=1 << 20, workers=4, verify=True):
+    """同步寫出分塊資料集 (見 DatasetWriter)。"""
+    return DatasetWriter(file_path, data_sheet, codec=codec, chunk_bytes=chunk_bytes,
+                         workers=workers, verify=verify).run()
+
+
+def read_footer(file_path):
+    with open(file_path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{file_path} 不是 RCWA 分塊資料集")
+        f.seek(-8, os.SEEK_END)
+        footer_length = int.from_bytes(f.read(8), "little")
+        f.seek(-8 - footer_length, os.SEEK_END)
+        return json.loads(f.read(footer_length))
+
+
+def verify_dataset(file_path):
+    """重新讀回每個 chunk 並比對 CRC32，不符時丟出 IOError。"""
+    footer = read_footer(file_path)
+    with open(file_path, "rb") as f:
+        for key, info in footer["arrays"].items():
+            for name, entry in info["index"].items():
+                if len(entry) < 3:
+                    continue
+                offset, length, crc = entry
+                f.seek(offset)
+                if zlib.crc32(f.read(length)) != crc:
+                    raise IOError(f"{file_path}: {key} chunk {name} CRC32 不符")
+
+
+class ChunkedArray:
+    """分塊資料集中的一個陣列，__getitem__ 時才讀取並解碼需要的 chunk (保留最近用過的幾個)。"""
+    def __init__(self, file_path, info, cache_chunks=64):
+        self.file_path = file_path
+        self.shape = tuple(info["shape"])
+        self.ndim = len(self.shape)
+        self.dtype = np.dtype(info["dtype"])
+        self.chunks = tuple(info["chunks"])
+        self.index = info["index"]
+        _, self.decode = CODECS[info["codec"]]
+        self.quantize = info.get("quantize")
+        self.cache_chunks = cache_chunks
+        self.cache = OrderedDict()
+        # DatasetWriter 會從多條執行緒讀取
+        self.lock = threading.Lock()
+
+    def chunk(self, chunk_index):
+        with self.lock:
+            if chunk_index in self.cache:
+                self.cache.move_to_end(chunk_index)
+                return self.cache[chunk_index]
+        entry = self.index[".".join(map(str, chunk_index))]
+        offset, length = entry[:2]
+        with open(self.file_path, "rb") as f:
+            f.seek(offset)
+            blob = f.read(length)
+        if len(entry) > 2 and zlib.crc32(blob) != entry[2]:
+            raise IOError(f"{self.file_path}: chunk {chunk_index} CRC32 不符")
+        raw = self.decode(blob)
+        shape = tuple(min(c, n - i * c) for i, c, n in zip(chunk_index, self.chunks, self.shape))
+        if self.quantize is None:
+            data = np.frombuffer(raw, dtype=self.dtype).reshape(shape)
+        else:
+            q = np.frombuffer(raw, dtype=np.uint16).reshape((2,) + shape)
+            data = dequantize_chunk(q, self.quantize["bits"], self.quantize["amp_max"],
+                                    self.quantize["delta_axis"], self.dtype)
+        with self.lock:
+            self.cache[chunk_index] = data
+            if len(self.cache) > self.cache_chunks:
+                self.cache.popitem(last=False)
+        return data
+
+    def __getitem__(self, key):
+        key = normalize_key(key, self.ndim)
+        selected = []
+        for k, n in zip(key, self.shape):
+            if isinstance(k, slice):
+                selected.append(np.arange(n)[k])
+            else:
+                selected.append(np.array([np.arange(n)[k]]))
+        out = np.empty([len(s) for s in selected], dtype=self.dtype)
+        chunk_ids = [s // c for s, c in zip(selected, self.chunks)]
+        for chunk_index in itertools.product(*[np.unique(ids) for ids in chunk_ids]):
+            out_positions = []
+            local_positions = []
+            for s, ids, cid, c in zip(selected, chunk_ids, chunk_index, self.chunks):
+                mask = ids == cid
+                out_positions.append(np.nonzero(mask)[0])
+                local_positions.append(s[mask] - cid * c)
+            out[np.ix_(*out_positions)] = self.chunk(tuple(int(i) for i in chunk_index))[np.ix_(*local_positions)]
+        # 整數索引的維度拿掉
+        return out[tuple(0 if not isinstance(k, slice) else slice(None) for k in key)]
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[...]
+        return array if dtype is None else array.astype(dtype)
+
+
+def load_dataset(file_path):
+    """開啟分塊資料集，回傳 data_sheet；其中的 *_tensor 為延遲載入的 ChunkedArray。"""
+    footer = read_footer(file_path)
+    data_sheet = dict(footer["attributes"])
+    for key, value in data_sheet.items():
+        if isinstance(value, list) and value and all(isinstance(v, (int, float)) for v in value):
+            data_sheet[key] = np.asarray(value)
+    for key, info in footer["arrays"].items():
+        data_sheet[key] = ChunkedArray(file_path, info)
+    return data_sheet
+
+
+# ============== 存檔 / 讀檔 ==============
+def save_data_sheet(file_path, data_sheet, **kwargs):
+    """
+    依副檔名保存 data_sheet：.rcwad 為分塊資料集 (預設)，.mat 為 MATLAB 匯出，
+    .npy 為舊版的 pickle 格式。
+    """
+    if file_path.endswith(".mat"):
+        return export_mat(data_sheet, file_path)
+    if file_path.endswith(".npy"):
+        # 保存為 .npy 檔；分塊讀取的 ChunkedArray (含 lock) 與延遲計算的陣列先轉成 ndarray 才能 pickle
+        np.save(file_path, {
+            "data_sheet": {k: np.asarray(v) if k in tensor_keys(data_sheet) else v for k, v in data_sheet.items()}
+        })
+        print(f"Tensors saved as NumPy file to {file_path}")
+        return file_path
+    return write_dataset(file_path, data_sheet, **kwargs)
+
+
+def export_mat(data_sheet, mat_file_path):
+    """需要時才把 data_sheet (或資料集檔案) 轉成 .mat。"""
+    import scipy.io as sio
+    if isinstance(data_sheet, str):
+        data_sheet = load_data_sheet(data_sheet)
+    # 保存為 .mat 檔 (MATLAB 端沿用 transmission_tensor / phase_tensor)
+    sio.savemat(mat_file_path, {
+        "data_sheet": mat_data_sheet(data_sheet)
+    })
+    print(f"Tensors saved as MAT file to {mat_file_path}")
+    return mat_file_path
+
+
+def mat_data_sheet(data_sheet):
+    """.mat 匯出用：由 jones_tensor 展開出 transmission_tensor / phase_tensor。"""
+    data_sheet = {k: np.asarray(v) if k in tensor_keys(data_sheet) else v for k, v in data_sheet.items()}
+    if "jones_tensor" not in data_sheet:
+        return data_sheet
+    transmission, phase = jones_to_channels(data_sheet["jones_tensor"])
+    return {
+        **data_sheet,
+        "transmission_tensor": transmission.astype(np.float32),
+        "phase_tensor": phase.astype(np.float32),
+    }
+
+
+def load_data_sheet(file_path):
+    """讀取 .rcwad 分塊資料集或舊版 .npy，回傳 data_sheet。"""
+    if not file_path.endswith(".npy"):
+        return load_dataset(file_path)
+    data = np.load(file_path, allow_pickle=True).item()
+    if "data_sheet" not in data:
+        raise ValueError("檔案內容不符合預期，請確認其中含有 data_sheet")
+    return data["data_sheet"]
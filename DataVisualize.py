@@ -12,6 +12,10 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 import matplotlib.pyplot as plt
+from SweepEngine import axis_specs
+from Jones import channel_views
+from DataIO import load_data_sheet
+from Scattered import is_scattered, grid_view_sheet
 
 
 class DataVisualize(QWidget):
@@ -46,7 +50,7 @@ class DataVisualize(QWidget):
 
             # ========== 1. 建立 GUI 元件 ==========
             # 創建一個load npy file的按鈕
-            self.load_npy_button = QPushButton("Load NPY File")
+            self.load_npy_button = QPushButton("Load Dataset")
             self.load_npy_button.clicked.connect(self.openDataVisualizer)
 
             # (A) 選擇 x、y 維度的 ComboBox
@@ -359,87 +363,18 @@ class DataVisualize(QWidget):
 
     def parseDataSheet(self, data_sheet):
         """
-        依照 shape_type（rectangle, ellipse, circle）解析維度資訊。
+        依照 shape_type 對應的掃描軸 (SweepEngine.SHAPE_AXES) 解析維度資訊。
+        scattered 資料集 (自適應 / 準隨機取樣) 以內插包裝成網格，切片時才計算。
         """
+        if is_scattered(data_sheet):
+            data_sheet = grid_view_sheet(data_sheet)
         shape_type = data_sheet.get("shape_type", "unknown")
-        
-        wavelength_list = data_sheet["Wavelength"]
-        period_list = data_sheet["Period"]
-        thickness_list = data_sheet["Thickness"]
-        
-        if shape_type == 'rectangle' or shape_type == 'rhombus' or shape_type == 'cross':
-            dimension_names = [
-                "Wavelength (nm)", "Period (nm)", "Thickness (nm)",
-                "Wx (nm)", "Wy (nm)", "Rotation Angle (deg)"
-            ]
-            width_list = data_sheet["Wx"]
-            height_list = data_sheet["Wy"]
-            rotation_angle_list = data_sheet["Theta"]
-            dimension_list = [
-                wavelength_list, period_list, thickness_list,
-                width_list, height_list, rotation_angle_list
-            ]
-        elif shape_type == 'ellipse':
-            dimension_names = [
-                "Wavelength (nm)", "Period (nm)", "Thickness (nm)",
-                "Rx (nm)", "Ry (nm)", "Rotation Angle (deg)"
-            ]
-            width_list = data_sheet["Rx"]
-            height_list = data_sheet["Ry"]
-            rotation_angle_list = data_sheet["Theta"]
-            dimension_list = [
-                wavelength_list, period_list, thickness_list,
-                width_list, height_list, rotation_angle_list
-            ]
-        elif shape_type == 'circle':
-            dimension_names = [
-                "Wavelength (nm)", "Period (nm)", "Thickness (nm)",
-                "R (nm)"
-            ]
-            r_list = data_sheet["R"]
-            dimension_list = [
-                wavelength_list, period_list, thickness_list, r_list
-            ]
-        elif shape_type == 'square':
-            dimension_names = [
-                "Wavelength (nm)", "Period (nm)", "Thickness (nm)",
-                "W (nm)", "Rotation Angle (deg)"
-            ]
-            width_list = data_sheet["Wx"]
-            rotation_angle_list = data_sheet["Theta"]
-            dimension_list = [
-                wavelength_list, period_list, thickness_list,
-                width_list, rotation_angle_list
-            ]
-        elif shape_type == 'hollow_square':
-            dimension_names = [
-                "Wavelength (nm)", "Period (nm)", "Thickness (nm)",
-                "W (nm)", "Hollow Width (nm)", "Rotation Angle (deg)"
-            ]
-            width_list = data_sheet["Wx"]
-            hollow_width_list = data_sheet["Hollow_W"]
-            rotation_angle_list = data_sheet["Theta"]
-            dimension_list = [
-                wavelength_list, period_list, thickness_list,
-                width_list, hollow_width_list, rotation_angle_list
-            ]
-        elif shape_type == 'hollow_circle':
-            dimension_names = [
-                "Wavelength (nm)", "Period (nm)", "Thickness (nm)",
-                "R (nm)", "Hollow R (nm)"
-            ]
-            r_list = data_sheet["R"]
-            hollow_width_list = data_sheet["Hollow_R"]
-            dimension_list = [
-                wavelength_list, period_list, thickness_list,
-                r_list, hollow_width_list
-            ]
-        else:
-            raise ValueError(f"shape_type not recognized: {shape_type}")
-        
-        # 取出傳輸與相位資料
-        self.data1 = data_sheet["transmission_tensor"]
-        self.data2 = data_sheet["phase_tensor"]
+        specs = axis_specs(shape_type)
+        dimension_names = [name for _, _, name in specs]
+        dimension_list = [data_sheet[key] for key, _, _ in specs]
+
+        # 取出傳輸與相位資料 (Jones 格式時只在切片時才計算)
+        self.data1, self.data2 = channel_views(data_sheet)
         
         # 儲存維度資訊
         self.dimension_names = dimension_names
@@ -455,26 +390,20 @@ class DataVisualize(QWidget):
 
     def load_npy_file(self):
         """
-        讓使用者選擇 .npy 檔，讀取後嘗試解析成 data_sheet，
-        並從其中取出 transmission_tensor、phase_tensor。
+        讓使用者選擇 .rcwad 分塊資料集或舊版 .npy 檔，讀取後回傳 data_sheet。
+        .rcwad 只讀取檔尾的索引，切片時才載入需要的 chunk。
         """
         filename, _ = QFileDialog.getOpenFileName(
-            self, "選擇 NPY 檔案", "", "NPY Files (*.npy)"
+            self, "選擇資料檔案", "", "RCWA dataset (*.rcwad);;NPY Files (*.npy)"
         )
         if not filename:
             return  # 使用者取消
 
         try:
-            data = np.load(filename, allow_pickle=True).item()
+            data_sheet = load_data_sheet(filename)
         except Exception as e:
             print(f"讀取檔案失敗: {e}")
             return
-
-        if "data_sheet" not in data:
-            print("檔案內容不符合預期，請確認其中含有 data_sheet")
-            return
-
-        data_sheet = data["data_sheet"]
         return data_sheet
     
     def openDataVisualizer(self):
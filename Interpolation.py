@@ -0,0 +1,145 @@
+"""
+資料庫層級的內插：在網格 data_sheet 的 N 維掃描軸 (Wavelength, Period, Thickness, Wx, Wy, Theta …) 上
+一次內插大量查詢點的 Jones 矩陣。
+  - 內插的是複數 Jones 矩陣 (實部與虛部線性組合)，穿透率與相位之後再由 Jones 算出，不會有 2π 跳動的假影
+  - "linear"：每個軸取相鄰兩個格點 (多線性)；"cubic"：每個軸取相鄰四個格點的 Lagrange 三次內插，
+    軸的數值不必等間距；點數不足四個的軸自動降為線性，只有一個數值的軸視為常數
+  - 查詢點分塊計算 (chunk_points)，暫存記憶體與查詢點數無關
+  - 超出軸範圍的點預設為 NaN (fill_value)；fill_value=None 時夾到範圍邊界
+  - NaN (無效幾何) 的格點會讓用到它的查詢點也變成 NaN
+"""
+import numpy as np
+
+from Jones import channel_amplitudes, sheet_jones
+from Scattered import is_scattered
+from SweepEngine import axis_specs
+
+METHODS = ("linear", "cubic")
+# 每塊的 (查詢點數 x 模板格點數) 上限；cubic 的模板較大，每塊的查詢點數相應變少
+CHUNK_ELEMENTS = 1 << 20
+
+
+def _linear_stencil(values, x):
+    """每個查詢點在該軸上的兩個格點索引與權重。"""
+    i = np.clip(np.searchsorted(values, x, side="right") - 1, 0, len(values) - 2)
+    t = (x - values[i]) / (values[i + 1] - values[i])
+    return np.stack([i, i + 1], axis=-1), np.stack([1 - t, t], axis=-1)
+
+
+def _cubic_stencil(values, x):
+    """每個查詢點在該軸上的四個格點索引與 Lagrange 權重 (邊界處模板往內移)。"""
+    i = np.clip(np.searchsorted(values, x, side="right") - 2, 0, len(values) - 4)
+    index = i[:, None] + np.arange(4)
+    nodes = values[index]
+    weights = np.ones((len(x), 4))
+    for j in range(4):
+        for k in range(4):
+            if k != j:
+                weights[:, j] *= (x - nodes[:, k]) / (nodes[:, j] - nodes[:, k])
+    return index, weights
+
+
+class GridInterpolator:
+    """
+    網格 data_sheet 的 Jones 矩陣內插。points 為 (M, D)，D 為該 shape_type 的所有掃描軸 (axis_specs 順序)。
+    資料集的 jones_tensor 為 ndarray / memmap 時直接按需讀取；分塊或延遲計算的陣列 (ChunkedArray、GridView)
+    在建立時整份讀入記憶體；舊格式 (只有 transmission / phase) 以 sheet_jones 重建 Jones 矩陣。
+    """
+    def __init__(self, data_sheet, method="linear", fill_value=np.nan):
+        if method not in METHODS:
+            raise ValueError(f"未知的內插方式: {method} (可用 {', '.join(METHODS)})")
+        self.method = method
+        self.fill_value = fill_value
+        self.shape_type = data_sheet["shape_type"]
+        self.keys = [key for key, _, _ in axis_specs(self.shape_type)]
+        self.axis_values = [np.asarray(data_sheet[key], dtype=np.float64) for key in self.keys]
+        jones = sheet_jones(data_sheet)
+        if not isinstance(jones, np.ndarray) or jones.dtype != np.complex64:
+            jones = np.asarray(jones, dtype=np.complex64)
+        self.shape = tuple(len(values) for values in self.axis_values)
+        self.jones = jones.reshape(-1, 4)
+        self.strides = np.array([int(np.prod(self.shape[d + 1:])) for d in range(len(self.shape))], dtype=np.int64)
+        for key, values in zip(self.keys, self.axis_values):
+            if len(values) > 1 and np.any(np.diff(values) <= 0):
+                raise ValueError(f"{key} 軸的數值必須嚴格遞增")
+
+    def _stencil(self, d, x):
+        values = self.axis_values[d]
+        if len(values) == 1:
+            return np.zeros((len(x), 1), dtype=np.int64), np.ones((len(x), 1))
+        if self.method == "cubic" and len(values) >= 4:
+            return _cubic_stencil(values, x)
+        return _linear_stencil(values, x)
+
+    @property
+    def stencil_size(self):
+        sizes = [1 if n == 1 else 4 if self.method == "cubic" and n >= 4 else 2 for n in self.shape]
+        return int(np.prod(sizes))
+
+    def __call__(self, points, chunk_points=None):
+        """回傳 (M, 2, 2) complex64。"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, len(self.shape))
+        chunk_points = chunk_points or max(1, CHUNK_ELEMENTS // self.stencil_size)
+        out = np.empty((len(points), 2, 2), dtype=np.complex64)
+        for begin in range(0, len(points), chunk_points):
+            out[begin:begin + chunk_points] = self._interpolate(points[begin:begin + chunk_points])
+        return out
+
+    def _interpolate(self, points):
+        lower = np.array([values[0] for values in self.axis_values])
+        upper = np.array([values[-1] for values in self.axis_values])
+        outside = ((points < lower) | (points > upper)).any(axis=1)
+        points = np.clip(points, lower, upper)
+        stencils = [self._stencil(d, points[:, d]) for d in range(len(self.shape))]
+        # 一次取出每個查詢點的整個模板 (M, s_1, ..., s_D, 4)，再逐軸以權重縮併
+        dims = len(stencils)
+        flat = np.zeros((len(points),) + (1,) * dims, dtype=np.int64)
+        for d, ((index, _), stride) in enumerate(zip(stencils, self.strides)):
+            shape = [len(points)] + [1] * dims
+            shape[d + 1] = index.shape[1]
+            flat = flat + (index * stride).reshape(shape)
+        # 以 float32 檢視 (實部、虛部交錯) 做批次矩陣乘法，比複數 einsum 快
+        block = np.ascontiguousarray(self.jones[flat.ravel()]).view(np.float32).reshape(len(points), -1)
+        for _, weights in stencils:
+            k = weights.shape[1]
+            block = np.matmul(weights.astype(np.float32)[:, None, :], block.reshape(len(points), k, -1))[:, 0]
+        out = block.view(np.complex64).astype(np.complex128)
+        if self.fill_value is not None:
+            out[outside] = self.fill_value
+        return out.reshape(-1, 2, 2)
+
+
+def interpolator(data_sheet, method="linear", fill_value=np.nan):
+    """網格資料集回傳 GridInterpolator；scattered 資料集回傳 Scattered 的內插器 (method 不適用)。"""
+    if is_scattered(data_sheet):
+        from Scattered import interpolator as scattered_interpolator
+        return scattered_interpolator(data_sheet)
+    return GridInterpolator(data_sheet, method=method, fill_value=fill_value)
+
+
+def query_points(data_sheet, **values):
+    """
+    以軸的 key 組成查詢點 (M, D)，例如 query_points(ds, Wx=wx, Wy=wy, Wavelength=1550.)。
+    各值互相廣播；沒有指定的軸必須只有一個數值 (直接沿用)。
+    """
+    keys = [key for key, _, _ in axis_specs(data_sheet["shape_type"])]
+    unknown = set(values) - set(keys)
+    if unknown:
+        raise ValueError(f"{data_sheet['shape_type']} 沒有 {sorted(unknown)} 這些掃描軸，可用的有 {keys}")
+    columns = []
+    for key in keys:
+        if key in values:
+            columns.append(np.asarray(values[key], dtype=np.float64))
+            continue
+        axis_values = np.asarray(data_sheet[key], dtype=np.float64)
+        if len(axis_values) != 1:
+            raise ValueError(f"{key} 軸有多個數值，查詢時必須指定")
+        columns.append(axis_values[0])
+    columns = np.broadcast_arrays(*columns)
+    return np.stack([c.ravel() for c in columns], axis=-1)
+
+
+def interpolate_channels(data_sheet, points, method="linear", channels=slice(None)):
+    """內插後的 (transmission, phase)，shape 為 (M, 8) 或依 channels 選取。"""
+    t = channel_amplitudes(interpolator(data_sheet, method=method)(points), channels)
+    return np.abs(t)**2, np.angle(t)
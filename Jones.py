@@ -0,0 +1,104 @@
+import numpy as np
+
+# 8 個偏振通道，順序與 DataVisualize 的 Polarization 選單一致
+CHANNEL_NAMES = ["XLP->XLP", "XLP->YLP", "YLP->XLP", "YLP->YLP", "LCP->LCP", "LCP->RCP", "RCP->LCP", "RCP->RCP"]
+
+
+def normalize_key(key, ndim):
+    """
+    把 __getitem__ 的索引展開成長度 ndim 的 tuple：任意位置的 Ellipsis 展開成對應數量的 slice(None)，
+    不足的維度在後面補 slice(None)。
+    """
+    if not isinstance(key, tuple):
+        key = (key,)
+    ellipses = [i for i, k in enumerate(key) if k is Ellipsis]
+    if len(ellipses) > 1:
+        raise IndexError("索引中只能有一個 Ellipsis (...)")
+    if ellipses:
+        i = ellipses[0]
+        key = key[:i] + (slice(None),) * max(0, ndim - len(key) + 1) + key[i + 1:]
+    if len(key) > ndim:
+        raise IndexError(f"索引太多：陣列為 {ndim} 維，但給了 {len(key)} 個索引")
+    return key + (slice(None),) * (ndim - len(key))
+
+
+def to_jones(txx, txy, tyx, tyy):
+    """把四個分量組成 shape 為 (..., 2, 2) 的 Jones 矩陣 [[txx, txy], [tyx, tyy]]。"""
+    return np.stack([np.stack([txx, txy], axis=-1), np.stack([tyx, tyy], axis=-1)], axis=-2)
+
+
+def legacy_jones(transmission, phase):
+    """
+    由舊版 (..., 8) 的 transmission / phase 重建 Jones 矩陣 (..., 2, 2) complex64：
+    前四個通道 (xx, yx, xy, yy) 即為 Jones 的四個分量，t = sqrt(T)·exp(iφ)；圓偏振通道可由它們算出，不需要。
+    """
+    t = np.sqrt(np.asarray(transmission[..., :4], dtype=np.float64)) * np.exp(1j * np.asarray(phase[..., :4], dtype=np.float64))
+    return to_jones(t[..., 0], t[..., 2], t[..., 1], t[..., 3]).astype(np.complex64)
+
+
+def sheet_jones(data_sheet):
+    """data_sheet 的 Jones 矩陣：新格式直接回傳 jones_tensor，舊格式 (只有 transmission / phase) 以 legacy_jones 重建。"""
+    if "jones_tensor" in data_sheet:
+        return data_sheet["jones_tensor"]
+    if "transmission_tensor" in data_sheet and "phase_tensor" in data_sheet:
+        return legacy_jones(data_sheet["transmission_tensor"], data_sheet["phase_tensor"])
+    raise ValueError("data_sheet 需要 jones_tensor，或舊版的 transmission_tensor 與 phase_tensor")
+
+
+def channel_amplitudes(jones, channels=slice(None)):
+    """
+    由 Jones 矩陣 (..., 2, 2) 向量化算出 8 個通道的複數穿透係數 (..., 8)，
+    順序：xx, yx, xy, yy, LL, RL, LR, RR。channels 可只取其中幾個通道。
+    """
+    txx = jones[..., 0, 0]
+    txy = jones[..., 0, 1]
+    tyx = jones[..., 1, 0]
+    tyy = jones[..., 1, 1]
+    tRL = 0.5*((txx - tyy) - 1j * (txy + tyx))
+    tRR = 0.5*((txx + tyy) + 1j * (txy - tyx))
+    tLR = 0.5*((txx - tyy) + 1j * (txy + tyx))
+    tLL = 0.5*((txx + tyy) - 1j * (txy - tyx))
+    t = [txx, tyx, txy, tyy, tLL, tRL, tLR, tRR]
+    if isinstance(channels, (int, np.integer)):
+        return t[channels]
+    return np.stack(t[channels], axis=-1)
+
+
+def jones_to_channels(jones):
+    """回傳 shape 為 (..., 8) 的 (transmission, phase)。"""
+    t = channel_amplitudes(jones)
+    return np.abs(t)**2, np.angle(t)
+
+
+class ChannelView:
+    """
+    以 (..., 8) 的 transmission / phase 陣列外觀包裝 Jones 矩陣：
+    只有被索引到的切片才會計算，資料本身不展開。
+    """
+    def __init__(self, jones, kind):
+        self.jones = jones
+        self.kind = kind
+        self.shape = tuple(jones.shape[:-2]) + (len(CHANNEL_NAMES),)
+        self.ndim = len(self.shape)
+
+    def __getitem__(self, key):
+        key = normalize_key(key, self.ndim)
+        t = channel_amplitudes(np.asarray(self.jones[key[:-1]]), key[-1])
+        if self.kind == "transmission":
+            return (np.abs(t)**2).astype(np.float32)
+        return np.angle(t).astype(np.float32)
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[...]
+        return array if dtype is None else array.astype(dtype)
+
+
+def channel_views(data_sheet):
+    """
+    回傳 data_sheet 的 (transmission, phase)：新格式由 jones_tensor 延遲計算，
+    舊格式直接回傳 transmission_tensor / phase_tensor。
+    """
+    if "jones_tensor" in data_sheet:
+        jones = data_sheet["jones_tensor"]
+        return ChannelView(jones, "transmission"), ChannelView(jones, "phase")
+    return data_sheet["transmission_tensor"], data_sheet["phase_tensor"]
@@ -0,0 +1,148 @@
+"""
+meta-atom 選擇用的相位庫索引：由已存的資料集 (網格或 scattered) 建立，批次回答
+  - best_phase：某個偏振通道上，穿透率 >= min_transmission 的 atom 中相位最接近目標 φ 者
+  - nearest   ：複數穿透係數 t 最接近目標 t (同時比對振幅與相位) 者
+兩種查詢都是 2 維 KD-tree (scipy cKDTree)：相位查詢的座標為 (cos φ, sin φ)，弦長與相位差單調對應，
+不必處理 2π 跳動；複數查詢的座標為 (Re t, Im t)。
+每個 (通道, 查詢種類, min_transmission) 第一次查詢時只對符合門檻的 atom 建一棵樹並保留 (最近用過的 MAX_TREES 棵)，
+之後同條件的查詢每點只需一次樹搜尋。NaN (無效幾何) 的點不納入。
+同一個設計中的 atom 必須有相同的波長、週期與厚度，因此這些軸 (COMMON_AXES) 在索引中只能有一個數值，
+資料集有多個數值時以 fixed={"Wavelength": 940., ...} 選定。
+"""
+from collections import OrderedDict
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from Jones import CHANNEL_NAMES, channel_amplitudes, sheet_jones
+from Scattered import is_scattered
+from SweepEngine import COMMON_AXES, axis_specs
+
+# 保留的 KD-tree 數量上限 (不同的通道 / 查詢種類 / 門檻各一棵)
+MAX_TREES = 8
+# fixed 的數值與軸上 (或 scattered 取樣點) 數值的相對容許差
+FIXED_RTOL = 1e-6
+
+
+def channel_index(channel):
+    """通道可用編號或名稱 (例如 "RCP->LCP")。"""
+    if isinstance(channel, str):
+        if channel not in CHANNEL_NAMES:
+            raise ValueError(f"未知的偏振通道: {channel} (可用 {', '.join(CHANNEL_NAMES)})")
+        return CHANNEL_NAMES.index(channel)
+    return int(channel)
+
+
+class PhaseLibrary:
+    """
+    parameters: (N, D) 每個 atom 在各掃描軸 (keys) 的數值；jones: (N, 2, 2)。
+    查詢回傳的是 atom 的編號，以 atoms() 取出對應的參數。
+    """
+    def __init__(self, shape_type, keys, parameters, jones):
+        self.shape_type = shape_type
+        self.keys = list(keys)
+        jones = np.asarray(jones, dtype=np.complex64).reshape(-1, 2, 2)
+        valid = np.isfinite(jones).all(axis=(1, 2))
+        self.parameters = np.asarray(parameters, dtype=np.float64)[valid]
+        self.t = channel_amplitudes(jones[valid])
+        self.trees = OrderedDict()
+
+    @classmethod
+    def from_data_sheet(cls, data_sheet, fixed=None):
+        """
+        fixed: {軸的 key: 數值}，只取該軸等於此數值的 atom (網格資料集必須是軸上的數值)。
+        篩選後 Wavelength / Period / Thickness 仍有多個數值時拒絕建立索引。
+        舊格式 (只有 transmission / phase) 的資料集以 sheet_jones 重建 Jones 矩陣。
+        """
+        shape_type = data_sheet["shape_type"]
+        keys = [key for key, _, _ in axis_specs(shape_type)]
+        fixed = dict(fixed or {})
+        unknown = set(fixed) - set(keys)
+        if unknown:
+            raise ValueError(f"{shape_type} 沒有 {sorted(unknown)} 這些掃描軸，可用的有 {keys}")
+        if is_scattered(data_sheet):
+            parameters = np.asarray(data_sheet["sample_tensor"], dtype=np.float64)
+            jones = np.asarray(sheet_jones(data_sheet))
+            selected = np.ones(len(parameters), dtype=bool)
+            for key, value in fixed.items():
+                selected &= np.isclose(parameters[:, keys.index(key)], value, rtol=FIXED_RTOL, atol=0.)
+            if not selected.any():
+                raise ValueError(f"沒有符合 {fixed} 的取樣點")
+            parameters, jones = parameters[selected], jones[selected]
+            varying = {key for d, key in enumerate(keys) if np.ptp(parameters[:, d]) > 0}
+        else:
+            values = [np.asarray(data_sheet[key], dtype=np.float64) for key in keys]
+            selection = [slice(None)] * len(keys)
+            for key, value in fixed.items():
+                d = keys.index(key)
+                match = np.flatnonzero(np.isclose(values[d], value, rtol=FIXED_RTOL, atol=0.))
+                if len(match) == 0:
+                    raise ValueError(f"{key} 軸沒有 {value} 這個數值，可用的有 {values[d].tolist()}")
+                selection[d] = slice(match[0], match[0] + 1)
+                values[d] = values[d][selection[d]]
+            jones = np.asarray(sheet_jones(data_sheet)[tuple(selection)])
+            index = np.unravel_index(np.arange(int(np.prod([len(v) for v in values]))), tuple(len(v) for v in values))
+            parameters = np.stack([v[i] for v, i in zip(values, index)], axis=-1)
+            varying = {key for key, v in zip(keys, values) if len(v) > 1}
+        mixed = [key for key, _, _ in COMMON_AXES if key in varying]
+        if mixed:
+            raise ValueError(f"{mixed} 有多個數值，同一個設計的 atom 必須共用這些參數，請以 fixed 選定")
+        return cls(shape_type, keys, parameters, jones)
+
+    def __len__(self):
+        return len(self.parameters)
+
+    def transmission(self, channel):
+        return np.abs(self.t[:, channel_index(channel)])**2
+
+    def phase(self, channel):
+        return np.angle(self.t[:, channel_index(channel)])
+
+    def _tree(self, kind, channel, min_transmission):
+        """(樹, 樹中各點對應的 atom 編號)；沒有 atom 符合門檻時樹為 None。"""
+        key = (kind, channel, float(min_transmission))
+        if key in self.trees:
+            self.trees.move_to_end(key)
+        else:
+            t = self.t[:, channel]
+            members = np.flatnonzero(np.abs(t)**2 >= min_transmission)
+            if kind == "phase":
+                coordinates = np.stack([np.cos(np.angle(t[members])), np.sin(np.angle(t[members]))], axis=-1)
+            else:
+                coordinates = np.stack([t[members].real, t[members].imag], axis=-1)
+            self.trees[key] = (cKDTree(coordinates) if len(members) else None, members)
+            if len(self.trees) > MAX_TREES:
+                self.trees.popitem(last=False)
+        return self.trees[key]
+
+    def _query(self, kind, channel, min_transmission, coordinates, k):
+        tree, members = self._tree(kind, channel_index(channel), min_transmission)
+        shape = (len(coordinates),) + ((k,) if k > 1 else ())
+        if tree is None:
+            return np.full(shape, -1, dtype=np.int64), np.full(shape, np.inf)
+        distance, index = tree.query(coordinates, k=k, workers=-1)
+        # k 大於符合門檻的 atom 數時，cKDTree 以 len(members) 表示不存在
+        found = index < len(members)
+        atoms = np.where(found, members[np.minimum(index, len(members) - 1)], -1)
+        return atoms, distance
+
+    def best_phase(self, phase, channel=0, min_transmission=0., k=1):
+        """
+        每個目標相位 (rad) 的最佳 atom 編號與相位誤差 (rad)，shape 為 (M,) 或 (M, k)。
+        沒有 atom 的穿透率達到 min_transmission 時編號為 -1、誤差為 inf。
+        """
+        phase = np.atleast_1d(np.asarray(phase, dtype=np.float64))
+        atoms, chord = self._query("phase", channel, min_transmission,
+                                   np.stack([np.cos(phase), np.sin(phase)], axis=-1), k)
+        return atoms, np.where(atoms >= 0, 2 * np.arcsin(np.minimum(chord, 2.) / 2), np.inf)
+
+    def nearest(self, t, channel=0, min_transmission=0., k=1):
+        """每個目標複數穿透係數 t 的最接近 atom 編號與 |Δt|，shape 為 (M,) 或 (M, k)。"""
+        t = np.atleast_1d(np.asarray(t, dtype=np.complex128))
+        return self._query("complex", channel, min_transmission, np.stack([t.real, t.imag], axis=-1), k)
+
+    def atoms(self, indices):
+        """atom 編號 -> {軸的 key: 數值陣列}；編號為 -1 的位置填 NaN。"""
+        indices = np.asarray(indices)
+        parameters = np.where((indices >= 0)[..., None], self.parameters[np.maximum(indices, 0)], np.nan)
+        return {key: parameters[..., d] for d, key in enumerate(self.keys)}
@@ -0,0 +1,235 @@
+"""
+掃描開始前的成本與記憶體估計：
+  - 總點數、harmonic order N 下每個點的矩陣大小 ((2N+1)^2 個 harmonics x 2 個偏振)
+  - 特徵分解與各層 S-matrix 的峰值記憶體、結果陣列的大小
+  - 以幾個實際求解的點校準每點耗時，推算 ETA (幾何退化、不需求解的點與對稱等價的點不計入)
+  - 與可用的記憶體 / 磁碟空間比較，決定直接執行 (ok)、結果改為串流寫入磁碟 (stream) 或拒絕執行 (refuse)
+"""
+import os
+import shutil
+import statistics
+import time
+
+import numpy as np
+import torch
+
+from Pruning import OK, pruned_jones
+from RCWA import RCWA
+from Scaling import LENGTH_PARAMS
+from Symmetry import canonical_point
+from SweepEngine import solve_point
+
+# 求解時同時存在的 (2M x 2M) 複數矩陣數量的估計：
+#   特徵分解 (P、Q、omega^2、特徵向量、暫存) 約 12 個，每一層保留 4 個 S-matrix 區塊與係數，
+#   再加上串接 global S-matrix 的 4 個區塊與暫存
+EIGEN_MATRICES = 12
+MATRICES_PER_LAYER = 6
+GLOBAL_MATRICES = 8
+SOLVER_LAYERS = 3
+GRID_POINTS = 300 * 300
+
+# 可用記憶體中最多給結果陣列與求解器使用的比例
+MEMORY_FRACTION = 0.8
+
+
+def matrix_size(order):
+    """harmonic order N 的 (harmonics 數, 矩陣邊長)：(2N+1)^2 個 harmonics，x/y 兩個偏振。"""
+    harmonics = (2 * order + 1) ** 2
+    return harmonics, 2 * harmonics
+
+
+def solver_memory(order, dtype=torch.complex64, layers=SOLVER_LAYERS):
+    """單點求解的峰值記憶體估計 (bytes)。"""
+    itemsize = torch.tensor([], dtype=dtype).element_size()
+    _, size = matrix_size(order)
+    matrices = EIGEN_MATRICES + MATRICES_PER_LAYER * layers + GLOBAL_MATRICES
+    # 幾何網格與介電常數分佈 (實數網格 + 複數 eps)
+    grid = GRID_POINTS * (itemsize // 2 + itemsize)
+    return matrices * size * size * itemsize + grid
+
+
+def result_memory(total, dtype=np.complex64):
+    """total 個點的 2x2 Jones 結果陣列大小 (bytes)。"""
+    return total * 4 * np.dtype(dtype).itemsize
+
+
+def available_memory():
+    """可用的實體記憶體 (bytes)；無法取得時回傳 None。"""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def sample_points(engine, candidates=64):
+    """在掃描範圍內均勻分布的 candidates 個點中，幾何有效 (Pruning 為 OK) 者的求解參數。"""
+    sample = []
+    for flat_index in np.unique(np.linspace(0, engine.total - 1, candidates).astype(int)):
+        kwargs = engine.point_kwargs(flat_index)
+        if pruned_jones(kwargs)[0] == OK:
+            sample.append(kwargs)
+    return sample
+
+
+def scale_fraction(engine, sample):
+    """
+    尺度不變性合併後仍需求解的比例 (由 sample 估計)：sample 中的點若與某個較短波長的網格點等比例
+    (所有長度同乘 λ'/λ 後落在各軸的數值上，且 ScaleIndex 的 key 相同)，它會沿用該點的結果，不算需要求解。
+    沒有 ScaleIndex 或 sample 為空時為 1。
+    """
+    if engine.scale_index is None or not sample:
+        return 1.
+    axes = {axis.param: np.asarray(axis.values, dtype=float) for axis in engine.axes}
+    wavelengths = axes["wavelength"]
+    lengths = [param for param in LENGTH_PARAMS if param in axes]
+    unique = 0
+    for kwargs in sample:
+        key = engine.scale_index.key(kwargs)
+        wavelength = float(kwargs["wavelength"])
+        merged = False
+        for other in wavelengths[wavelengths < wavelength]:
+            scaled = dict(kwargs, wavelength=other)
+            for param in lengths:
+                values = axes[param]
+                scaled[param] = values[np.argmin(np.abs(values - float(kwargs[param]) * other / wavelength))]
+            if engine.scale_index.key(scaled) == key:
+                merged = True
+                break
+        unique += not merged
+    return unique / len(sample)
+
+
+def calibrate(engine, points=3, warmup=True, candidates=64):
+    """
+    在掃描範圍內均勻挑 points 個需要求解的點實際求解，回傳每點耗時的中位數 (秒)。
+    幾何退化 (Pruning) 與快取中已有的點跳過；求解結果寫入快取 (以對稱代表點為 key)，掃描時直接沿用。
+    在 candidates 個均勻分布的點中找不到需要求解的點時回傳 None。
+    warmup=True 時第一個點先另外解一次當作暖機 (載入 BLAS、配置記憶體)。
+    """
+    selected = []
+    for kwargs in sample_points(engine, max(points, candidates)):
+        canonical = canonical_point(kwargs)[0] if engine.symmetry else kwargs
+        if engine.cache is not None and engine.cache.contains(engine.cache.key(canonical)):
+            continue
+        selected.append(canonical)
+    if not selected:
+        return None
+    # 從候選點中均勻取 points 個
+    selected = [selected[i] for i in np.unique(np.linspace(0, len(selected) - 1, min(points, len(selected))).astype(int))]
+    if warmup:
+        RCWA(**selected[0]).get_Sparameter()
+    times = []
+    for kwargs in selected:
+        start = time.perf_counter()
+        solve_point(kwargs, cache=engine.cache)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def estimate(engine, calibration_points=3, memory_fraction=MEMORY_FRACTION, warmup=True, candidates=64):
+    """
+    回傳掃描的估計 dict：
+      total, pruned ({"ok", "empty", "invalid"} 點數), unique_fraction (對稱合併後需求解的比例),
+      scale_invariance (是否以尺度不變性合併), scale_fraction (尺度合併後仍需求解的比例，見 scale_fraction),
+      harmonics, matrix_size, solver_bytes, result_bytes, available_bytes, seconds_per_point, eta_seconds, action ("ok" / "stream" / "refuse"), reason
+    calibration_points=0 時不做校準求解 (或找不到需要求解的點時)，ETA 為 None；warmup、candidates 見 calibrate。
+    """
+    order = int(engine.fixed_kwargs["harmonic_order"])
+    pruned = engine.prune_counts()
+    unique_fraction = engine.unique_fraction()
+    scale = scale_fraction(engine, sample_points(engine, candidates)) if pruned["ok"] > 0 else 1.
+    harmonics, size = matrix_size(order)
+    solver_bytes = solver_memory(order, getattr(torch, engine.fixed_kwargs.get("dtype", "complex64")))
+    result_bytes = result_memory(engine.total)
+    available = available_memory()
+    budget = None if available is None else available * memory_fraction
+
+    action, reason = "ok", ""
+    if budget is not None and solver_bytes > budget:
+        action = "refuse"
+        reason = f"單點求解約需 {format_bytes(solver_bytes)}，超過可用記憶體 {format_bytes(available)}，請降低 harmonic order"
+    elif engine.output_dir is not None:
+        directory = engine.output_dir if os.path.isdir(engine.output_dir) else os.path.dirname(os.path.abspath(engine.output_dir))
+        free = shutil.disk_usage(directory).free
+        if result_bytes > free:
+            action = "refuse"
+            reason = f"結果約 {format_bytes(result_bytes)}，超過 {engine.output_dir} 的可用磁碟空間 {format_bytes(free)}"
+    elif budget is not None and result_bytes + solver_bytes > budget:
+        action = "stream"
+        reason = f"結果約 {format_bytes(result_bytes)}，記憶體放不下，改為分塊串流寫入磁碟"
+
+    seconds_per_point = None
+    eta = None
+    if calibration_points > 0 and pruned["ok"] > 0 and action != "refuse":
+        seconds_per_point = calibrate(engine, calibration_points, warmup=warmup, candidates=candidates)
+        if seconds_per_point is not None:
+            eta = seconds_per_point * pruned["ok"] * unique_fraction * scale / engine.workers
+    return {
+        "total": engine.total,
+        "pruned": pruned,
+        "unique_fraction": unique_fraction,
+        "scale_invariance": engine.scale_index is not None,
+        "scale_fraction": scale,
+        "harmonic_order": order,
+        "harmonics": harmonics,
+        "matrix_size": size,
+        "solver_bytes": solver_bytes,
+        "result_bytes": result_bytes,
+        "available_bytes": available,
+        "seconds_per_point": seconds_per_point,
+        "eta_seconds": eta,
+        "action": action,
+        "reason": reason,
+    }
+
+
+def format_bytes(n):
+    if n is None:
+        return "unknown"
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if n < 1024 or unit == "TB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{int(n)} B"
+        n /= 1024
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "unknown"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours} h {minutes} min"
+    if minutes:
+        return f"{minutes} min {seconds} s"
+    return f"{seconds} s"
+
+
+def format_estimate(result):
+    lines = [
+        f"points: {result['total']}",
+        f"harmonic order {result['harmonic_order']}: {result['harmonics']} harmonics, "
+        f"{result['matrix_size']}x{result['matrix_size']} matrices (x/y polarizations)",
+        f"peak solver memory ~{format_bytes(result['solver_bytes'])}, "
+        f"results {format_bytes(result['result_bytes'])}, available {format_bytes(result['available_bytes'])}",
+    ]
+    pruned = result["pruned"]
+    if pruned["empty"] or pruned["invalid"]:
+        lines[0] += (f" ({pruned['ok']} to solve, {pruned['empty']} empty cells filled analytically, "
+                     f"{pruned['invalid']} invalid geometries skipped)")
+    if result["unique_fraction"] < 1.:
+        lines.append(f"symmetry: {100 * result['unique_fraction']:.0f}% of the points are unique representatives")
+    if result["scale_invariance"]:
+        lines.append("scale invariance: materials are flat over the band, proportional (λ, P, H, W) points share one solve "
+                     f"(~{100 * result['scale_fraction']:.0f}% of the sampled points still need a solve)")
+    if result["seconds_per_point"] is not None:
+        lines.append(f"calibration: {1000 * result['seconds_per_point']:.1f} ms/point, "
+                     f"ETA {format_duration(result['eta_seconds'])} (不含快取命中)")
+    if result["reason"]:
+        lines.append(f"{result['action']}: {result['reason']}")
+    return "\n".join(lines)
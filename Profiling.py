@@ -0,0 +1,101 @@
+"""
+掃描的效能剖析：把一段連續的掃描點同時包在 torch.profiler 與 cProfile 裡，
+輸出 Chrome trace (<name>.trace.json，可用 chrome://tracing 或 Perfetto 開啟) 與 pstats (<name>.pstats)。
+
+不需要改程式即可開啟：
+  - 環境變數 RCWA_PROFILE=<start>:<count> (或只寫 <count>，從第 0 點開始)，
+    RCWA_PROFILE_DIR 指定輸出目錄 (預設 profiles/)
+  - rcwa_batch.py --profile <start>:<count> [--profile-dir DIR]
+start / count 以本次執行走訪的掃描點計：從 checkpoint 恢復時跳過的點不算，但幾何剔除 (Pruning)、
+對稱或尺度合併、快取命中而沒有實際求解的點也會計入，因此視窗內實際求解的點可能少於 count。
+剖析只記錄主 process，因此開啟剖析時 SweepEngine.run 一律以單一 process 求解 (忽略 workers)。
+"""
+import os
+import cProfile
+from contextlib import nullcontext
+
+DEFAULT_PROFILE_DIR = "profiles"
+
+
+def parse_window(text):
+    """'start:count' 或 'count' -> (start, count)。"""
+    if ":" in text:
+        start, count = text.split(":", 1)
+    else:
+        start, count = 0, text
+    start, count = int(start), int(count)
+    if start < 0 or count <= 0:
+        raise ValueError(f"profile window 必須是 start>=0 與 count>0: {text}")
+    return start, count
+
+
+class SweepProfiler:
+    """
+    在本次執行走訪的第 start ~ start+count-1 個點期間開啟 torch.profiler 與 cProfile。
+    SweepEngine.run() 每個點呼叫 point()；結束 (或中止) 時呼叫 finish()。
+    """
+    def __init__(self, name, start=0, count=20, output_dir=DEFAULT_PROFILE_DIR):
+        self.name = name
+        self.start = start
+        self.count = count
+        self.output_dir = output_dir
+        self.index = 0
+        self.torch_profiler = None
+        self.cprofile = None
+        self.files = []
+
+    @classmethod
+    def from_env(cls, name):
+        """依 RCWA_PROFILE / RCWA_PROFILE_DIR 建立，未設定時回傳 None。"""
+        window = os.environ.get("RCWA_PROFILE")
+        if not window:
+            return None
+        start, count = parse_window(window)
+        return cls(name, start, count, os.environ.get("RCWA_PROFILE_DIR") or DEFAULT_PROFILE_DIR)
+
+    @property
+    def active(self):
+        return self.cprofile is not None
+
+    def point(self):
+        """包住一個掃描點的求解：視窗開始時啟動剖析，視窗內的點在 trace 中標記為 rcwa_point。"""
+        if self.index == self.start:
+            self._begin()
+        self.index += 1
+        if not self.active:
+            return nullcontext()
+        import torch
+        return torch.profiler.record_function("rcwa_point")
+
+    def after_point(self):
+        """一個點算完後呼叫，視窗結束時寫出檔案。"""
+        if self.active and self.index >= self.start + self.count:
+            self.finish()
+
+    def _begin(self):
+        import torch
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self.torch_profiler = torch.profiler.profile(activities=activities, record_shapes=True)
+        self.torch_profiler.__enter__()
+        self.cprofile = cProfile.Profile()
+        self.cprofile.enable()
+
+    def finish(self):
+        """停止剖析並寫出 trace 與 pstats，回傳輸出的檔案路徑。"""
+        if not self.active:
+            return self.files
+        self.cprofile.disable()
+        self.torch_profiler.__exit__(None, None, None)
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, self.name)
+        trace_path = base + ".trace.json"
+        stats_path = base + ".pstats"
+        self.torch_profiler.export_chrome_trace(trace_path)
+        self.cprofile.dump_stats(stats_path)
+        self.torch_profiler = None
+        self.cprofile = None
+        self.files = [trace_path, stats_path]
+        print(f"profile ({self.index - self.start} points) saved to {trace_path}, {stats_path}")
+        return self.files
@@ -0,0 +1,115 @@
+"""
+掃描點的幾何檢查：在送進 RCWA 之前先把退化的點挑出來，不必實際求解。
+  - empty  ：柱體不存在 (尺寸 <= 0，或中空部分 >= 外框，例如 hollow_W >= Wx、hollow_R >= R)，
+             超穎介面層整層都是填充材料，直接以均勻多層膜的解析解 (特徵矩陣法) 填入
+  - invalid：柱體比週期還寬 (會與相鄰的柱體重疊)，或週期 <= 0，沒有物理意義，填入 NaN
+尺寸參數一律是全寬 / 直徑 (與 RCWA.layer_geometry 相同)。
+"""
+import functools
+
+import numpy as np
+import torch
+
+import Materials
+
+OK, EMPTY, INVALID = 0, 1, 2
+STATUS_NAMES = {OK: "ok", EMPTY: "empty", INVALID: "invalid"}
+
+# 每種 shape_type 的 (決定柱體大小的參數, 中空部分的 (外框, 內框) 參數)
+SHAPE_SIZES = {
+    "rectangle": (["Wx", "Wy"], None),
+    "rhombus": (["Wx", "Wy"], None),
+    "cross": (["Wx", "Wy"], None),
+    "ellipse": (["Rx", "Ry"], None),
+    "circle": (["R"], None),
+    "square": (["Wx"], None),
+    "hollow_square": (["Wx"], ("Wx", "hollow_W")),
+    "hollow_circle": (["R"], ("R", "hollow_R")),
+}
+
+
+def geometry_params(shape_type):
+    """影響檢查結果的參數名稱 (週期與柱體尺寸；旋轉角度不影響)。"""
+    sizes, hollow = SHAPE_SIZES[shape_type]
+    params = ["period"] + sizes
+    if hollow is not None:
+        params.append(hollow[1])
+    return params
+
+
+def classify(shape_type, values):
+    """
+    values: 參數名稱 -> 數值或可互相廣播的陣列，回傳同形狀的狀態 (OK / EMPTY / INVALID)。
+    柱體不存在時不論週期都是 EMPTY (整層只有填充材料)。
+    """
+    if shape_type not in SHAPE_SIZES:
+        raise ValueError(f"shape_type not recognized: {shape_type}")
+    sizes, hollow = SHAPE_SIZES[shape_type]
+    period = np.asarray(values["period"], dtype=float)
+    widths = [np.asarray(values[param], dtype=float) for param in sizes]
+    empty = functools.reduce(np.logical_or, [width <= 0 for width in widths])
+    if hollow is not None:
+        outer, inner = hollow
+        empty = empty | (np.asarray(values[inner], dtype=float) >= np.asarray(values[outer], dtype=float))
+    too_wide = functools.reduce(np.logical_or, [width > period for width in widths]) | (period <= 0)
+    return np.where(empty, EMPTY, np.where(too_wide, INVALID, OK))
+
+
+def thin_film_transmission(indices, thicknesses, wavelength):
+    """
+    正向入射下多層膜的功率正規化穿透係數 (特徵矩陣法，相位慣例與 torcwa 相同)。
+    indices = [n_入射, n_1, ..., n_出射]，thicknesses = [d_1, ...] (nm)。
+    """
+    n_in, n_out = indices[0], indices[-1]
+    M = np.eye(2, dtype=complex)
+    for n, d in zip(indices[1:-1], thicknesses):
+        delta = 2 * np.pi * n * d / wavelength
+        M = M @ np.array([[np.cos(delta), -1j * np.sin(delta) / n], [-1j * n * np.sin(delta), np.cos(delta)]])
+    t = 2 * n_in / (n_in * M[0, 0] + n_in * n_out * M[0, 1] + M[1, 0] + n_out * M[1, 1])
+    return t * np.sqrt(n_out / n_in)
+
+
+@functools.lru_cache(maxsize=4096)
+def _bare_stack(wavelength, materials, thicknesses):
+    lamb0 = torch.tensor(wavelength, dtype=torch.float64)
+    indices = [complex(Materials.Material.forward(wavelength=lamb0, name=name)) for name in materials]
+    return thin_film_transmission(indices, thicknesses, wavelength)
+
+
+def bare_stack_jones(kwargs):
+    """
+    沒有柱體時的 Jones 矩陣：基板 | slab | 填充材料 (超穎介面層 + filling 層) | 出射介質，
+    各向同性所以是 t * 單位矩陣。相同波長與疊層只計算一次。
+    """
+    materials = (kwargs["substrate_material"], kwargs["slab_material"], kwargs["filling_material"],
+                 kwargs["filling_material"], kwargs["output_material"])
+    thicknesses = (float(kwargs["slab_thickness"]), float(kwargs["metasurface_thickness"]),
+                   float(kwargs["filling_thickness"]))
+    t = _bare_stack(float(kwargs["wavelength"]), materials, thicknesses)
+    return np.array([[t, 0.], [0., t]], dtype=np.complex64)
+
+
+def pruned_jones(kwargs):
+    """不需要求解的點回傳 (狀態, Jones 矩陣)，需要求解時回傳 (OK, None)。"""
+    status = int(classify(kwargs["shape_type"], kwargs))
+    if status == EMPTY:
+        return status, bare_stack_jones(kwargs)
+    if status == INVALID:
+        return status, np.full((2, 2), np.nan, dtype=np.complex64)
+    return status, None
+
+
+def prune_counts(shape_type, axes):
+    """
+    整個掃描中各狀態的點數 {"ok", "empty", "invalid"}。
+    只在影響檢查的軸上展開 (其餘軸的長度直接相乘)，不會配置整個掃描大小的陣列。
+    axes: SweepEngine.Axis 清單。
+    """
+    params = geometry_params(shape_type)
+    geometry_axes = [axis for axis in axes if axis.param in params]
+    repeat = int(np.prod([len(axis.values) for axis in axes if axis.param not in params]))
+    grids = np.meshgrid(*[np.asarray(axis.values, dtype=float) for axis in geometry_axes], indexing="ij", sparse=True)
+    status = classify(shape_type, {axis.param: grid for axis, grid in zip(geometry_axes, grids)})
+    status = np.broadcast_to(status, tuple(len(axis.values) for axis in geometry_axes))
+    counts = np.bincount(status.ravel(), minlength=3) * repeat
+    return {STATUS_NAMES[s]: int(counts[s]) for s in STATUS_NAMES}
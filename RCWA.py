@@ -1,8 +1,11 @@
 import torch
 import numpy as np  
 import torcwa
-import matplotlib.pyplot as plt
 import Materials
+from Timing import TIMER
+
+# 求解流程 (幾何、網格、S 參數擷取) 有改變結果的修改時需遞增，讓舊的結果快取失效
+SOLVER_VERSION = "1"
 
 class RCWA:
     def __init__(
@@ -28,9 +31,12 @@ class RCWA:
         Ry=None,
         R=None,
         hollow_W=None,
-        hollow_R=None
+        hollow_R=None,
+        dtype=torch.complex64
     ):
         self.device = device
+        # 模擬精度：complex64 (預設) 或 complex128 (也可用字串)，幾何網格對應 float32 / float64
+        self.dtype = getattr(torch, dtype) if isinstance(dtype, str) else dtype
         self.shape_type = shape_type
         self.harmonic_order = harmonic_order
         self.wavelength = wavelength
@@ -56,25 +62,13 @@ class RCWA:
         self.hollow_W = hollow_W
         self.hollow_R = hollow_R
 
-    def show_structure(self):
+    def layer_geometry(self, geo_dtype=torch.float32):
         """
-        在這裡實作或呼叫建構結構所需的程式碼。
+        設定 torcwa.rcwa_geo 的網格並回傳超穎介面層的幾何 (300x300，1 為柱體、0 為填充材料)。
         """
-        geo_dtype = torch.float32
-        device = self.device
-
-        # Simulation environment
-        # light
-        lamb0 = torch.tensor(self.wavelength,dtype=geo_dtype,device=device)    # nm
-
-        # material
-        silicon_eps = Materials.Material.forward(wavelength=lamb0, name=self.metasurface_material)**2
-        filling_eps = Materials.Material.forward(wavelength=lamb0, name=self.filling_material)**2
-
-        # geometry
         L = [self.period, self.period]            # nm / nm
         torcwa.rcwa_geo.dtype = geo_dtype
-        torcwa.rcwa_geo.device = device
+        torcwa.rcwa_geo.device = self.device
         torcwa.rcwa_geo.Lx = L[0]
         torcwa.rcwa_geo.Ly = L[1]
         torcwa.rcwa_geo.nx = 300
@@ -82,8 +76,6 @@ class RCWA:
         torcwa.rcwa_geo.grid()
         torcwa.rcwa_geo.edge_sharpness = 1000.
 
-        x_axis = torcwa.rcwa_geo.x.cpu()
-        y_axis = torcwa.rcwa_geo.y.cpu()
         if self.shape_type == 'rectangle':
             layer0_geometry = torcwa.rcwa_geo.rectangle(Wx=self.Wx,Wy=self.Wy,Cx=L[0]/2.,Cy=L[1]/2., theta=self.theta)
         elif self.shape_type == 'ellipse':
@@ -91,9 +83,9 @@ class RCWA:
         elif self.shape_type == 'circle':
             layer0_geometry = torcwa.rcwa_geo.circle(R=self.R/2,Cx=L[0]/2.,Cy=L[1]/2.)
         elif self.shape_type == 'rhombus':
-            layer0_geometry = torcwa.rcwa_geo.rhombus(Wx=self.Wx,Wy=self.Wy,Cx=L[0]/2.,Cy=L[1]/2., theta=self.theta)
+            layer0_geometry = torcwa.rcwa_geo.rhombus(Wx=self.Wx, Wy=self.Wy,Cx=L[0]/2., Cy=L[1]/2., theta=self.theta)
         elif self.shape_type == 'square':
-            layer0_geometry = torcwa.rcwa_geo.square(W=self.Wx,Cx=L[0]/2.,Cy=L[1]/2., theta=self.theta)
+            layer0_geometry = torcwa.rcwa_geo.square(W=self.Wx, Cx=L[0]/2.,Cy=L[1]/2., theta=self.theta)
         elif self.shape_type == 'cross':
             layer0_geometry_A = torcwa.rcwa_geo.rectangle(Wx=self.Wx,Wy=self.Wy,Cx=L[0]/2.,Cy=L[1]/2., theta=self.theta+0)
             layer0_geometry_B = torcwa.rcwa_geo.rectangle(Wx=self.Wx,Wy=self.Wy,Cx=L[0]/2.,Cy=L[1]/2., theta=self.theta+np.pi/2)
@@ -113,6 +105,32 @@ class RCWA:
             layer0_geometry_A = torcwa.rcwa_geo.circle(R=self.R/2,Cx=L[0]/2.,Cy=L[1]/2.)
             layer0_geometry_B = torcwa.rcwa_geo.circle(R=self.hollow_R/2,Cx=L[0]/2.,Cy=L[1]/2.)
             layer0_geometry = torcwa.rcwa_geo.difference(layer0_geometry_A,layer0_geometry_B)
+        else:
+            raise ValueError(f"shape_type not recognized: {self.shape_type}")
+        return layer0_geometry
+
+    def show_structure(self):
+        """
+        在這裡實作或呼叫建構結構所需的程式碼。
+        """
+        # matplotlib 只有畫結構時才需要，避免無 GUI 的批次計算也載入它
+        import matplotlib.pyplot as plt
+        geo_dtype = torch.float32
+        device = self.device
+
+        # Simulation environment
+        # light
+        lamb0 = torch.tensor(self.wavelength,dtype=geo_dtype,device=device)    # nm
+
+        # material
+        silicon_eps = Materials.Material.forward(wavelength=lamb0, name=self.metasurface_material)**2
+        filling_eps = Materials.Material.forward(wavelength=lamb0, name=self.filling_material)**2
+
+        # geometry
+        L = [self.period, self.period]            # nm / nm
+        layer0_geometry = self.layer_geometry(geo_dtype)
+        x_axis = torcwa.rcwa_geo.x.cpu()
+        y_axis = torcwa.rcwa_geo.y.cpu()
         layer0_eps = layer0_geometry*silicon_eps + filling_eps*(1.-layer0_geometry)
         figure, ax = plt.subplots()
         plt.imshow(torch.transpose(torch.real(layer0_eps),-2,-1).cpu(),origin='lower',extent=[x_axis[0],x_axis[-1],y_axis[0],y_axis[-1]])
@@ -130,13 +148,29 @@ class RCWA:
         在此實作 RCWA 計算部分，回傳 Transmission 和 Phase。
         這裡先回傳固定值做示範，可自行替換成真實演算法計算結果。
         """
+        sim = self.solve()
+        with TIMER.stage("s_parameters"):
+            txx = sim.S_parameters(orders=[0,0],direction='forward',port='transmission',polarization='xx',ref_order=[0,0])
+            txy = sim.S_parameters(orders=[0,0],direction='forward',port='transmission',polarization='xy',ref_order=[0,0])
+            tyx = sim.S_parameters(orders=[0,0],direction='forward',port='transmission',polarization='yx',ref_order=[0,0])
+            tyy = sim.S_parameters(orders=[0,0],direction='forward',port='transmission',polarization='yy',ref_order=[0,0])
+        return txx,txy,tyx,tyy
+
+    def solve(self):
+        """
+        建立並求解整個疊層，回傳已算好 global S-matrix 的 torcwa.rcwa 物件
+        (get_Sparameter 只取 0 階穿透；驗證工具另外取反射或反向入射的 S 參數)。
+        """
         # Hardware
         # If GPU support TF32 tensor core, the matmul operation is faster than FP32 but with less precision.
         # If you need accurate operation, you have to disable the flag below.
         #torch.backends.cuda.matmul.allow_tf32 = False
-        sim_dtype = torch.complex64
-        geo_dtype = torch.float32
+        sim_dtype = self.dtype
+        geo_dtype = torch.float64 if sim_dtype == torch.complex128 else torch.float32
         device = self.device
+        timer = TIMER
+        if timer.enabled:
+            timer.cuda_sync = torch.device(device).type == 'cuda'
 
         # Simulation environment
         # light
@@ -145,44 +179,17 @@ class RCWA:
         azi_ang = 0.*(np.pi/180)                    # radian
 
         # material
-        slab_eps = Materials.Material.forward(wavelength=lamb0, name=self.slab_material)**2
-        substrate_eps = Materials.Material.forward(wavelength=lamb0, name=self.substrate_material)**2
-        silicon_eps = Materials.Material.forward(wavelength=lamb0, name=self.metasurface_material)**2
-        filling_eps = Materials.Material.forward(wavelength=lamb0, name=self.filling_material)**2
-        output_eps = Materials.Material.forward(wavelength=lamb0, name=self.output_material)**2
+        with timer.stage("material"):
+            slab_eps = Materials.Material.forward(wavelength=lamb0, name=self.slab_material)**2
+            substrate_eps = Materials.Material.forward(wavelength=lamb0, name=self.substrate_material)**2
+            silicon_eps = Materials.Material.forward(wavelength=lamb0, name=self.metasurface_material)**2
+            filling_eps = Materials.Material.forward(wavelength=lamb0, name=self.filling_material)**2
+            output_eps = Materials.Material.forward(wavelength=lamb0, name=self.output_material)**2
         # geometry
         L = [self.period, self.period]            # nm / nm
-        torcwa.rcwa_geo.dtype = geo_dtype
-        torcwa.rcwa_geo.device = device
-        torcwa.rcwa_geo.Lx = L[0]
-        torcwa.rcwa_geo.Ly = L[1]
-        torcwa.rcwa_geo.nx = 300
-        torcwa.rcwa_geo.ny = 300
-        torcwa.rcwa_geo.grid()
-        torcwa.rcwa_geo.edge_sharpness = 1000.
-
-        if self.shape_type == 'rectangle':
-            layer0_geometry = torcwa.rcwa_geo.rectangle(Wx=self.Wx,Wy=self.Wy,Cx=L[0]/2.,Cy=L[1]/2., theta=self.theta)
-        elif self.shape_type == 'ellipse':
-            layer0_geometry = torcwa.rcwa_geo.ellipse(Rx=self.Rx/2,Ry=self.Ry/2,Cx=L[0]/2.,Cy=L[1]/2., theta=self.theta)
-        elif self.shape_type == 'circle':
-            layer0_geometry = torcwa.rcwa_geo.circle(R=self.R/2,Cx=L[0]/2.,Cy=L[1]/2.)
-        elif self.shape_type == 'rhombus':
-            layer0_geometry = torcwa.rcwa_geo.rhombus(Wx=self.Wx, Wy=self.Wy,Cx=L[0]/2., Cy=L[1]/2., theta=self.theta)
-        elif self.shape_type == 'square':
-            layer0_geometry = torcwa.rcwa_geo.square(W=self.Wx, Cx=L[0]/2.,Cy=L[1]/2., theta=self.theta)
-        elif self.shape_type == 'cross':
-            layer0_geometry_A = torcwa.rcwa_geo.rectangle(Wx=self.Wx,Wy=self.Wy,Cx=L[0]/2.,Cy=L[1]/2., theta=self.theta+0)
-            layer0_geometry_B = torcwa.rcwa_geo.rectangle(Wx=self.Wx,Wy=self.Wy,Cx=L[0]/2.,Cy=L[1]/2., theta=self.theta+np.pi/2)
-            layer0_geometry = torcwa.rcwa_geo.union(layer0_geometry_A,layer0_geometry_B)
-        elif self.shape_type == 'hollow_square':
-            layer0_geometry_A = torcwa.rcwa_geo.square(W=self.Wx,Cx=L[0]/2.,Cy=L[1]/2., theta=self.theta)
-            layer0_geometry_B = torcwa.rcwa_geo.square(W=self.hollow_W,Cx=L[0]/2.,Cy=L[1]/2., theta=self.theta)
-            layer0_geometry = torcwa.rcwa_geo.difference(layer0_geometry_A,layer0_geometry_B)
-        elif self.shape_type == 'hollow_circle':
-            layer0_geometry_A = torcwa.rcwa_geo.circle(R=self.R/2,Cx=L[0]/2.,Cy=L[1]/2.)
-            layer0_geometry_B = torcwa.rcwa_geo.circle(R=self.hollow_R/2,Cx=L[0]/2.,Cy=L[1]/2.)
-            layer0_geometry = torcwa.rcwa_geo.difference(layer0_geometry_A,layer0_geometry_B)
+        with timer.stage("geometry"):
+            layer0_geometry = self.layer_geometry(geo_dtype)
+            layer0_eps = layer0_geometry*silicon_eps + filling_eps*(1.-layer0_geometry)
         
         # layers
         layer0_thickness = self.metasurface_thickness
@@ -191,17 +198,20 @@ class RCWA:
         # Generate and perform simulation
         order_N = self.harmonic_order
         order = [order_N,order_N]
-        sim = torcwa.rcwa(freq=1/lamb0,order=order,L=L,dtype=sim_dtype,device=device)
-        sim.add_input_layer(eps=substrate_eps)
-        sim.add_output_layer(eps=output_eps)
-        sim.set_incident_angle(inc_ang=inc_ang,azi_ang=azi_ang)
+        with timer.stage("setup"):
+            sim = torcwa.rcwa(freq=1/lamb0,order=order,L=L,dtype=sim_dtype,device=device)
+            sim.add_input_layer(eps=substrate_eps)
+            sim.add_output_layer(eps=output_eps)
+            sim.set_incident_angle(inc_ang=inc_ang,azi_ang=azi_ang)
+        if timer.enabled:
+            # add_layer 內部的 FFT/Toeplitz、特徵分解與單層 S-matrix 分開計時
+            sim._material_conv = timer.wrap("fft_toeplitz", sim._material_conv)
+            sim._eigen_decomposition = timer.wrap("eigen", sim._eigen_decomposition)
+            sim._eigen_decomposition_homogenous = timer.wrap("eigen_homogeneous", sim._eigen_decomposition_homogenous)
+            sim._solve_layer_smatrix = timer.wrap("layer_smatrix", sim._solve_layer_smatrix)
         sim.add_layer(thickness=self.slab_thickness,eps=slab_eps)
-        layer0_eps = layer0_geometry*silicon_eps + filling_eps*(1.-layer0_geometry)
         sim.add_layer(thickness=layer0_thickness,eps=layer0_eps)
         sim.add_layer(thickness=filling_thickness,eps=filling_eps)
-        sim.solve_global_smatrix()
-        txx = sim.S_parameters(orders=[0,0],direction='forward',port='transmission',polarization='xx',ref_order=[0,0])
-        txy = sim.S_parameters(orders=[0,0],direction='forward',port='transmission',polarization='xy',ref_order=[0,0])
-        tyx = sim.S_parameters(orders=[0,0],direction='forward',port='transmission',polarization='yx',ref_order=[0,0])
-        tyy = sim.S_parameters(orders=[0,0],direction='forward',port='transmission',polarization='yy',ref_order=[0,0])
-        return txx,txy,tyx,tyy
\ No newline at end of file
+        with timer.stage("global_smatrix"):
+            sim.solve_global_smatrix()
+        return sim
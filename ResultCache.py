@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import numpy as np
+import torcwa
+from RCWA import SOLVER_VERSION
+from SweepEngine import SHAPE_AXES
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "rcwa_app", "results.sqlite")
+
+MATERIAL_PARAMS = [
+    "substrate_material", "slab_material", "metasurface_material",
+    "filling_material", "output_material",
+]
+LENGTH_PARAMS = ["wavelength", "period", "metasurface_thickness", "slab_thickness", "filling_thickness"]
+
+_material_hashes = {}
+
+
+def material_hash(name):
+    """材料檔內容的 sha256 (依檔案大小與修改時間快取)。"""
+    file_path = 'Materials_data/' + name
+    stat = os.stat(file_path)
+    token = (file_path, stat.st_size, stat.st_mtime_ns)
+    if token not in _material_hashes:
+        with open(file_path, "rb") as f:
+            _material_hashes[token] = hashlib.sha256(f.read()).hexdigest()
+    return _material_hashes[token]
+
+
+def solve_key(kwargs, dtype="complex64"):
+    """
+    以 RCWA 的完整求解定義 (形狀與其參數、材料與材料檔雜湊、厚度、週期、波長、
+    harmonic order、dtype、solver 版本) 算出 sha256 作為快取鍵。
+    """
+    shape_type = kwargs["shape_type"]
+    definition = {
+        "solver": [SOLVER_VERSION, getattr(torcwa, "__version__", "unknown")],
+        "dtype": str(dtype).replace("torch.", ""),
+        "shape_type": shape_type,
+        "harmonic_order": int(kwargs["harmonic_order"]),
+    }
+    for name in LENGTH_PARAMS:
+        definition[name] = float(kwargs[name])
+    for _, param, _ in SHAPE_AXES[shape_type]:
+        definition[param] = float(kwargs[param])
+    for name in MATERIAL_PARAMS:
+        definition[name] = [kwargs[name], material_hash(kwargs[name])]
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    以 sqlite 保存「求解定義雜湊 -> 2x2 Jones 矩陣」的持久快取，矩陣以求解時的精度 (dtype 欄) 保存。
+    超過 max_entries 時依最後存取時間淘汰最舊的項目，並統計命中率。
+    項目數在開啟時讀一次，之後隨新增與淘汰更新，flush 不必每次 COUNT(*)。
+    """
+    def __init__(self, file_path=DEFAULT_CACHE_FILE, max_entries=2_000_000, commit_every=64):
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file_path = file_path
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(file_path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, jones BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(results)")]
+        if "dtype" not in columns:
+            # 舊版快取只存 complex64
+            self.connection.execute("ALTER TABLE results ADD COLUMN dtype TEXT NOT NULL DEFAULT 'complex64'")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+        self.connection.commit()
+        self.count = self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def key(self, kwargs):
+        return solve_key(kwargs, kwargs.get("dtype", "complex64"))
+
+    def get(self, key):
+        """回傳 (2, 2) 的 Jones 矩陣 (存入時的精度)，沒有時回傳 None。"""
+        row = self.connection.execute("SELECT jones, dtype FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._tick()
+        return np.frombuffer(row[0], dtype=np.dtype(row[1])).reshape(2, 2).copy()
+
+    def contains(self, key):
+        """是否已有此 key (不計入命中率、不更新存取時間)。"""
+        return self.connection.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key, jones):
+        jones = np.ascontiguousarray(jones)
+        if jones.dtype not in (np.complex64, np.complex128):
+            jones = jones.astype(np.complex64)
+        row = (jones.tobytes(), jones.dtype.name, time.time(), key)
+        updated = self.connection.execute(
+            "UPDATE results SET jones = ?, dtype = ?, last_access = ? WHERE key = ?", row,
+        ).rowcount
+        if not updated:
+            self.connection.execute("INSERT INTO results (jones, dtype, last_access, key) VALUES (?, ?, ?, ?)", row)
+            self.count += 1
+        self._tick()
+
+    def _tick(self):
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.flush()
+
+    def flush(self):
+        """寫入尚未 commit 的項目，必要時淘汰最舊的項目。"""
+        if self.count > self.max_entries:
+            self.count -= self.connection.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY last_access ASC LIMIT ?)",
+                (self.count - self.max_entries,),
+            ).rowcount
+        self.connection.commit()
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def stats(self):
+        return f"cache: {self.hits} hits / {self.misses} misses ({100 * self.hit_rate:.1f}% hit rate)"
@@ -0,0 +1,55 @@
+import os
+import numpy as np
+
+
+class ResultStore:
+    """
+    SweepEngine 的結果陣列：每個點存一個 2x2 complex64 Jones 矩陣 (jones.npy)。
+      - directory 為 None：一般的記憶體陣列
+      - 指定 directory：以 np.lib.format.open_memmap 建立磁碟上的 .npy memmap，
+        每算完一批就直接 scatter 寫入，每 flush_every 個點 flush 一次 (一個 chunk)，
+        所以常駐記憶體只剩作業系統的 page cache，與掃描大小無關。
+    resume=True 時沿用目錄中形狀相同的既有檔案 (搭配 checkpoint 恢復)。
+    """
+    def __init__(self, shape, directory=None, dtype=np.complex64, resume=False, flush_every=4096):
+        self.shape = tuple(shape) + (2, 2)
+        self.dtype = np.dtype(dtype)
+        self.directory = directory
+        self.flush_every = flush_every
+        self.points_since_flush = 0
+        self.resumed = resume
+        if directory is None:
+            self.resumed = False
+            self.jones = np.zeros(self.shape, dtype=self.dtype)
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self.jones = self._open("jones.npy", resume)
+        self.flat_jones = self.jones.reshape(-1, 2, 2)
+
+    @property
+    def on_disk(self):
+        return self.directory is not None
+
+    def _open(self, name, resume):
+        file_path = os.path.join(self.directory, name)
+        if os.path.exists(file_path):
+            if resume:
+                array = np.load(file_path, mmap_mode="r+")
+                if array.shape == self.shape and array.dtype == self.dtype:
+                    return array
+            # 先 unlink 再建新檔，避免截斷仍被舊 data_sheet 映射中的檔案
+            os.remove(file_path)
+        self.resumed = False
+        return np.lib.format.open_memmap(file_path, mode="w+", dtype=self.dtype, shape=self.shape)
+
+    def write(self, indices, jones):
+        """把一批 (B, 2, 2) 的 Jones 矩陣 scatter 到 flat index indices。"""
+        self.flat_jones[indices] = jones
+        self.points_since_flush += len(indices)
+        if self.on_disk and self.points_since_flush >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self.on_disk:
+            self.jones.flush()
+        self.points_since_flush = 0
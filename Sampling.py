@@ -0,0 +1,72 @@
+"""
+高維設計空間的準隨機取樣：在各掃描軸的 [min, max] 範圍內抽出均勻填滿空間的 samples 個點
+(Sobol 序列或 Latin hypercube)，以既有的 RCWA 路徑求解，輸出 scattered 資料集 (Scattered)。
+求解次數由 samples 直接控制，與維度無關；例如 6 維 x 每軸 20 點的網格要 6400 萬次求解，
+這裡可以只解幾千個點，再用內插或代理模型探索。
+只有一個數值 (N = 1) 的軸固定不取樣，其餘軸的 N 只決定顯示 / 匯出網格的點數。
+"""
+import numpy as np
+from scipy.stats import qmc
+
+from Scattered import scattered_data_sheet
+from SweepEngine import SweepEngine
+
+METHODS = ("sobol", "lhs")
+
+
+def sample_design(method, bounds, samples, seed=None):
+    """回傳 (samples, R) 的取樣點，bounds 為 (R, 2) 的 [min, max]。"""
+    bounds = np.asarray(bounds, dtype=float)
+    if method == "sobol":
+        sampler = qmc.Sobol(len(bounds), scramble=True, seed=seed)
+        # Sobol 序列在 2 的次方個點時平衡性最好，其餘點數取前 samples 個
+        m = int(np.ceil(np.log2(max(samples, 1))))
+        unit = sampler.random_base2(m)[:samples]
+    elif method == "lhs":
+        unit = qmc.LatinHypercube(len(bounds), seed=seed).random(samples)
+    else:
+        raise ValueError(f"未知的取樣方式: {method} (可用 {', '.join(METHODS)})")
+    return qmc.scale(unit, bounds[:, 0], bounds[:, 1])
+
+
+class QuasiRandomSweep:
+    """
+    params 與 SweepEngine 相同，有多個數值的軸在 [min, max] 內取樣；
+    其餘的 engine_kwargs (cache、workers、dtype …) 交給內部的 SweepEngine 求解。
+    """
+    def __init__(self, params, samples, method="sobol", seed=None, **engine_kwargs):
+        self.engine = SweepEngine(params, **engine_kwargs)
+        self.axes = self.engine.axes
+        self.sample_dims = [d for d, axis in enumerate(self.axes) if len(axis.values) > 1]
+        if not self.sample_dims:
+            raise ValueError("準隨機取樣至少需要一個掃描軸有兩個以上的數值")
+        self.samples = int(samples)
+        self.method = method
+        self.seed = seed
+        bounds = [(self.axes[d].values[0], self.axes[d].values[-1]) for d in self.sample_dims]
+        design = sample_design(method, bounds, self.samples, seed)
+        self.points = np.empty((self.samples, len(self.axes)))
+        for d, axis in enumerate(self.axes):
+            self.points[:, d] = axis.values[0]
+        self.points[:, self.sample_dims] = design
+
+    def run(self, on_point=None):
+        """求解所有取樣點，回傳 scattered data_sheet；on_point(done, total) 回傳 False 時中止並回傳 None。"""
+        jones = np.zeros((self.samples, 2, 2), dtype=np.complex64)
+        batch_size = self.engine.batch_size
+        self.engine.reset_representatives()
+        with self.engine.worker_pool() as pool:
+            for start in range(0, self.samples, batch_size):
+                stop = min(start + batch_size, self.samples)
+                kwargs_list = []
+                for row in self.points[start:stop]:
+                    kwargs = dict(self.engine.fixed_kwargs)
+                    kwargs.update({axis.param: value for axis, value in zip(self.axes, row)})
+                    kwargs_list.append(kwargs)
+                jones[start:stop] = self.engine.solve_many(kwargs_list, pool)
+                if on_point is not None and on_point(stop, self.samples) is False:
+                    return None
+        return scattered_data_sheet(
+            self.engine.shape_type, self.axes, self.engine.fixed_kwargs, self.points, jones,
+            Sampling=self.method, Seed=self.seed, Sample_dims=self.sample_dims,
+        )
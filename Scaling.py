@@ -0,0 +1,75 @@
+"""
+Maxwell 方程式的尺度不變性：材料折射率固定時，把波長、週期、各層厚度與柱體尺寸同乘一個倍數，
+(功率正規化的) Jones 矩陣不變。
+掃描開始前先把每個材料在掃描波段內切成「平坦區段」(區段內 n + ik 與區段起點的差 <= tol)，
+之後每個點換算成無因次的 key：(所有長度 / 波長, theta, 各材料所在的平坦區段)。
+key 相同的點只需要解一次；色散明顯的材料每個波長自成一段，不會被誤判為等價。
+"""
+import functools
+
+import numpy as np
+import torch
+
+import Materials
+
+# 與波長一起縮放的長度參數 (nm)
+LENGTH_PARAMS = [
+    "period", "metasurface_thickness", "slab_thickness", "filling_thickness",
+    "Wx", "Wy", "Rx", "Ry", "R", "hollow_W", "hollow_R",
+]
+MATERIAL_PARAMS = ["substrate_material", "slab_material", "metasurface_material", "filling_material", "output_material"]
+
+# 視為平坦的折射率變化上限 (|Δ(n + ik)|)
+INDEX_TOL = 1e-5
+DECIMALS = 9
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def refractive_index(name, wavelength):
+    lamb0 = torch.tensor(float(wavelength), dtype=torch.float64)
+    return complex(Materials.Material.forward(wavelength=lamb0, name=name))
+
+
+def flat_segments(name, wavelengths, tol=INDEX_TOL):
+    """遞增的 wavelengths 上每個波長所屬的平坦區段編號。"""
+    segments = np.zeros(len(wavelengths), dtype=int)
+    start = None
+    for i, wavelength in enumerate(wavelengths):
+        n = refractive_index(name, wavelength)
+        if start is None or abs(n - start) > tol:
+            start = n
+            segments[i] = segments[i - 1] + 1 if i > 0 else 0
+        else:
+            segments[i] = segments[i - 1]
+    return segments
+
+
+class ScaleIndex:
+    """
+    一次掃描的無因次 key。fixed_kwargs 提供材料，wavelengths 為掃描的波長。
+    所有材料在整個波段都只有一段時 (例如全部是 air.txt 或超出色散表範圍的常數區)，
+    不同波長之間可以互相沿用結果。
+    """
+    def __init__(self, fixed_kwargs, wavelengths, tol=INDEX_TOL):
+        wavelengths = np.unique(np.round(np.asarray(wavelengths, dtype=float), DECIMALS))
+        per_material = [flat_segments(fixed_kwargs[param], wavelengths, tol) for param in MATERIAL_PARAMS]
+        self.segments = {float(w): tuple(int(s[i]) for s in per_material) for i, w in enumerate(wavelengths)}
+        self.segment_count = len(set(self.segments.values()))
+
+    @property
+    def useful(self):
+        """至少有兩個波長落在同一組平坦區段時才可能沿用結果。"""
+        return self.segment_count < len(self.segments)
+
+    def key(self, kwargs):
+        wavelength = float(kwargs["wavelength"])
+        segments = self.segments.get(round(wavelength, DECIMALS))
+        if segments is None:
+            # 不在掃描波段內的波長 (不應發生)：以波長本身區分
+            segments = (wavelength,)
+        ratios = tuple(
+            round(float(kwargs[param]) / wavelength, DECIMALS) if kwargs.get(param) is not None else None
+            for param in LENGTH_PARAMS
+        )
+        theta = kwargs.get("theta")
+        return ratios + (None if theta is None else round(float(theta), DECIMALS),) + segments
@@ -0,0 +1,182 @@
+"""
+非網格 (scattered) 的掃描資料集：取樣點不在 Cartesian 網格上 (自適應細分、準隨機取樣)。
+data_sheet 的格式與網格資料集相同，另外有：
+  Layout        : "scattered"
+  sample_tensor : (N, D) 每個取樣點在各掃描軸 (依 axis_specs 順序) 的座標
+  jones_tensor  : (N, 2, 2) 每個取樣點的 Jones 矩陣
+  各軸的 key    : 顯示 / 匯出成網格時使用的軸數值
+內插器依資料集種類而定 (interpolator)，GridView 以內插器把資料集包裝成網格外觀，
+只在被切片時才計算，DataVisualize 因此可以直接顯示；to_grid 則整份匯出成一般的網格資料集。
+"""
+import numpy as np
+
+from Jones import normalize_key
+from SweepEngine import axis_specs
+
+SCATTERED = "scattered"
+# to_grid / GridView 每次內插的點數上限
+CHUNK_POINTS = 1 << 16
+
+
+def is_scattered(data_sheet):
+    return data_sheet.get("Layout") == SCATTERED
+
+
+def scattered_data_sheet(shape_type, axes, fixed_kwargs, samples, jones, **extra):
+    """
+    組成 scattered data_sheet。axes 為 SweepEngine.Axis 清單 (values 為顯示用的軸數值)，
+    samples 為 (N, D) 座標，extra 為各取樣方式自己的欄位 (例如自適應的細分樹)。
+    """
+    data_sheet = {
+        "shape_type": shape_type,
+        "Layout": SCATTERED,
+        "Dimension_name": [axis.name for axis in axes],
+        "Parameters": {
+            name: str(value) if name == "device" else value
+            for name, value in fixed_kwargs.items()
+        },
+    }
+    for axis in axes:
+        data_sheet[axis.key] = axis.values
+    data_sheet.update(extra)
+    data_sheet["sample_tensor"] = np.asarray(samples, dtype=np.float64)
+    data_sheet["jones_tensor"] = np.asarray(jones, dtype=np.complex64)
+    return data_sheet
+
+
+def interpolator(data_sheet):
+    """回傳內插函式 f(points (M, D)) -> (M, 2, 2)。"""
+    if "leaf_tensor" in data_sheet:
+        from Adaptive import AdaptiveInterpolator
+        return AdaptiveInterpolator.from_data_sheet(data_sheet)
+    return ScatteredInterpolator.from_data_sheet(data_sheet)
+
+
+class ScatteredInterpolator:
+    """
+    任意分布取樣點 (準隨機取樣等) 的內插，對複數 Jones 矩陣的實部與虛部分別內插 (不內插相位，避免 2π 跳動)。
+    座標先依各軸的範圍正規化到 [0, 1]，只使用有變化的軸：
+      - 不超過 LINEAR_DIMS 維：Delaunay 三角化的分段線性內插，凸包外以最近的取樣點補上
+      - 更高維：三角化太慢，改用 k 個最近鄰的加權局部線性擬合 (反距離加權，帶少量 ridge 避免退化)
+    """
+    LINEAR_DIMS = 3
+    RIDGE = 1e-6
+
+    def __init__(self, samples, jones, lower, upper):
+        from scipy.spatial import cKDTree
+        samples = np.asarray(samples, dtype=np.float64)
+        self.lower = np.asarray(lower, dtype=np.float64)
+        span = np.asarray(upper, dtype=np.float64) - self.lower
+        self.dims = np.flatnonzero(span > 0)
+        self.span = span[self.dims]
+        self.jones = np.asarray(jones, dtype=np.complex64).reshape(-1, 4)
+        unit = self._normalize(samples)
+        self.tree = cKDTree(unit)
+        self.linear = None
+        if 0 < len(self.dims) <= self.LINEAR_DIMS:
+            from scipy.interpolate import LinearNDInterpolator
+            if len(self.dims) == 1:
+                from scipy.interpolate import interp1d
+                order = np.argsort(unit[:, 0])
+                self.linear = interp1d(unit[order, 0], self.jones[order], axis=0,
+                                       bounds_error=False, fill_value=np.nan, assume_sorted=True)
+            else:
+                self.linear = LinearNDInterpolator(unit, self.jones, fill_value=np.nan)
+
+    @classmethod
+    def from_data_sheet(cls, data_sheet):
+        values = grid_axes_values(data_sheet)
+        lower = [v.min() for v in values]
+        upper = [v.max() for v in values]
+        return cls(data_sheet["sample_tensor"], data_sheet["jones_tensor"], lower, upper)
+
+    def _normalize(self, points):
+        return (points[:, self.dims] - self.lower[self.dims]) / self.span
+
+    def __call__(self, points):
+        unit = self._normalize(np.asarray(points, dtype=np.float64))
+        if self.linear is not None:
+            out = np.asarray(self.linear(unit[:, 0] if len(self.dims) == 1 else unit), dtype=np.complex128)
+            outside = np.isnan(out).any(axis=-1)
+            if outside.any():
+                _, nearest = self.tree.query(unit[outside])
+                out[outside] = self.jones[nearest]
+        else:
+            out = self._local_linear(unit)
+        return out.reshape(-1, 2, 2).astype(np.complex64)
+
+    def _local_linear(self, unit):
+        dims = unit.shape[1]
+        k = min(2 * (dims + 1), len(self.jones))
+        distance, nearest = self.tree.query(unit, k=k)
+        distance, nearest = distance.reshape(len(unit), k), nearest.reshape(len(unit), k)
+        weights = 1. / np.maximum(distance, 1e-12)**2
+        weights /= weights.sum(axis=1, keepdims=True)
+        # 以查詢點為原點的 [1, Δx] 設計矩陣，截距即為內插值
+        design = np.concatenate([np.ones((len(unit), k, 1)), self.tree.data[nearest] - unit[:, None]], axis=-1)
+        normal = np.einsum("mk,mki,mkj->mij", weights, design, design)
+        normal += self.RIDGE * np.eye(dims + 1)
+        rhs = np.einsum("mk,mki,mkc->mic", weights, design, self.jones[nearest].astype(np.complex128))
+        return np.linalg.solve(normal.astype(np.complex128), rhs)[:, 0]
+
+
+class GridView:
+    """
+    以 (n_1, ..., n_D, 2, 2) 網格外觀包裝內插函式：索引時只內插被選到的點。
+    axis_values: 每個軸的數值。
+    """
+    def __init__(self, interpolate, axis_values):
+        self.interpolate = interpolate
+        self.axis_values = [np.asarray(values, dtype=float) for values in axis_values]
+        self.shape = tuple(len(values) for values in self.axis_values) + (2, 2)
+        self.ndim = len(self.shape)
+        self.dtype = np.dtype(np.complex64)
+
+    def __getitem__(self, key):
+        dims = len(self.axis_values)
+        key = normalize_key(key, self.ndim)
+        grid_key, jones_key = key[:dims], key[dims:]
+        selected = [np.atleast_1d(values[k]) for values, k in zip(self.axis_values, grid_key)]
+        out_shape = tuple(len(v) for v, k in zip(selected, grid_key) if isinstance(k, slice))
+        mesh = np.meshgrid(*selected, indexing="ij")
+        points = np.stack([m.ravel() for m in mesh], axis=-1)
+        jones = evaluate(self.interpolate, points)
+        return jones.reshape(out_shape + (2, 2))[(Ellipsis,) + jones_key]
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[...]
+        return array if dtype is None else array.astype(dtype)
+
+
+def evaluate(interpolate, points, chunk_points=CHUNK_POINTS):
+    """分塊內插，限制暫存記憶體。"""
+    out = np.empty((len(points), 2, 2), dtype=np.complex64)
+    for start in range(0, len(points), chunk_points):
+        out[start:start + chunk_points] = interpolate(points[start:start + chunk_points])
+    return out
+
+
+def grid_axes_values(data_sheet, counts=None):
+    """各軸的網格數值；counts 給定時改為 min~max 之間的 linspace (個數為 counts 中對應的值)。"""
+    values = [np.asarray(data_sheet[key], dtype=float) for key, _, _ in axis_specs(data_sheet["shape_type"])]
+    if counts is not None:
+        values = [v if n is None or len(v) < 2 else np.linspace(v[0], v[-1], int(n)) for v, n in zip(values, counts)]
+    return values
+
+
+def grid_view_sheet(data_sheet, counts=None):
+    """把 scattered 資料集包裝成網格資料集 (jones_tensor 為 GridView，切片時才內插)。"""
+    values = grid_axes_values(data_sheet, counts)
+    sheet = {key: value for key, value in data_sheet.items()
+             if key not in ("Layout", "sample_tensor") and not key.endswith("_tensor")}
+    for (key, _, _), axis_values in zip(axis_specs(data_sheet["shape_type"]), values):
+        sheet[key] = axis_values
+    sheet["jones_tensor"] = GridView(interpolator(data_sheet), values)
+    return sheet
+
+
+def to_grid(data_sheet, counts=None):
+    """把 scattered 資料集內插成一般的網格資料集 (整份計算)。counts 為每個軸的點數 (None 為資料集自己的軸數值)。"""
+    sheet = grid_view_sheet(data_sheet, counts)
+    sheet["jones_tensor"] = np.asarray(sheet["jones_tensor"])
+    return sheet
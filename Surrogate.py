@@ -0,0 +1,250 @@
+"""
+meta-atom 的代理模型：以已存的資料集 (網格或 scattered) 訓練小型 MLP，把 (波長, 週期, 厚度, 尺寸, theta)
+對應到複數 Jones 矩陣 (實部 / 虛部共 8 個輸出，不學相位，避免 2π 跳動)。
+  - 以 members 個獨立初始化的 MLP 組成 ensemble，成員之間的離散度作為不確定度
+  - 權重以 (members, in, out) 堆疊，一次 batched matmul 算完整個 ensemble，CPU 上每秒可查數百萬點
+  - 訓練時保留 holdout 比例的點不參與訓練，回報這些點上的誤差
+  - save / load 為單一檔案 (torch.save)，包含重建求解條件所需的 Parameters 與掃描軸
+  - query(max_uncertainty=...) 把不確定度過高或超出訓練範圍的點改以 RCWA 實際求解
+"""
+import time
+
+import numpy as np
+import torch
+
+from Jones import channel_amplitudes, sheet_jones
+from Pruning import INVALID, classify
+from Scattered import is_scattered
+from SweepEngine import Axis, SweepEngine, axis_specs
+
+# 訓練時最多使用的點數 (網格很大時隨機抽樣)
+MAX_TRAIN_POINTS = 1 << 20
+# 推論時每次送進網路的點數
+CHUNK_POINTS = 1 << 16
+
+
+def training_data(data_sheet, max_points=MAX_TRAIN_POINTS, seed=0):
+    """
+    回傳 (points (N, D), jones (N, 2, 2))，points 依 axis_specs 的軸順序。
+    網格資料集展開成每個格點一列，超過 max_points 時隨機抽樣；NaN (無效幾何) 的點不納入。
+    舊格式 (只有 transmission / phase) 的資料集以 sheet_jones 重建 Jones 矩陣。
+    """
+    if is_scattered(data_sheet):
+        points = np.asarray(data_sheet["sample_tensor"], dtype=np.float64)
+        jones = np.asarray(sheet_jones(data_sheet)).reshape(-1, 2, 2)
+    else:
+        values = [np.asarray(data_sheet[key], dtype=np.float64) for key, _, _ in axis_specs(data_sheet["shape_type"])]
+        shape = tuple(len(v) for v in values)
+        total = int(np.prod(shape))
+        if total > max_points:
+            flat = np.sort(np.random.default_rng(seed).choice(total, max_points, replace=False))
+        else:
+            flat = np.arange(total)
+        index = np.unravel_index(flat, shape)
+        points = np.stack([v[i] for v, i in zip(values, index)], axis=-1)
+        jones = np.asarray(sheet_jones(data_sheet)).reshape(-1, 2, 2)[flat]
+    valid = np.isfinite(jones).all(axis=(1, 2))
+    return points[valid], jones[valid].astype(np.complex64)
+
+
+class EnsembleMLP(torch.nn.Module):
+    """members 個相同架構的 MLP，權重堆疊成 (members, in, out)。輸入 (B, in)，輸出 (members, B, out)。"""
+    def __init__(self, inputs, outputs, hidden=64, layers=3, members=4):
+        super().__init__()
+        sizes = [inputs] + [hidden] * layers + [outputs]
+        self.weights = torch.nn.ParameterList()
+        self.biases = torch.nn.ParameterList()
+        for fan_in, fan_out in zip(sizes[:-1], sizes[1:]):
+            bound = 1. / np.sqrt(fan_in)
+            self.weights.append(torch.nn.Parameter(torch.empty(members, fan_in, fan_out).uniform_(-bound, bound)))
+            self.biases.append(torch.nn.Parameter(torch.empty(members, 1, fan_out).uniform_(-bound, bound)))
+
+    def forward(self, x):
+        h = x.unsqueeze(0).expand(len(self.weights[0]), -1, -1)
+        last = len(self.weights) - 1
+        for layer, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            h = torch.baddbmm(bias, h, weight)
+            if layer < last:
+                h = torch.nn.functional.silu(h)
+        return h
+
+
+def _to_real(jones):
+    flat = np.asarray(jones).reshape(-1, 4)
+    return np.concatenate([flat.real, flat.imag], axis=-1).astype(np.float32)
+
+
+def _to_complex(outputs):
+    return (outputs[..., :4] + 1j * outputs[..., 4:]).reshape(outputs.shape[:-1] + (2, 2))
+
+
+class Surrogate:
+    """
+    由 train() 或 load() 建立。points 一律是 (M, D)，D 為該 shape_type 的所有掃描軸 (axis_specs 順序)，
+    資料集中固定不變的軸 (只有一個數值) 不作為網路輸入。
+    """
+    def __init__(self, shape_type, parameters, axis_values, lower, upper, model, config, report=None):
+        self.shape_type = shape_type
+        self.parameters = dict(parameters or {})
+        self.axis_values = [np.asarray(values, dtype=np.float64) for values in axis_values]
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.dims = np.flatnonzero(self.upper > self.lower)
+        self.model = model.eval()
+        self.config = dict(config)
+        self.report = report or {}
+
+    @classmethod
+    def train(cls, data_sheet, holdout=0.1, hidden=64, layers=3, members=4, steps=5000, batch_size=512,
+              learning_rate=3e-3, max_points=MAX_TRAIN_POINTS, seed=0, log_every=0):
+        """
+        以 data_sheet 訓練 steps 步 (每步一個 batch_size 的 mini-batch)，回傳 Surrogate；
+        .report 為 holdout 點上的誤差。
+        """
+        points, jones = training_data(data_sheet, max_points=max_points, seed=seed)
+        if len(points) < 2:
+            raise ValueError("資料集的有效點太少，無法訓練代理模型")
+        axis_values = [np.asarray(data_sheet[key], dtype=np.float64) for key, _, _ in axis_specs(data_sheet["shape_type"])]
+        lower = np.minimum(points.min(axis=0), [v.min() for v in axis_values])
+        upper = np.maximum(points.max(axis=0), [v.max() for v in axis_values])
+        config = {"hidden": hidden, "layers": layers, "members": members}
+        torch.manual_seed(seed)
+        dims = int((upper > lower).sum())
+        model = EnsembleMLP(dims, 8, **config)
+        surrogate = cls(data_sheet["shape_type"], data_sheet.get("Parameters"), axis_values, lower, upper, model, config)
+
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(points))
+        n_holdout = int(round(len(points) * holdout)) if len(points) > 10 else 0
+        test, train = order[:n_holdout], order[n_holdout:]
+        x = torch.from_numpy(surrogate._normalize(points))
+        y = torch.from_numpy(_to_real(jones))
+
+        optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+        scheduler = torch.optim.lr_scheduler.OneCycleLR(optimizer, max_lr=learning_rate, total_steps=steps)
+        start = time.perf_counter()
+        model.train()
+        shuffled, begin = train[rng.permutation(len(train))], 0
+        for step in range(steps):
+            if begin >= len(shuffled):
+                shuffled, begin = train[rng.permutation(len(train))], 0
+            batch = torch.from_numpy(shuffled[begin:begin + batch_size])
+            begin += batch_size
+            loss = torch.mean((model(x[batch]) - y[batch])**2)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            scheduler.step()
+            if log_every and (step + 1) % log_every == 0:
+                print(f"step {step + 1}/{steps}: loss={loss.item():.3e}")
+        model.eval()
+
+        surrogate.report = {"train_points": len(train), "holdout_points": len(test),
+                            "train_seconds": time.perf_counter() - start}
+        if len(test):
+            surrogate.report.update(surrogate.evaluate(points[test], jones[test]))
+        return surrogate
+
+    def _normalize(self, points):
+        points = np.asarray(points, dtype=np.float64)
+        return ((points[:, self.dims] - self.lower[self.dims]) / (self.upper - self.lower)[self.dims]).astype(np.float32)
+
+    def predict(self, points, chunk_points=CHUNK_POINTS):
+        """回傳 (jones (M, 2, 2) complex64, uncertainty (M,))；超出訓練範圍的點不確定度為 inf，無效幾何為 NaN。"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, len(self.lower))
+        jones = np.empty((len(points), 2, 2), dtype=np.complex64)
+        uncertainty = np.empty(len(points), dtype=np.float32)
+        with torch.inference_mode():
+            for begin in range(0, len(points), chunk_points):
+                chunk = points[begin:begin + chunk_points]
+                outputs = self.model(torch.from_numpy(self._normalize(chunk))).numpy()
+                mean = outputs.mean(axis=0)
+                jones[begin:begin + len(chunk)] = _to_complex(mean)
+                # 成員間 Jones 分量的標準差 (複數距離)，取四個分量中最大者
+                spread = ((outputs - mean)**2).mean(axis=0)
+                uncertainty[begin:begin + len(chunk)] = np.sqrt(spread[:, :4] + spread[:, 4:]).max(axis=-1)
+        span = self.upper - self.lower
+        outside = ((points < self.lower - 1e-9 * span) | (points > self.upper + 1e-9 * span)).any(axis=1)
+        uncertainty[outside] = np.inf
+        invalid = self._status(points) == INVALID
+        jones[invalid] = np.nan
+        uncertainty[invalid] = 0.
+        return jones, uncertainty
+
+    def _status(self, points):
+        values = dict(self.parameters)
+        for (_, param, _), column in zip(axis_specs(self.shape_type), points.T):
+            values[param] = column
+        return classify(self.shape_type, values)
+
+    def evaluate(self, points, jones):
+        """與參考 Jones 矩陣比較的誤差：|ΔJ| 的 RMS / 最大值、8 個通道的穿透率最大誤差，以及不確定度的分布。"""
+        predicted, uncertainty = self.predict(points)
+        error = np.abs(predicted - jones).reshape(len(points), 4)
+        transmission = np.abs(np.abs(channel_amplitudes(predicted))**2 - np.abs(channel_amplitudes(jones))**2)
+        return {
+            "jones_rmse": float(np.sqrt(np.mean(error**2))),
+            "jones_max_error": float(error.max()),
+            "transmission_max_error": float(transmission.max()),
+            "transmission_mean_error": float(transmission.mean()),
+            "uncertainty_median": float(np.median(uncertainty)),
+            "uncertainty_p95": float(np.percentile(uncertainty, 95)),
+        }
+
+    def engine(self, **engine_kwargs):
+        """以資料集的求解條件建立 SweepEngine (供 query 的 RCWA 後備求解)。"""
+        if not self.parameters:
+            raise ValueError("代理模型沒有 Parameters，無法以 RCWA 後備求解")
+        params = dict(self.parameters, shape_type=self.shape_type)
+        params.setdefault("device", "cpu")
+        axes = [Axis(key, param, name, values)
+                for (key, param, name), values in zip(axis_specs(self.shape_type), self.axis_values)]
+        return SweepEngine(params, axes=axes, **engine_kwargs)
+
+    def query(self, points, max_uncertainty=None, on_point=None, **engine_kwargs):
+        """
+        以代理模型查詢，回傳 (jones, uncertainty, solved)。max_uncertainty 給定時，不確定度超過它的點
+        (包括超出訓練範圍的點) 改以 RCWA 實際求解，solved 標示這些點、其不確定度設為 0。
+        engine_kwargs (cache、workers …) 交給後備求解的 SweepEngine。
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, len(self.lower))
+        jones, uncertainty = self.predict(points)
+        solved = np.zeros(len(points), dtype=bool)
+        if max_uncertainty is None:
+            return jones, uncertainty, solved
+        rows = np.flatnonzero(uncertainty > max_uncertainty)
+        if len(rows) == 0:
+            return jones, uncertainty, solved
+        engine = self.engine(**engine_kwargs)
+        params = [param for _, param, _ in axis_specs(self.shape_type)]
+        with engine.worker_pool() as pool:
+            for begin in range(0, len(rows), engine.batch_size):
+                batch = rows[begin:begin + engine.batch_size]
+                kwargs_list = [dict(engine.fixed_kwargs, **dict(zip(params, row))) for row in points[batch].tolist()]
+                jones[batch] = engine.solve_many(kwargs_list, pool)
+                solved[batch] = True
+                uncertainty[batch] = 0.
+                if on_point is not None and on_point(begin + len(batch), len(rows)) is False:
+                    break
+        return jones, uncertainty, solved
+
+    def save(self, file_path):
+        torch.save({
+            "shape_type": self.shape_type,
+            "parameters": self.parameters,
+            "axis_values": [values.tolist() for values in self.axis_values],
+            "lower": self.lower.tolist(),
+            "upper": self.upper.tolist(),
+            "config": self.config,
+            "report": self.report,
+            "state_dict": self.model.state_dict(),
+        }, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        state = torch.load(file_path, map_location="cpu", weights_only=True)
+        lower, upper = np.asarray(state["lower"]), np.asarray(state["upper"])
+        model = EnsembleMLP(int((upper > lower).sum()), 8, **state["config"])
+        model.load_state_dict(state["state_dict"])
+        return cls(state["shape_type"], state["parameters"], state["axis_values"], lower, upper,
+                   model, state["config"], state["report"])
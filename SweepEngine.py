@@ -0,0 +1,462 @@
+import multiprocessing
+import numpy as np
+import torch
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+from RCWA import RCWA
+from ResultStore import ResultStore
+from Timing import TIMER
+from Profiling import SweepProfiler
+from Checkpoint import sweep_signature
+from Jones import sheet_jones
+from Tuning import load_profile, init_worker
+from Pruning import pruned_jones, prune_counts
+from Scaling import ScaleIndex, LENGTH_PARAMS
+from Symmetry import IDENTITY, canonical_point, apply_transform, point_key, RepresentativeCache, symmetry_fraction
+
+# 掃描軸的宣告式描述：
+#   key   : data_sheet 中的欄位名稱
+#   param : get_gui_parameters() 的參數前綴 (param_min / param_max / param_n)，同時也是 RCWA 的參數名稱
+#   name  : 顯示用的維度名稱
+Axis = namedtuple("Axis", ["key", "param", "name", "values"])
+
+COMMON_AXES = [
+    ("Wavelength", "wavelength", "Wavelength (nm)"),
+    ("Period", "period", "Period (nm)"),
+    ("Thickness", "metasurface_thickness", "Thickness (nm)"),
+]
+
+_THETA_AXIS = ("Theta", "theta", "Rotation Angle (deg)")
+
+SHAPE_AXES = {
+    "rectangle": [("Wx", "Wx", "Wx (nm)"), ("Wy", "Wy", "Wy (nm)"), _THETA_AXIS],
+    "rhombus": [("Wx", "Wx", "Wx (nm)"), ("Wy", "Wy", "Wy (nm)"), _THETA_AXIS],
+    "cross": [("Wx", "Wx", "Wx (nm)"), ("Wy", "Wy", "Wy (nm)"), _THETA_AXIS],
+    "ellipse": [("Rx", "Rx", "Rx (nm)"), ("Ry", "Ry", "Ry (nm)"), _THETA_AXIS],
+    "circle": [("R", "R", "R (nm)")],
+    "square": [("Wx", "Wx", "W (nm)"), _THETA_AXIS],
+    "hollow_square": [("Wx", "Wx", "W (nm)"), ("Hollow_W", "hollow_W", "Hollow Width (nm)"), _THETA_AXIS],
+    "hollow_circle": [("R", "R", "R (nm)"), ("Hollow_R", "hollow_R", "Hollow R (nm)")],
+}
+
+# 不隨掃描改變、直接傳給 RCWA 的參數
+FIXED_PARAMS = [
+    "device", "shape_type", "harmonic_order",
+    "substrate_material", "slab_material", "slab_thickness",
+    "metasurface_material", "filling_material", "filling_thickness",
+    "output_material",
+]
+
+def axis_specs(shape_type):
+    """回傳某個 shape_type 的 (key, param, name) 掃描軸清單。"""
+    if shape_type not in SHAPE_AXES:
+        raise ValueError(f"shape_type not recognized: {shape_type}")
+    return COMMON_AXES + SHAPE_AXES[shape_type]
+
+
+def build_axes(params):
+    """依照 get_gui_parameters() 的 min / max / N 建立每個掃描軸的 linspace。"""
+    axes = []
+    for key, param, name in axis_specs(params["shape_type"]):
+        n = params.get(param + "_n") or 0
+        values = np.linspace(params[param + "_min"], params[param + "_max"], int(n))
+        axes.append(Axis(key, param, name, values))
+    return axes
+
+
+def solve_point(kwargs, cache=None):
+    """
+    解單一個點 (有 cache 時先查快取)，回傳 (2, 2) 的 Jones 矩陣，精度與 kwargs 的 dtype 相同
+    (complex128 的結果以完整精度存入 cache，寫入結果陣列時才轉成 complex64)。
+    退化的幾何 (Pruning) 不求解：沒有柱體時填入均勻疊層的解析解，柱體比週期寬時填入 NaN。
+    """
+    with TIMER.stage("prune"):
+        _, jones = pruned_jones(kwargs)
+    if jones is not None:
+        return jones
+    if cache is not None:
+        with TIMER.stage("cache_lookup"):
+            key = cache.key(kwargs)
+            jones = cache.get(key)
+        if jones is not None:
+            return jones
+    with TIMER.stage("solve"):
+        txx, txy, tyx, tyy = RCWA(**kwargs).get_Sparameter()
+        jones = np.array([[complex(txx), complex(txy)], [complex(tyx), complex(tyy)]],
+                         dtype=np.dtype(str(kwargs.get("dtype", "complex64")).replace("torch.", "")))
+    if cache is not None:
+        with TIMER.stage("cache_store"):
+            cache.put(key, jones)
+    return jones
+
+
+class SweepEngine:
+    """
+    通用的 N 維掃描引擎：
+      - 掃描軸由 SHAPE_AXES 宣告，所有 shape 共用同一條路徑
+      - 以一維 flat index 依照任意軸順序 (order) 走訪
+      - 每個點只保存 2x2 複數 Jones 矩陣，每 batch_size 個點一次 scatter 寫入結果
+      - 指定 output_dir 時結果直接串流寫入磁碟上的 memmap (ResultStore)
+      - 指定 cache (ResultCache) 時已解過的點直接從快取取得
+      - Timing.TIMER 開啟時記錄每個點與各階段的耗時
+      - workers > 1 時每個 batch 分給多個 process 平行求解 (每個 process 使用 threads 個執行緒)
+      - 幾何退化的點 (Pruning) 不送進 RCWA
+      - symmetry=True 時以晶格與柱體的對稱性 (Symmetry) 合併等價的點，只解代表點
+      - scale_invariance=True 且材料在掃描波段內平坦時，以尺度不變性 (Scaling) 合併 (波長, 週期, 厚度, 尺寸)
+        等比例的點
+    """
+    def __init__(self, params, order=None, batch_size=None, output_dir=None, cache=None, axes=None,
+                 workers=None, threads=None, dtype=None, symmetry=True, scale_invariance=True):
+        self.params = params
+        self.shape_type = params["shape_type"]
+        # axes 可直接給定 (例如延伸既有資料集時)，否則由 params 的 min / max / N 建立
+        self.axes = build_axes(params) if axes is None else axes
+        self.shape = tuple(len(axis.values) for axis in self.axes)
+        self.total = int(np.prod(self.shape))
+        # batch_size / workers / threads / dtype 未指定時使用本機的調校設定 (Tuning，由 autotune.py 產生)
+        tuning = load_profile()
+        self.batch_size = max(1, int(batch_size or tuning["batch_size"]))
+        self.workers = max(1, int(workers or tuning["workers"]))
+        self.threads = threads or tuning["threads"]
+        self.output_dir = output_dir
+        self.cache = cache
+        self.symmetry = symmetry
+        self.representatives = RepresentativeCache()
+        # order: 由外到內的迴圈順序 (軸的 key)，預設與儲存順序相同
+        keys = [axis.key for axis in self.axes]
+        if order is None:
+            order = keys
+        if sorted(order) != sorted(keys):
+            raise ValueError(f"order 必須是 {keys} 的排列")
+        self.order = [keys.index(key) for key in order]
+        self.fixed_kwargs = {name: params[name] for name in FIXED_PARAMS}
+        self.fixed_kwargs["dtype"] = str(dtype or params.get("dtype") or tuning["dtype"]).replace("torch.", "")
+        if torch.device(self.fixed_kwargs["device"]).type != "cpu":
+            # GPU 求解不分多個 process
+            self.workers = 1
+        self.scale_index = self._scale_index() if scale_invariance else None
+
+    def _scale_index(self):
+        """波長與其他長度軸都有多個數值、且材料有跨波長的平坦區段時才建立 ScaleIndex。"""
+        lengths = {axis.param: len(axis.values) for axis in self.axes}
+        if lengths.get("wavelength", 0) < 2 or not any(lengths.get(param, 0) > 1 for param in LENGTH_PARAMS):
+            return None
+        wavelengths = next(axis.values for axis in self.axes if axis.param == "wavelength")
+        index = ScaleIndex(self.fixed_kwargs, wavelengths)
+        return index if index.useful else None
+
+    def storage_indices(self, start, stop):
+        """把走訪順序中的 flat index [start, stop) 轉成結果陣列的 flat index。"""
+        loop_shape = tuple(self.shape[d] for d in self.order)
+        loop_index = np.unravel_index(np.arange(start, stop), loop_shape)
+        multi_index = [None] * len(self.shape)
+        for position, d in enumerate(self.order):
+            multi_index[d] = loop_index[position]
+        return np.ravel_multi_index(multi_index, self.shape)
+
+    def point_kwargs(self, flat_index):
+        """某個儲存 flat index 對應的 RCWA 參數。"""
+        multi_index = np.unravel_index(flat_index, self.shape)
+        kwargs = dict(self.fixed_kwargs)
+        for axis, i in zip(self.axes, multi_index):
+            kwargs[axis.param] = axis.values[i]
+        return kwargs
+
+    def solve_point(self, kwargs):
+        """解單一個點，回傳 (2, 2) 的 Jones 矩陣 (等價的代表點已解過時直接轉換)。"""
+        if not self.merges_points:
+            return solve_point(kwargs, cache=self.cache)
+        canonical, transform = canonical_point(kwargs) if self.symmetry else (kwargs, IDENTITY)
+        key = self.equivalence_key(canonical)
+        jones = self.representatives.get(key)
+        if jones is None:
+            jones = solve_point(canonical, cache=self.cache)
+            self.representatives.put(key, jones)
+        return apply_transform(jones, transform)
+
+    def reset_representatives(self):
+        """清空已解過的代表點；每次新的掃描 (run、自適應或準隨機取樣) 開始前呼叫。"""
+        self.representatives = RepresentativeCache()
+
+    @property
+    def merges_points(self):
+        """是否以對稱性或尺度不變性合併等價的點。"""
+        return self.symmetry or self.scale_index is not None
+
+    @property
+    def axis_params(self):
+        return [axis.param for axis in self.axes]
+
+    def equivalence_key(self, canonical):
+        """代表點在一次掃描中的識別：有 ScaleIndex 時為無因次 key，否則為掃描軸的數值。"""
+        if self.scale_index is not None:
+            return self.scale_index.key(canonical)
+        return point_key(canonical, self.axis_params)
+
+    def solve_batch(self, pool, indices):
+        """以 worker pool 平行解一批儲存 flat index 的點，回傳 (B, 2, 2) 的 Jones 矩陣。"""
+        return self.solve_many([self.point_kwargs(flat_index) for flat_index in indices], pool)
+
+    def solve_many(self, points, pool=None):
+        """
+        解一串 RCWA 參數 (不一定在網格上，例如自適應取樣)，回傳 (B, 2, 2) 的 Jones 矩陣。
+        pool 為 None 時逐點求解；否則見 iter_solve。
+        """
+        jones = np.zeros((len(points), 2, 2), dtype=np.complex64)
+        if pool is None:
+            for b, kwargs in enumerate(points):
+                jones[b] = self.solve_point(kwargs)
+            return jones
+        for b, result in self.iter_solve(points, pool):
+            jones[b] = result
+        return jones
+
+    def iter_solve(self, points, pool):
+        """
+        以 worker pool 解一串 RCWA 參數，依 points 的順序逐點 yield (b, Jones 矩陣)。
+        幾何檢查、對稱合併與快取在主 process 處理，其餘代表點以 imap 分給 worker，
+        每個代表點一算完，用到它的點就立刻 yield (不必等整批結束)。
+        """
+        # 每個點的結果 (ndarray) 或 (代表點 key, transform)；代表點 key -> (代表點 kwargs, 快取 key)
+        plan = []
+        pending = {}
+        for kwargs in points:
+            _, pruned = pruned_jones(kwargs)
+            if pruned is not None:
+                plan.append(pruned)
+                continue
+            canonical, transform = canonical_point(kwargs) if self.symmetry else (kwargs, IDENTITY)
+            key = self.equivalence_key(canonical)
+            if key in pending:
+                plan.append((key, transform))
+                continue
+            if self.merges_points:
+                solved = self.representatives.get(key)
+                if solved is not None:
+                    plan.append(apply_transform(solved, transform))
+                    continue
+            cache_key = None
+            if self.cache is not None:
+                cache_key = self.cache.key(canonical)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    if self.merges_points:
+                        self.representatives.put(key, cached)
+                    plan.append(apply_transform(cached, transform))
+                    continue
+            pending[key] = (canonical, cache_key)
+            plan.append((key, transform))
+        # imap 依送出順序回傳，與代表點在 points 中第一次出現的順序相同
+        results = pool.imap(solve_point, [canonical for canonical, _ in pending.values()], chunksize=1)
+        order = iter(pending.items())
+        solved = {}
+        for b, entry in enumerate(plan):
+            if isinstance(entry, np.ndarray):
+                yield b, entry
+                continue
+            key, transform = entry
+            while key not in solved:
+                next_key, (_, cache_key) = next(order)
+                with TIMER.stage("batch_solve"):
+                    result = next(results)
+                if self.cache is not None:
+                    self.cache.put(cache_key, result)
+                if self.merges_points:
+                    self.representatives.put(next_key, result)
+                solved[next_key] = result
+            yield b, apply_transform(solved[key], transform)
+
+    def prune_counts(self):
+        """各幾何狀態 (ok / empty / invalid) 的點數。"""
+        return prune_counts(self.shape_type, self.axes)
+
+    def unique_fraction(self):
+        """對稱合併後需要求解的點佔的比例 (估計值，見 Symmetry.symmetry_fraction)。"""
+        return symmetry_fraction(self.shape_type, self.axes) if self.symmetry else 1.
+
+    def allocate(self, resume=False):
+        """配置結果陣列 (ResultStore)。"""
+        return ResultStore(self.shape, directory=self.output_dir, resume=resume)
+
+    @property
+    def name(self):
+        """掃描的名稱 (shape_type 加上掃描定義雜湊的前 8 碼)，用於剖析檔名等。"""
+        return f"{self.shape_type}_{sweep_signature(self)[:8]}"
+
+    def run(self, on_point=None, checkpoint=None, profiler=None):
+        """
+        執行整個掃描。on_point(done, total) 在每個點算完後被呼叫，
+        回傳 False 代表中止，此時 run() 回傳 None；否則回傳 data_sheet。
+        給定 checkpoint 時會先從中恢復已算完的點，並定期把進度寫回磁碟。
+        profiler (Profiling.SweepProfiler) 省略時依 RCWA_PROFILE 環境變數決定是否剖析。
+        """
+        if profiler is None:
+            profiler = SweepProfiler.from_env(self.name)
+        self.reset_representatives()
+        workers = self.workers
+        if profiler is not None and workers > 1:
+            # 剖析只記錄主 process，平行求解時實際的計算都在 worker 裡，因此剖析時一律單一 process
+            print(f"剖析中：改以單一 process 求解 (原 workers={workers})")
+            workers = 1
+        try:
+            with self.worker_pool(workers) as pool:
+                return self._run(on_point, checkpoint, profiler, pool)
+        finally:
+            if profiler is not None:
+                profiler.finish()
+
+    @contextmanager
+    def worker_pool(self, workers=None):
+        """
+        workers (預設 self.workers) > 1 時建立 spawn 的 process pool (離開時終止)，
+        否則只設定執行緒數並給出 None。
+        """
+        workers = workers or self.workers
+        if workers == 1:
+            if self.threads:
+                torch.set_num_threads(int(self.threads))
+            yield None
+            return
+        pool = multiprocessing.get_context("spawn").Pool(
+            workers, initializer=init_worker, initargs=(self.threads,))
+        try:
+            yield pool
+        finally:
+            pool.terminate()
+
+    def _run(self, on_point, checkpoint, profiler, pool):
+        state = None
+        if checkpoint is not None and checkpoint.exists():
+            state = checkpoint.load(self)
+        store = self.allocate(resume=state is not None)
+        completed = np.zeros(self.total, dtype=bool)
+        if state is not None:
+            saved_completed, arrays = state
+            if arrays is not None:
+                store.jones[...] = arrays
+                completed = saved_completed
+            elif store.resumed:
+                completed = saved_completed
+            print(f"從 checkpoint 恢復 {int(completed.sum())}/{self.total} 點")
+
+        def flush(indices, jones):
+            with TIMER.stage("store_write"):
+                store.write(indices, jones)
+            completed[indices] = True
+
+        def save_checkpoint():
+            with TIMER.stage("checkpoint"):
+                checkpoint.save(self, completed, store)
+
+        done = int(completed.sum())
+        for start in range(0, self.total, self.batch_size):
+            stop = min(start + self.batch_size, self.total)
+            indices = self.storage_indices(start, stop)
+            indices = indices[~completed[indices]]
+            jones = np.zeros((len(indices), 2, 2), dtype=np.complex64)
+            if pool is not None:
+                # 逐點取得結果，on_point (進度、暫停 / 中止) 不必等整批算完
+                results = self.iter_solve([self.point_kwargs(flat_index) for flat_index in indices], pool)
+            flushed = 0
+            for b, flat_index in enumerate(indices):
+                with profiler.point() if profiler is not None else nullcontext():
+                    with TIMER.stage("point"):
+                        if pool is None:
+                            jones[b] = self.solve_point(self.point_kwargs(flat_index))
+                        else:
+                            _, jones[b] = next(results)
+                if profiler is not None:
+                    profiler.after_point()
+                TIMER.end_point(index=int(flat_index))
+                done += 1
+                if checkpoint is not None:
+                    checkpoint.tick()
+                    if checkpoint.due():
+                        flush(indices[flushed:b + 1], jones[flushed:b + 1])
+                        flushed = b + 1
+                        save_checkpoint()
+                if on_point is not None and on_point(done, self.total) is False:
+                    if checkpoint is not None:
+                        flush(indices[flushed:b + 1], jones[flushed:b + 1])
+                        save_checkpoint()
+                    return None
+            flush(indices[flushed:], jones[flushed:])
+        store.flush()
+        if self.cache is not None:
+            self.cache.flush()
+        if checkpoint is not None:
+            checkpoint.clear()
+        return self.data_sheet(store.jones)
+
+    def data_sheet(self, jones):
+        data_sheet = {
+            "shape_type": self.shape_type,
+            "Dimension_name": [axis.name for axis in self.axes],
+            # 非掃描參數，供之後延伸資料集時重建相同的求解條件
+            "Parameters": {
+                name: str(value) if name == "device" else value
+                for name, value in self.fixed_kwargs.items()
+            },
+        }
+        for axis in self.axes:
+            data_sheet[axis.key] = axis.values
+        # Jones 矩陣 [[txx, txy], [tyx, tyy]]，穿透率與相位由 Jones.channel_views 延遲計算
+        data_sheet["jones_tensor"] = jones
+        return data_sheet
+
+
+def data_sheet_axes(data_sheet):
+    """由 data_sheet 重建掃描軸。"""
+    return [
+        Axis(key, param, name, np.asarray(data_sheet[key]))
+        for key, param, name in axis_specs(data_sheet["shape_type"])
+    ]
+
+
+def extend_data_sheet(data_sheet, key, new_values, params=None, on_point=None, **engine_kwargs):
+    """
+    沿著某一個掃描軸 (key，例如 "Wavelength") 延伸既有的 data_sheet：
+    只計算新增數值構成的超平面，再與原資料合併並依該軸排序。
+    params 省略時使用 data_sheet["Parameters"]；舊格式 (GUI 存的 .npy) 沒有 Parameters，必須另外提供，
+    其 transmission / phase 以 sheet_jones 重建成 Jones 矩陣後合併。中止時回傳 None。
+    """
+    from Scattered import is_scattered
+    if is_scattered(data_sheet):
+        raise ValueError("scattered 資料集沒有網格軸，無法沿軸延伸；請以 Sampling 另外取樣")
+    old_jones = np.asarray(sheet_jones(data_sheet))
+    if params is None:
+        params = data_sheet.get("Parameters")
+        if params is None:
+            raise ValueError("data_sheet 沒有 Parameters (舊格式)，請以 params 或 --spec 提供求解參數")
+    params = dict(params, shape_type=data_sheet["shape_type"])
+    params.setdefault("device", "cpu")
+
+    axes = data_sheet_axes(data_sheet)
+    keys = [axis.key for axis in axes]
+    if key not in keys:
+        raise ValueError(f"{data_sheet['shape_type']} 沒有 {key} 這個掃描軸，可用的有 {keys}")
+    d = keys.index(key)
+    old_values = axes[d].values
+    new_values = np.unique(np.asarray(new_values, dtype=float))
+    new_values = new_values[~np.isclose(new_values[:, None], old_values[None, :]).any(axis=1)]
+    if len(new_values) == 0:
+        return data_sheet
+
+    sub_axes = list(axes)
+    sub_axes[d] = axes[d]._replace(values=new_values)
+    engine = SweepEngine(params, axes=sub_axes, **engine_kwargs)
+    print(f"延伸 {key}: 新增 {len(new_values)} 個數值，需計算 {engine.total} 點")
+    sub_sheet = engine.run(on_point=on_point)
+    if sub_sheet is None:
+        return None
+
+    values = np.concatenate([old_values, new_values])
+    order = np.argsort(values, kind="stable")
+    jones = np.concatenate([old_jones, np.asarray(sub_sheet["jones_tensor"])], axis=d)
+    merged = dict(data_sheet)
+    merged.pop("transmission_tensor", None)
+    merged.pop("phase_tensor", None)
+    merged["Parameters"] = sub_sheet["Parameters"]
+    merged[key] = values[order]
+    merged["jones_tensor"] = np.take(jones, order, axis=d)
+    return merged
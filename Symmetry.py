@@ -0,0 +1,133 @@
+"""
+以對稱性合併掃描中等價的點：只解代表點，其餘點由 Jones 矩陣的座標轉換得到。
+
+正方晶格在正向入射下的對稱群是 C4v (旋轉 90° 的倍數、鏡射)。整個結構 (柱體連同晶格) 經過
+g = R(90° k) M^m 轉換後，Jones 矩陣為 g J g^-1，其中 M = diag(1, -1) 是 y -> -y 的鏡射。
+對柱體的參數而言：
+  - 旋轉 90° k：theta -> theta + 90k；鏡射：theta -> -theta (柱體對自己的軸鏡射對稱)
+  - 柱體本身的對稱使參數有多種寫法：rectangle / rhombus / ellipse 的 theta 以 180° 為週期，
+    且 (Wx, Wy, theta) 與 (Wy, Wx, theta + 90°) 是同一個幾何；square / hollow_square / cross 以 90° 為週期，
+    cross 的 (Wx, Wy) 與 (Wy, Wx) 是同一個幾何
+把 8 個群元素作用後的參數正規化，取最小者為代表點 (theta 落在 [0°, 45°])。
+circle / hollow_circle 沒有 theta 掃描軸，不需處理。
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+# shape_type -> (寬度參數, 高度參數 (沒有時為 None), theta 的週期, Wx/Wy 互換的方式)
+#   swap = "rotate"：(a, b, theta) 與 (b, a, theta + 90) 相同；"free"：(a, b, theta) 與 (b, a, theta) 相同
+SHAPE_SYMMETRY = {
+    "rectangle": ("Wx", "Wy", 180., "rotate"),
+    "rhombus": ("Wx", "Wy", 180., "rotate"),
+    "ellipse": ("Rx", "Ry", 180., "rotate"),
+    "square": ("Wx", None, 90., None),
+    "hollow_square": ("Wx", None, 90., None),
+    "cross": ("Wx", "Wy", 90., "free"),
+}
+
+# 比較角度與尺寸時的捨入位數，避免浮點誤差讓等價的點被當成不同
+DECIMALS = 9
+
+_R90 = np.array([[0., -1.], [1., 0.]])
+_MIRROR = np.diag([1., -1.])
+IDENTITY = (0, 0)
+
+
+def _normalize(a, b, theta, fold, swap):
+    theta = round(theta % fold, DECIMALS) % fold
+    if swap == "rotate" and theta >= 90.:
+        a, b, theta = b, a, round(theta - 90., DECIMALS)
+    elif swap == "free" and b is not None and b > a:
+        a, b = b, a
+    return a, b, theta
+
+
+def canonical_point(kwargs):
+    """
+    回傳 (代表點的 kwargs, transform)，transform = (k, m) 表示代表點 = R(90° k) M^m 作用在此點上。
+    不適用的 shape_type 或沒有 theta 時回傳 (kwargs, IDENTITY)。
+    """
+    symmetry = SHAPE_SYMMETRY.get(kwargs.get("shape_type"))
+    if symmetry is None or kwargs.get("theta") is None:
+        return kwargs, IDENTITY
+    a_param, b_param, fold, swap = symmetry
+    a = round(float(kwargs[a_param]), DECIMALS)
+    b = None if b_param is None else round(float(kwargs[b_param]), DECIMALS)
+    theta = float(kwargs["theta"])
+    best = None
+    for m in (0, 1):
+        for k in range(4):
+            candidate = _normalize(a, b, (-theta if m else theta) + 90. * k, fold, swap)
+            key = (candidate[2], candidate[0], -np.inf if candidate[1] is None else candidate[1])
+            if best is None or key < best[0]:
+                best = (key, candidate, (k, m))
+    _, (a, b, theta), transform = best
+    canonical = dict(kwargs, theta=theta)
+    canonical[a_param] = a
+    if b_param is not None:
+        canonical[b_param] = b
+    return canonical, transform
+
+
+def transform_matrix(transform):
+    k, m = transform
+    g = np.linalg.matrix_power(_R90, k)
+    return g @ _MIRROR if m else g
+
+
+def apply_transform(jones, transform):
+    """由代表點的 Jones 矩陣得到原本的點：J = g^-1 J' g (g 為正交矩陣，元素只有 0 / ±1，轉換沒有誤差)。"""
+    if transform == IDENTITY:
+        return jones
+    g = transform_matrix(transform)
+    return (g.T @ jones @ g).astype(jones.dtype)
+
+
+def point_key(kwargs, params):
+    """代表點在一次掃描中的識別 (只看掃描軸的參數，固定參數在同一次掃描中都相同)。"""
+    return tuple(round(float(kwargs[param]), DECIMALS) for param in params)
+
+
+class RepresentativeCache:
+    """一次掃描中已解過的代表點 (LRU，最多 max_entries 個)。"""
+    def __init__(self, max_entries=1 << 20):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        jones = self.entries.get(key)
+        if jones is not None:
+            self.entries.move_to_end(key)
+        return jones
+
+    def put(self, key, jones):
+        self.entries[key] = jones
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+def symmetry_fraction(shape_type, axes, limit=1 << 18):
+    """
+    只看寬度、高度與 theta 三個掃描軸，回傳代表點數 / 點數 (其餘軸不影響對稱合併)。
+    這三個軸展開超過 limit 個點時不逐一計算，回傳 1.0。
+    axes: SweepEngine.Axis 清單。
+    """
+    symmetry = SHAPE_SYMMETRY.get(shape_type)
+    if symmetry is None:
+        return 1.
+    a_param, b_param, _, _ = symmetry
+    params = [param for param in (a_param, b_param, "theta") if param is not None]
+    values = {axis.param: np.asarray(axis.values, dtype=float) for axis in axes if axis.param in params}
+    if len(values) < len(params):
+        return 1.
+    total = int(np.prod([len(v) for v in values.values()]))
+    if total == 0 or total > limit:
+        return 1.
+    grids = np.meshgrid(*[values[param] for param in params], indexing="ij")
+    unique = set()
+    for point in zip(*[grid.ravel() for grid in grids]):
+        canonical, _ = canonical_point(dict(zip(params, point), shape_type=shape_type))
+        unique.add(point_key(canonical, params))
+    return len(unique) / total
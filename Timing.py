@@ -0,0 +1,186 @@
+"""
+求解流程各階段的計時 (材料讀取、幾何網格化、FFT/Toeplitz、特徵分解、S-matrix 串接、S 參數擷取，
+以及掃描迴圈的快取、寫入、checkpoint)，彙整成對數刻度的直方圖。
+
+預設關閉，關閉時 TIMER.stage() 只回傳一個共用的空 context manager，幾乎沒有額外開銷。
+開啟方式：
+  - 環境變數 RCWA_TIMING=1 (RCWA_TIMING_LOG=<檔名> 另外逐點輸出 JSON lines)
+  - rcwa_batch.py --timing / --timing-log <檔名>
+  - 程式中呼叫 TIMER.enable(log_path=None)
+
+    from Timing import TIMER
+    TIMER.enable()
+    ...
+    print(TIMER.report())      # 文字摘要
+    TIMER.summary()            # {stage: {"count", "total", "mean", "min", "max", "p50", "p90", "p99", "histogram"}}
+"""
+import os
+import json
+import math
+import time
+from contextlib import nullcontext
+
+# 直方圖範圍 1 µs ~ 100 s，每十倍 10 格
+HIST_MIN_EXP = -6
+HIST_MAX_EXP = 2
+HIST_BINS_PER_DECADE = 10
+HIST_BINS = (HIST_MAX_EXP - HIST_MIN_EXP) * HIST_BINS_PER_DECADE
+
+_NULL_STAGE = nullcontext()
+
+
+def histogram_edges():
+    """直方圖各格的邊界 (秒)，長度 HIST_BINS + 1。"""
+    return [10 ** (HIST_MIN_EXP + i / HIST_BINS_PER_DECADE) for i in range(HIST_BINS + 1)]
+
+
+class StageStats:
+    """單一階段的累計統計與直方圖。"""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.min = math.inf
+        self.max = 0.
+        self.histogram = [0] * HIST_BINS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        if seconds > 0:
+            b = int((math.log10(seconds) - HIST_MIN_EXP) * HIST_BINS_PER_DECADE)
+        else:
+            b = 0
+        self.histogram[min(max(b, 0), HIST_BINS - 1)] += 1
+
+    def percentile(self, q):
+        """由直方圖估計百分位數 (取所在格的上緣，並限制在 [min, max] 內)。"""
+        if self.count == 0:
+            return 0.
+        target = q * self.count
+        cumulative = 0
+        edges = histogram_edges()
+        for b, n in enumerate(self.histogram):
+            cumulative += n
+            if cumulative >= target:
+                return min(max(edges[b + 1], self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.,
+            "min": self.min if self.count else 0.,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "histogram": list(self.histogram),
+        }
+
+
+class _Stage:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.timer.cuda_sync:
+            import torch
+            torch.cuda.synchronize()
+        self.timer.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class StageTimer:
+    """
+    各階段計時器。with TIMER.stage("eigen"): ... 量測一段程式的時間；
+    end_point() 標記一個掃描點結束，開啟 log 時把該點各階段的時間寫成一行 JSON。
+    cuda_sync=True 時每段結束前呼叫 torch.cuda.synchronize()，GPU 上的時間才準確。
+    """
+    def __init__(self, enabled=False, log_path=None):
+        self.enabled = False
+        self.cuda_sync = False
+        self.log = None
+        self.reset()
+        if enabled:
+            self.enable(log_path)
+
+    def enable(self, log_path=None):
+        self.enabled = True
+        if log_path:
+            self.close_log()
+            self.log = open(log_path, "a", encoding="utf-8")
+        return self
+
+    def disable(self):
+        self.enabled = False
+        self.cuda_sync = False
+        self.close_log()
+
+    def close_log(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+    def reset(self):
+        self.stats = {}
+        self.point = {}
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def wrap(self, name, function):
+        """回傳會把每次呼叫計入 name 階段的 function (用於包裝第三方函式)。"""
+        def timed(*args, **kwargs):
+            with _Stage(self, name):
+                return function(*args, **kwargs)
+        return timed
+
+    def add(self, name, seconds):
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = StageStats()
+        stats.add(seconds)
+        self.point[name] = self.point.get(name, 0.) + seconds
+
+    def end_point(self, **info):
+        """一個掃描點結束：有 log 時寫出 {**info, stage: seconds, ...}，並清空逐點累計。"""
+        if not self.enabled:
+            return
+        if self.log is not None:
+            self.log.write(json.dumps(dict(info, **self.point)) + "\n")
+        self.point = {}
+
+    def summary(self):
+        """{stage: 統計 dict}，依總時間由大到小排序。"""
+        ordered = sorted(self.stats.items(), key=lambda item: item[1].total, reverse=True)
+        return {name: stats.to_dict() for name, stats in ordered}
+
+    def report(self):
+        summary = self.summary()
+        if not summary:
+            return "timing: no samples"
+        lines = [f"{'stage':<20}{'count':>8}{'total s':>11}{'mean ms':>10}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"]
+        for name, s in summary.items():
+            lines.append(
+                f"{name:<20}{s['count']:>8}{s['total']:>11.3f}{1000 * s['mean']:>10.3f}"
+                f"{1000 * s['p50']:>9.3f}{1000 * s['p90']:>9.3f}{1000 * s['p99']:>9.3f}{1000 * s['max']:>9.3f}"
+            )
+        return "\n".join(lines)
+
+
+TIMER = StageTimer(
+    enabled=os.environ.get("RCWA_TIMING", "") not in ("", "0") or bool(os.environ.get("RCWA_TIMING_LOG")),
+    log_path=os.environ.get("RCWA_TIMING_LOG") or None,
+)
@@ -0,0 +1,52 @@
+"""
+每台機器的調校設定檔 (由 autotune.py 產生)：intra-op 執行緒數、worker process 數、batch size 與求解 dtype。
+存在 ~/.cache/rcwa_app/tuning-<hostname>.json，SweepEngine 沒有明確指定這些參數時自動套用。
+"""
+import os
+import json
+import socket
+
+TUNING_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rcwa_app")
+
+DEFAULT_TUNING = {
+    "threads": None,      # None：沿用 torch 預設
+    "workers": 1,
+    "batch_size": 64,
+    "dtype": "complex64",
+}
+
+_loaded = {}
+
+
+def profile_path(hostname=None):
+    return os.path.join(TUNING_DIR, f"tuning-{hostname or socket.gethostname()}.json")
+
+
+def load_profile(file_path=None):
+    """讀取本機的調校設定 (只讀一次)，沒有設定檔時回傳 DEFAULT_TUNING。"""
+    file_path = file_path or profile_path()
+    if file_path not in _loaded:
+        tuning = dict(DEFAULT_TUNING)
+        if os.path.exists(file_path):
+            with open(file_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            tuning.update({key: saved[key] for key in DEFAULT_TUNING if key in saved})
+        _loaded[file_path] = tuning
+    return dict(_loaded[file_path])
+
+
+def save_profile(profile, file_path=None):
+    """寫入調校設定 (profile 可另外帶有量測紀錄)，回傳檔案路徑。"""
+    file_path = file_path or profile_path()
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    _loaded.pop(file_path, None)
+    return file_path
+
+
+def init_worker(threads):
+    """worker process 的 initializer：限制每個 worker 的 intra-op 執行緒數，避免超額訂閱。"""
+    if threads:
+        import torch
+        torch.set_num_threads(int(threads))
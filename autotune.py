@@ -0,0 +1,183 @@
+"""
+一次性的本機調校：在常用的 harmonic order 下量測 RCWA 求解，依序決定
+  1. 求解 dtype：complex64 與 complex128 的結果差異在容許範圍內時取較快者
+  2. intra-op 執行緒數 (單一 process)
+  3. worker process 數 (每個 process 的執行緒數 = CPU 數 / worker 數，避免超額訂閱)
+  4. batch size
+結果寫到本機的調校設定檔 (Tuning.profile_path())，之後 SweepEngine 沒有明確指定時自動套用。
+
+    python autotune.py
+    python autotune.py --orders 5,7 --quick
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+import torch
+
+from SweepEngine import SweepEngine, solve_point
+from Tuning import save_profile, profile_path
+from benchmark import BASE_KWARGS, SHAPE_KWARGS, measure
+from validation import jones_deviation
+
+TYPICAL_ORDERS = [5, 7, 9]
+BATCH_SIZES = [16, 64, 256]
+# complex64 與 complex128 差異的容許值 (振幅 / 相位 rad)
+DTYPE_AMP_TOL = 1e-4
+DTYPE_PHASE_TOL = 1e-3
+
+
+def power_of_two_counts(limit):
+    """1, 2, 4, ... 直到 limit，並包含 limit 本身。"""
+    counts = {limit}
+    n = 1
+    while n < limit:
+        counts.add(n)
+        n *= 2
+    return sorted(counts)
+
+
+def point_kwargs(order, dtype="complex64"):
+    return dict(BASE_KWARGS, **SHAPE_KWARGS["rectangle"], shape_type="rectangle",
+                harmonic_order=order, device=torch.device("cpu"), dtype=dtype)
+
+
+def tune_dtype(orders, repeat):
+    """回傳 (dtype, 量測紀錄)。"""
+    records = {}
+    ok = True
+    times = {"complex64": 0., "complex128": 0.}
+    for order in orders:
+        jones = {}
+        for dtype in times:
+            kwargs = point_kwargs(order, dtype)
+            jones[dtype] = solve_point(kwargs)
+            seconds = measure(lambda: solve_point(kwargs), repeat)["median"]
+            times[dtype] += seconds
+            records[f"N{order}/{dtype}"] = seconds
+        amp, phase = jones_deviation(jones["complex64"], jones["complex128"])
+        records[f"N{order}/deviation"] = {"amp": float(amp.max()), "phase": float(phase.max())}
+        ok &= amp.max() <= DTYPE_AMP_TOL and phase.max() <= DTYPE_PHASE_TOL
+    if ok:
+        best = min(times, key=times.get)
+    else:
+        best = "complex128"
+    print(f"dtype: {best} ({', '.join(f'{k} {v:.3f} s' for k, v in times.items())})")
+    return best, records
+
+
+def tune_threads(orders, dtype, candidates, repeat):
+    """單一 process 下不同 intra-op 執行緒數的求解時間總和，回傳 (最佳執行緒數, 量測紀錄)。"""
+    default_threads = torch.get_num_threads()
+    records = {}
+    try:
+        for threads in candidates:
+            torch.set_num_threads(threads)
+            records[threads] = sum(
+                measure(lambda: solve_point(point_kwargs(order, dtype)), repeat)["median"] for order in orders
+            )
+            print(f"threads={threads}: {records[threads]:.3f} s")
+    finally:
+        torch.set_num_threads(default_threads)
+    return min(records, key=records.get), records
+
+
+def sweep_params(order, points):
+    """只有 Wavelength 一個軸有 points 個數值的矩形掃描。"""
+    params = dict(BASE_KWARGS, shape_type="rectangle", harmonic_order=order, device=torch.device("cpu"))
+    sweep = {"wavelength": (900., 1000., points), "period": (500., 500., 1), "metasurface_thickness": (500., 500., 1)}
+    for param, value in SHAPE_KWARGS["rectangle"].items():
+        sweep[param] = (value, value, 1)
+    for param, (vmin, vmax, n) in sweep.items():
+        params[param + "_min"], params[param + "_max"], params[param + "_n"] = vmin, vmax, n
+    return params
+
+
+def sweep_throughput(order, dtype, workers, threads, batch_size, batches=3):
+    """
+    以 SweepEngine 跑 batches 個 batch 的掃描，回傳第一個 batch 之後的 points/s
+    (不計入 worker process 的啟動時間)。
+    """
+    engine = SweepEngine(sweep_params(order, batch_size * batches), batch_size=batch_size,
+                         workers=workers, threads=threads, dtype=dtype)
+    marks = {}
+
+    def on_point(done, total):
+        if done == batch_size:
+            marks["start"] = time.perf_counter()
+        if done == total:
+            marks["stop"] = time.perf_counter()
+
+    engine.run(on_point=on_point)
+    return batch_size * (batches - 1) / (marks["stop"] - marks["start"])
+
+
+def autotune(orders=TYPICAL_ORDERS, repeat=3, batch_sizes=BATCH_SIZES, quick=False):
+    """執行所有量測，回傳可直接存成調校設定檔的 dict。"""
+    cpu_count = os.cpu_count() or 1
+    dtype, dtype_records = tune_dtype(orders, repeat)
+    threads, thread_records = tune_threads(orders, dtype, power_of_two_counts(cpu_count), repeat)
+
+    # worker 數量在最小的常用 order 上以實際掃描量測 (每個 worker 分到 CPU 數 / worker 數個執行緒)
+    sweep_order = min(orders)
+    worker_records = {}
+    for workers in power_of_two_counts(cpu_count):
+        worker_threads = threads if workers == 1 else max(1, cpu_count // workers)
+        batch_size = max(16, 4 * workers)
+        worker_records[workers] = sweep_throughput(sweep_order, dtype, workers, worker_threads, batch_size)
+        print(f"workers={workers} x threads={worker_threads}: {worker_records[workers]:.2f} points/s")
+    workers = max(worker_records, key=worker_records.get)
+    if workers > 1:
+        threads = max(1, cpu_count // workers)
+
+    batch_records = {}
+    candidates = [size for size in batch_sizes if size >= workers] or [max(batch_sizes)]
+    if quick:
+        candidates = candidates[:1]
+    for batch_size in candidates:
+        batch_records[batch_size] = sweep_throughput(sweep_order, dtype, workers, threads, batch_size)
+        print(f"batch_size={batch_size}: {batch_records[batch_size]:.2f} points/s")
+    batch_size = max(batch_records, key=batch_records.get)
+
+    return {
+        "hostname": socket.gethostname(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cpu_count": cpu_count,
+        "torch": torch.__version__,
+        "orders": list(orders),
+        "threads": threads,
+        "workers": workers,
+        "batch_size": batch_size,
+        "dtype": dtype,
+        "measurements": {
+            "dtype_seconds": dtype_records,
+            "thread_seconds": {str(k): v for k, v in thread_records.items()},
+            "worker_points_per_second": {str(k): v for k, v in worker_records.items()},
+            "batch_points_per_second": {str(k): v for k, v in batch_records.items()},
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune threads, workers, batch size and dtype for this machine")
+    parser.add_argument("--orders", default=",".join(map(str, TYPICAL_ORDERS)), help="常用的 harmonic order，以逗號分隔")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="每項只量測一次，batch size 只試一種")
+    parser.add_argument("-o", "--output", default=None, help=f"調校設定檔 (預設 {profile_path()})")
+    args = parser.parse_args(argv)
+
+    orders = [int(order) for order in args.orders.split(",")]
+    repeat = 1 if args.quick else args.repeat
+    profile = autotune(orders, repeat, quick=args.quick)
+    file_path = save_profile(profile, args.output)
+    print(f"threads={profile['threads']}, workers={profile['workers']}, batch_size={profile['batch_size']}, "
+          f"dtype={profile['dtype']} -> {file_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+效能基準測試：量測 Materials.Material.forward、幾何建構 (RCWA.layer_geometry)、
+RCWA.get_Sparameter (8 種形狀 x harmonic order x complex64 / complex128) 與每種形狀的小型端到端掃描，
+結果連同機器資訊寫成 JSON，並可與基準檔比較，超過門檻的項目視為效能退化 (結束碼 1)。
+
+    python benchmark.py -o bench.json
+    python benchmark.py -o bench.json --baseline baseline.json --threshold 0.15
+    python benchmark.py --quick -o bench.json --baseline baseline.json --update-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import torch
+import torcwa
+
+import Materials
+from RCWA import RCWA
+from SweepEngine import SweepEngine, SHAPE_AXES
+
+ORDERS = [3, 5, 7, 9, 11, 13, 15]
+DTYPES = {"complex64": torch.complex64, "complex128": torch.complex128}
+
+BASE_KWARGS = {
+    "wavelength": 940.,
+    "period": 500.,
+    "metasurface_thickness": 500.,
+    "substrate_material": "Fused_silica.txt",
+    "slab_material": "Fused_silica.txt",
+    "slab_thickness": 0.,
+    "metasurface_material": "aSiH.txt",
+    "filling_material": "air.txt",
+    "filling_thickness": 0.,
+    "output_material": "air.txt",
+}
+
+# 每種形狀用來量測的代表性尺寸 (nm / deg)
+SHAPE_KWARGS = {
+    "rectangle": {"Wx": 200., "Wy": 120., "theta": 30.},
+    "rhombus": {"Wx": 200., "Wy": 120., "theta": 30.},
+    "cross": {"Wx": 200., "Wy": 80., "theta": 30.},
+    "ellipse": {"Rx": 200., "Ry": 120., "theta": 30.},
+    "circle": {"R": 250.},
+    "square": {"Wx": 250., "theta": 30.},
+    "hollow_square": {"Wx": 300., "hollow_W": 150., "theta": 30.},
+    "hollow_circle": {"R": 300., "hollow_R": 150.},
+}
+
+
+def machine_info(device):
+    """機器與套件版本資訊，一起寫進結果 JSON。"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    info = {
+        "hostname": socket.gethostname(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "torcwa": getattr(torcwa, "__version__", "unknown"),
+        "torch_threads": torch.get_num_threads(),
+        "device": str(device),
+        "git_commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if torch.device(device).type == "cuda":
+        info["cuda_device"] = torch.cuda.get_device_name(torch.device(device))
+    return info
+
+
+def measure(function, repeat=3, warmup=1):
+    """執行 warmup + repeat 次，回傳每次耗時 (秒) 的統計。"""
+    for _ in range(warmup):
+        function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "repeat": repeat,
+    }
+
+
+def point_kwargs(shape_type, order, device, dtype=torch.complex64):
+    return dict(BASE_KWARGS, **SHAPE_KWARGS[shape_type], shape_type=shape_type,
+                harmonic_order=order, device=device, dtype=dtype)
+
+
+def bench_material(device, repeat):
+    wavelength = torch.tensor(940., dtype=torch.float32, device=device)
+    return {
+        f"material/{name}": measure(lambda: Materials.Material.forward(wavelength=wavelength, name=name), repeat)
+        for name in sorted({BASE_KWARGS["metasurface_material"], BASE_KWARGS["substrate_material"]})
+    }
+
+
+def bench_geometry(shapes, device, repeat):
+    results = {}
+    for shape_type in shapes:
+        rcwa = RCWA(**point_kwargs(shape_type, 3, device))
+        results[f"geometry/{shape_type}"] = measure(rcwa.layer_geometry, repeat)
+    return results
+
+
+def bench_solve(shapes, orders, dtypes, device, repeat):
+    results = {}
+    for shape_type in shapes:
+        for order in orders:
+            for dtype_name in dtypes:
+                rcwa = RCWA(**point_kwargs(shape_type, order, device, DTYPES[dtype_name]))
+                name = f"solve/{shape_type}/N{order}/{dtype_name}"
+                results[name] = measure(rcwa.get_Sparameter, repeat)
+                print(f"{name}: {1000 * results[name]['median']:.1f} ms", file=sys.stderr)
+    return results
+
+
+def sweep_params(shape_type, order, device):
+    """每個掃描軸取 2 個數值的小型掃描 (不用快取、結果留在記憶體)。"""
+    params = dict(BASE_KWARGS, shape_type=shape_type, harmonic_order=order, device=device)
+    sweep = {"wavelength": (900., 1000., 2), "period": (500., 500., 1), "metasurface_thickness": (500., 500., 1)}
+    for _, param, _ in SHAPE_AXES[shape_type]:
+        value = SHAPE_KWARGS[shape_type][param]
+        sweep[param] = (value, value * 0.8 if param != "theta" else 0., 2)
+    for param, (vmin, vmax, n) in sweep.items():
+        params[param + "_min"], params[param + "_max"], params[param + "_n"] = vmin, vmax, n
+    return params
+
+
+def bench_sweep(shapes, order, device, repeat):
+    results = {}
+    for shape_type in shapes:
+        engine = SweepEngine(sweep_params(shape_type, order, device))
+        stats = measure(engine.run, repeat, warmup=0)
+        stats["points"] = engine.total
+        stats["per_point"] = stats["median"] / engine.total
+        results[f"sweep/{shape_type}/N{order}"] = stats
+    return results
+
+
+def run_benchmarks(shapes, orders, dtypes, device="cpu", repeat=3, sweep_order=5):
+    device = torch.device(device)
+    results = {}
+    results.update(bench_material(device, repeat))
+    results.update(bench_geometry(shapes, device, repeat))
+    results.update(bench_solve(shapes, orders, dtypes, device, repeat))
+    results.update(bench_sweep(shapes, sweep_order, device, max(1, repeat // 2)))
+    return {"machine": machine_info(device), "results": results}
+
+
+def compare(current, baseline, threshold=0.1, key="median"):
+    """
+    回傳 [(name, baseline 秒數, 目前秒數, 比值)]，只列出比基準慢超過 threshold (比例) 的項目。
+    只在兩邊都有的項目間比較。
+    """
+    regressions = []
+    for name, stats in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or base[key] <= 0:
+            continue
+        ratio = stats[key] / base[key]
+        if ratio > 1. + threshold:
+            regressions.append((name, base[key], stats[key], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RCWA benchmark suite")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="結果 JSON")
+    parser.add_argument("--baseline", default=None, help="比較用的基準 JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="比基準慢多少比例算退化 (預設 0.1 = 10%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="把這次的結果寫成 --baseline")
+    parser.add_argument("--shapes", default=",".join(SHAPE_KWARGS), help="要量測的形狀，以逗號分隔")
+    parser.add_argument("--orders", default=",".join(map(str, ORDERS)), help="harmonic order，以逗號分隔")
+    parser.add_argument("--dtypes", default=",".join(DTYPES), help="complex64、complex128，以逗號分隔")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="只量測 order 3、7 與 complex64")
+    args = parser.parse_args(argv)
+
+    shapes = args.shapes.split(",")
+    orders = [int(order) for order in args.orders.split(",")]
+    dtypes = args.dtypes.split(",")
+    if args.quick:
+        orders, dtypes = [3, 7], ["complex64"]
+    for dtype_name in dtypes:
+        if dtype_name not in DTYPES:
+            parser.error(f"未知的 dtype: {dtype_name}")
+
+    report = run_benchmarks(shapes, orders, dtypes, device=args.device, repeat=args.repeat)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"benchmark 結果寫入 {args.output} ({len(report['results'])} 項)")
+
+    status = 0
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for name, base, now, ratio in regressions:
+            print(f"REGRESSION {name}: {1000 * base:.2f} ms -> {1000 * now:.2f} ms ({ratio:.2f}x)")
+        if regressions:
+            status = 1
+        else:
+            print(f"與基準 {args.baseline} 相比沒有超過 {100 * args.threshold:.0f}% 的退化")
+    elif args.baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"基準寫入 {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
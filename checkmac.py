@@ -1,3 +1,5 @@
+import os
+import sys
 import uuid
 import hashlib
 import ntplib
@@ -5,6 +7,10 @@ import datetime
 import psutil
 import json
 
+# 最後一次成功取得的網路時間，離線時用來防止把本機時鐘調回過去
+LAST_TIME_FILE = os.path.join(os.path.expanduser("~"), ".cache", "rcwa_app", "last_network_time.json")
+NTP_TIMEOUT = 2.
+
 def read_expiry_date_from_json(file_path):
     try:
         with open(file_path, 'r') as file:
@@ -32,13 +38,33 @@ def get_hardware_id():
         #print(hardware_id)
     return hardware_id
 
-def get_network_time():
+def get_network_time(timeout=NTP_TIMEOUT):
     try:
         client = ntplib.NTPClient()
-        response = client.request('pool.ntp.org')
-        client = ntplib.NTPClient()
-        response = client.request('pool.ntp.org')
+        response = client.request('pool.ntp.org', timeout=timeout)
         return datetime.datetime.fromtimestamp(response.tx_time)
-    except:
+    except Exception:
         # Unable to get network time, handle exception
         return None
+
+def read_last_known_time(file_path=LAST_TIME_FILE):
+    try:
+        with open(file_path, 'r') as file:
+            return datetime.datetime.fromisoformat(json.load(file)['time'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+def save_last_known_time(current_time, file_path=LAST_TIME_FILE):
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as file:
+            json.dump({'time': current_time.isoformat()}, file)
+    except OSError as e:
+        print(f"無法保存網路時間: {e}")
+
+def offline_time():
+    """取不到網路時間時的目前時間：最後一次驗證過的時間與本機時鐘取較晚者，從未驗證過則回傳 None。"""
+    last_known_time = read_last_known_time()
+    if last_known_time is None:
+        return None
+    return max(last_known_time, datetime.datetime.now())
@@ -1,9 +1,7 @@
 import sys
 import os
-import numpy as np
-import scipy.io as sio
-import torch 
-import datetime
+import multiprocessing
+import threading
 from checkmac import *
 from PySide6.QtWidgets import (
     QApplication,
@@ -18,12 +16,29 @@ from PySide6.QtWidgets import (
     QGroupBox,
     QProgressBar,
     QFileDialog,
+    QMessageBox,
 )
 from PySide6.QtGui import QPixmap, QFont, QIcon
-from PySide6.QtCore import Qt
-from RCWA import RCWA
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from DataVisualize import DataVisualize
+from PySide6.QtCore import Qt, QTimer
+from DataIO import save_data_sheet, DatasetWriter
+from Checkpoint import Checkpoint
+from Timing import TIMER
+# torch / RCWA / SweepEngine / matplotlib / DataVisualize 等較重的模組在第一次用到時才載入，讓視窗盡快出現
+
+# 批次計算的結果直接寫入此目錄下的 memmap，checkpoint 也放在這裡
+RESULT_DIR = "batch_results"
+CHECKPOINT_FILE = os.path.join(RESULT_DIR, "checkpoint.npz")
+# 預估時間超過此秒數時，開始前先詢問是否執行
+CONFIRM_ETA_SECONDS = 600
+# 掃描前估計 ETA 時實際求解的點數 (與 rcwa_batch 相同，另含一次暖機)；單點計時受首次載入與雜訊影響太大
+CALIBRATION_POINTS = 3
+
+# 存檔對話框的格式 -> 副檔名
+SAVE_FILTERS = {
+    "RCWA dataset (*.rcwad)": ".rcwad",
+    "MAT file (*.mat)": ".mat",
+    "NumPy file (*.npy)": ".npy",
+}
 
 class PlotWindow(QWidget):
     """獨立新視窗用於顯示 Matplotlib 圖"""
@@ -36,6 +51,7 @@ class PlotWindow(QWidget):
         self.initUI()
 
     def initUI(self):
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
         # 創建 Matplotlib 圖表
         self.canvas = FigureCanvas(self.figure)
 
@@ -53,8 +69,56 @@ class MainWindow(QWidget):
         self.is_running = False
         self.input_fields = {}
         self.combo_boxes = {}
+        self._result_cache = None
         self.initUI()
 
+    @property
+    def result_cache(self):
+        """已解過的點的持久快取 (第一次計算時才開啟)。"""
+        if self._result_cache is None:
+            from ResultCache import ResultCache
+            self._result_cache = ResultCache()
+        return self._result_cache
+
+    def detect_devices(self):
+        """視窗顯示後才載入 torch 並把 GPU 型號加入 device_combo。"""
+        import torch
+        if torch.cuda.is_available():
+            for i in range(torch.cuda.device_count()):
+                self.device_combo.addItem(torch.cuda.get_device_name(i))
+
+    def start_expiry_check(self, expiry_date):
+        """
+        在背景執行緒向 NTP 取得時間 (短 timeout)，不阻塞視窗；
+        取不到網路時間時改用最後一次驗證過的時間 (與本機時鐘取較晚者)。
+        """
+        self.expiry_date = expiry_date
+        self.network_time = None
+        self.expiry_thread = threading.Thread(target=self._fetch_network_time, daemon=True)
+        self.expiry_thread.start()
+        self.expiry_timer = QTimer(self)
+        self.expiry_timer.timeout.connect(self.poll_expiry_check)
+        self.expiry_timer.start(200)
+
+    def _fetch_network_time(self):
+        self.network_time = get_network_time()
+
+    def poll_expiry_check(self):
+        if self.expiry_thread.is_alive():
+            return
+        self.expiry_timer.stop()
+        if self.network_time is not None:
+            save_last_known_time(self.network_time)
+            current_date = self.network_time
+        else:
+            current_date = offline_time()
+        if current_date is None:
+            QMessageBox.critical(self, "RCWA", "無法驗證當前日期，請檢察網路")
+            QApplication.quit()
+        elif current_date > self.expiry_date:
+            QMessageBox.critical(self, "RCWA", "該用戶已過期")
+            QApplication.quit()
+
     def initUI(self):
         self.setWindowIcon(QIcon('your_icon.ico'))  # 圖示檔案放在同一個資料夾內
         
@@ -62,15 +126,9 @@ class MainWindow(QWidget):
         # 偵測裝置擁有的device，存成list放到device_combo選項中
         self.device_label = QLabel("Device:")
         self.device_combo = QComboBox()
-        # 偵測裝置：加入 CPU 和 GPU 型號名稱
-        device_list = ["CPU (Default)"]
-
-        # 加入 GPU 型號名稱
-        if torch.cuda.is_available():
-            for i in range(torch.cuda.device_count()):
-                device_name = torch.cuda.get_device_name(i)
-                device_list.append(device_name)
-        self.device_combo.addItems(device_list)
+        # 偵測裝置：加入 CPU，GPU 型號名稱在視窗顯示後由 detect_devices 加入
+        self.device_combo.addItems(["CPU (Default)"])
+        QTimer.singleShot(0, self.detect_devices)
         # 形狀選擇
         self.shape_type_label = QLabel("Shape Type:")
         self.shape_type_combo = QComboBox()
@@ -481,13 +539,29 @@ class MainWindow(QWidget):
         # 增加一個按鈕來選擇檔案並保存
         self.save_button = QPushButton("Save Tensors to File", self)
         self.save_button.clicked.connect(self.save_tensors_to_file)
+        # 存檔的壓縮方式：zlib:1 最快，lzma 檔案最小
+        self.codec_combo = QComboBox()
+        self.codec_combo.addItems(["zlib:1", "zlib:6", "bz2:9", "lzma:6", "none", "q16+zlib:6", "q12+zlib:6"])
         
         # 按鈕: 打開 DataVisualizer
         self.btn_open_visualizer = QPushButton("開啟 DataVisualizer")
         self.btn_open_visualizer.clicked.connect(self.openDataVisualizer)
 
+        # 取樣方式：Grid 為每個軸的 linspace 網格，Adaptive 以 N 為粗網格、只細分變化劇烈的區域，
+        # Sobol / LHS 在各軸的 [min, max] 內取 Samples 個準隨機點
+        self.sampling_combo = QComboBox()
+        self.sampling_combo.addItems(["Grid", "Adaptive", "Sobol", "LHS"])
+        self.samples_input = QLineEdit()
+        self.samples_input.setText("1024")
+
+        layout_batch.addWidget(QLabel("Sampling:"))
+        layout_batch.addWidget(self.sampling_combo)
+        layout_batch.addWidget(QLabel("Samples:"))
+        layout_batch.addWidget(self.samples_input)
         layout_batch.addWidget(self.batch_button)
         layout_batch.addWidget(self.progress_bar)
+        layout_batch.addWidget(QLabel("Codec:"))
+        layout_batch.addWidget(self.codec_combo)
         layout_batch.addWidget(self.save_button)
         layout_batch.addWidget(self.btn_open_visualizer)
         
@@ -639,6 +713,7 @@ class MainWindow(QWidget):
         """
         獲取 GUI 上的所有參數設置，並以字典形式返回。
         """
+        import torch
         # 抓取裝置self.device_combo選擇的index
         if self.device_combo.currentIndex() > 0:
             device = torch.device(f"cuda:{self.device_combo.currentIndex() - 1}")
@@ -834,6 +909,7 @@ class MainWindow(QWidget):
         # 獲取 GUI 參數
         params = self.get_gui_parameters()
 
+        from RCWA import RCWA
         # 建立 RCWA 物件並顯示結構
         rcwa_obj = RCWA(
             device=params["device"],
@@ -870,8 +946,8 @@ class MainWindow(QWidget):
         # 獲取 GUI 參數
         params = self.get_gui_parameters()
 
-        # 建立 RCWA 物件並進行計算
-        rcwa_obj = RCWA(
+        # 進行計算 (先查結果快取)
+        rcwa_kwargs = dict(
             device=params["device"],
             shape_type=params["shape_type"],
             harmonic_order=params["harmonic_order"],
@@ -894,7 +970,11 @@ class MainWindow(QWidget):
             hollow_W=params["hollow_W"],
             hollow_R=params["hollow_R"]
         )
-        txx, txy, tyx, tyy = rcwa_obj.get_Sparameter()
+        import torch
+        from SweepEngine import solve_point
+        jones = solve_point(rcwa_kwargs, cache=self.result_cache)
+        self.result_cache.flush()
+        txx, txy, tyx, tyy = torch.from_numpy(jones.reshape(-1))
         transmission_x = torch.abs(txx)**2
         transmission_y = torch.abs(tyy)**2
         phase_x = torch.angle(txx)
@@ -914,692 +994,138 @@ class MainWindow(QWidget):
     def batch_calculation(self):
         """
         1. 從使用者介面取得 基本參數 (shape_type, wavelength, period, thickness, material... )。
-        2. 取得 Wx, Wy, theta 的掃描範圍 (下界、上界、步進)。
-        3. 迴圈掃描所有組合，呼叫 RCWA 做計算，並將結果儲存或顯示。
-        """
-        """
-        從介面讀取參數，呼叫 RCWA 類別進行計算，並顯示結果。
+        2. 依 shape_type 對應的掃描軸建立 SweepEngine。
+        3. 由 SweepEngine 走訪所有組合並寫入 data_sheet。
+        中斷的掃描會定期存到 checkpoint，下次以相同參數執行時自動從中恢復。
+        開始前先估計點數、記憶體與 ETA，超出記憶體時拒絕執行，耗時很長時先詢問。
         """
+        from SweepEngine import SweepEngine
         # 獲取 GUI 參數
         params = self.get_gui_parameters()
-        # wavelength list
-        wavelength_list = np.linspace(params["wavelength_min"], params["wavelength_max"], params["wavelength_n"])
-        # period list
-        period_list = np.linspace(params["period_min"], params["period_max"], params["period_n"])
-        # thickness list
-        thickness_list = np.linspace(params["metasurface_thickness_min"], params["metasurface_thickness_max"], params["metasurface_thickness_n"])
-        # 初始化進度條
-        current_iteration = 0
-
-        if params["shape_type"] == "rectangle" or params["shape_type"] == "rhombus"  or params["shape_type"] == "cross":
-            # Wx list
-            Wx_list = np.linspace(params["Wx_min"], params["Wx_max"], params["Wx_n"])
-            # Wy list
-            Wy_list = np.linspace(params["Wy_min"], params["Wy_max"], params["Wy_n"])
-            # theta list
-            theta_list = np.linspace(params["theta_min"], params["theta_max"], params["theta_n"])
-            # 計算總迴圈數
-            total_iterations = (
-                len(wavelength_list) * len(period_list) * len(thickness_list) *
-                len(Wx_list) * len(Wy_list) * len(theta_list)
-            )
-            dimension_names = [
-                "Wavelength (nm)", "Period (nm)", "Thickness (nm)",
-                "Wx (nm)", "Wy (nm)", "Rotation Angle (deg)"
-            ]
-            # 依序迴圈，計算每一組 RCWA(Wavelength, Period, Thickness, Wx, Wy, theta)存入空矩陣shape為(wavelength_n, period_n, thickness_n, Wx_n, Wy_n, theta_n)
-            # 創建一個 tensor，初始化為零
-            transmission_tensor = torch.zeros(len(wavelength_list), len(period_list), len(thickness_list), len(Wx_list), len(Wy_list), len(theta_list), 8)
-            phase_tensor = torch.zeros_like(transmission_tensor)
-            # 進行批次計算
-            for i, wavelength in enumerate(wavelength_list):
-                for j, period in enumerate(period_list):
-                    for k, thickness in enumerate(thickness_list):
-                        for l, Wx in enumerate(Wx_list):
-                            for m, Wy in enumerate(Wy_list):
-                                for n, theta in enumerate(theta_list):
-                                    while self.is_paused:
-                                        QApplication.processEvents()
-                                    if not self.is_running:
-                                        return
-                                    # 模擬 RCWA 計算
-                                    rcwa_obj = RCWA(
-                                        device=params["device"],
-                                        shape_type=params["shape_type"],
-                                        harmonic_order=params["harmonic_order"],
-                                        wavelength=wavelength,
-                                        period=period,
-                                        substrate_material=params["substrate_material"],
-                                        slab_material=params["slab_material"],
-                                        slab_thickness=params["slab_thickness"],
-                                        metasurface_material=params["metasurface_material"],
-                                        metasurface_thickness=thickness,
-                                        filling_material=params["filling_material"],
-                                        filling_thickness=params["filling_thickness"],
-                                        output_material=params["output_material"],
-                                        Wx=Wx,
-                                        Wy=Wy,
-                                        theta=theta,
-                                    )
-                                    txx, txy, tyx, tyy = rcwa_obj.get_Sparameter()
-                                    transmission_xx = torch.abs(txx)**2
-                                    transmission_yy = torch.abs(tyy)**2
-                                    phase_xx = torch.angle(txx)
-                                    phase_yy = torch.angle(tyy)
-                                    transmission_xy = torch.abs(txy)**2
-                                    transmission_yx = torch.abs(tyx)**2
-                                    phase_xy = torch.angle(txy)
-                                    phase_yx = torch.angle(tyx)
-                                    tRL = 0.5*((txx - tyy) - 1j * (txy + tyx))
-                                    tRR = 0.5*((txx + tyy) + 1j * (txy - tyx))
-                                    tLR = 0.5*((txx - tyy) + 1j * (txy + tyx))
-                                    tLL = 0.5*((txx + tyy) - 1j * (txy - tyx))
-                                    transmission_RL = torch.abs(tRL)**2
-                                    transmission_LR = torch.abs(tLR)**2
-                                    phase_RL = torch.angle(tRL)
-                                    phase_LR = torch.angle(tLR)
-                                    transmission_RR = torch.abs(tRR)**2
-                                    transmission_LL = torch.abs(tLL)**2
-                                    phase_RR = torch.angle(tRR)
-                                    phase_LL = torch.angle(tLL)
-
-                                    transmission_tensor[i, j, k, l, m, n, 0] = transmission_xx
-                                    phase_tensor[i, j, k, l, m, n, 0] = phase_xx
-                                    transmission_tensor[i, j, k, l, m, n, 1] = transmission_yx
-                                    phase_tensor[i, j, k, l, m, n, 1] = phase_yx
-                                    transmission_tensor[i, j, k, l, m, n, 2] = transmission_xy
-                                    phase_tensor[i, j, k, l, m, n, 2] = phase_xy
-                                    transmission_tensor[i, j, k, l, m, n, 3] = transmission_yy
-                                    phase_tensor[i, j, k, l, m, n, 3] = phase_yy
-                                    transmission_tensor[i, j, k, l, m, n, 4] = transmission_LL
-                                    phase_tensor[i, j, k, l, m, n, 4] = phase_LL
-                                    transmission_tensor[i, j, k, l, m, n, 5] = transmission_RL
-                                    phase_tensor[i, j, k, l, m, n, 5] = phase_RL
-                                    transmission_tensor[i, j, k, l, m, n, 6] = transmission_LR
-                                    phase_tensor[i, j, k, l, m, n, 6] = phase_LR
-                                    transmission_tensor[i, j, k, l, m, n, 7] = transmission_RR
-                                    phase_tensor[i, j, k, l, m, n, 7] = phase_RR
-
-                                    # 更新進度條
-                                    current_iteration += 1
-                                    progress = int((current_iteration / total_iterations) * 100)
-                                    self.progress_bar.setValue(progress)
-
-                                    # 允許 UI 更新
-                                    QApplication.processEvents()
-            self.data_sheet = {
-                "shape_type": params["shape_type"],
-                "Dimension_name": dimension_names,
-                "Wavelength": wavelength_list,
-                "Period": period_list,
-                "Thickness": thickness_list,
-                "Wx": Wx_list,
-                "Wy": Wy_list,
-                "Theta": theta_list,
-                "transmission_tensor": transmission_tensor.cpu().numpy(),
-                "phase_tensor": phase_tensor.cpu().numpy()
-            }
-        elif params["shape_type"] == "ellipse":
-            # Rx list
-            Rx_list = np.linspace(params["Rx_min"], params["Rx_max"], params["Rx_n"])
-            # Ry list
-            Ry_list = np.linspace(params["Ry_min"], params["Ry_max"], params["Ry_n"])
-            # theta list
-            theta_list = np.linspace(params["theta_min"], params["theta_max"], params["theta_n"])
-            # 計算總迴圈數
-            total_iterations = (
-                len(wavelength_list) * len(period_list) * len(thickness_list) *
-                len(Rx_list) * len(Ry_list) * len(theta_list)
-            )
-            dimension_names = [
-                "Wavelength (nm)", "Period (nm)", "Thickness (nm)",
-                "Rx (nm)", "Ry (nm)", "Rotation Angle (deg)"
-            ]
-            # 依序迴圈，計算每一組 RCWA(Wavelength, Period, Thickness, Wx, Wy, theta)存入空矩陣shape為(wavelength_n, period_n, thickness_n, Wx_n, Wy_n, theta_n)
-            # 創建一個 tensor，初始化為零
-            transmission_tensor = torch.zeros(len(wavelength_list), len(period_list), len(thickness_list), len(Rx_list), len(Ry_list), len(theta_list), 8)
-            phase_tensor = torch.zeros_like(transmission_tensor)
-            # 進行批次計算
-            for i, wavelength in enumerate(wavelength_list):
-                for j, period in enumerate(period_list):
-                    for k, thickness in enumerate(thickness_list):
-                        for l, Rx in enumerate(Rx_list):
-                            for m, Ry in enumerate(Ry_list):
-                                for n, theta in enumerate(theta_list):
-                                    while self.is_paused:
-                                        QApplication.processEvents()
-                                    if not self.is_running:
-                                        return
-                                    # 模擬 RCWA 計算
-                                    rcwa_obj = RCWA(
-                                        device=params["device"],
-                                        shape_type=params["shape_type"],
-                                        harmonic_order=params["harmonic_order"],
-                                        wavelength=wavelength,
-                                        period=period,
-                                        substrate_material=params["substrate_material"],
-                                        slab_material=params["slab_material"],
-                                        slab_thickness=params["slab_thickness"],
-                                        metasurface_material=params["metasurface_material"],
-                                        metasurface_thickness=thickness,
-                                        filling_material=params["filling_material"],
-                                        filling_thickness=params["filling_thickness"],
-                                        output_material=params["output_material"],
-                                        Rx=Rx,
-                                        Ry=Ry,
-                                        theta=theta,
-                                    )
-                                    txx, txy, tyx, tyy = rcwa_obj.get_Sparameter()
-                                    transmission_xx = torch.abs(txx)**2
-                                    transmission_yy = torch.abs(tyy)**2
-                                    phase_xx = torch.angle(txx)
-                                    phase_yy = torch.angle(tyy)
-                                    transmission_xy = torch.abs(txy)**2
-                                    transmission_yx = torch.abs(tyx)**2
-                                    phase_xy = torch.angle(txy)
-                                    phase_yx = torch.angle(tyx)
-                                    tRL = 0.5*((txx - tyy) - 1j * (txy + tyx))
-                                    tRR = 0.5*((txx + tyy) + 1j * (txy - tyx))
-                                    tLR = 0.5*((txx - tyy) + 1j * (txy + tyx))
-                                    tLL = 0.5*((txx + tyy) - 1j * (txy - tyx))
-                                    transmission_RL = torch.abs(tRL)**2
-                                    transmission_LR = torch.abs(tLR)**2
-                                    phase_RL = torch.angle(tRL)
-                                    phase_LR = torch.angle(tLR)
-                                    transmission_RR = torch.abs(tRR)**2
-                                    transmission_LL = torch.abs(tLL)**2
-                                    phase_RR = torch.angle(tRR)
-                                    phase_LL = torch.angle(tLL)
-
-                                    transmission_tensor[i, j, k, l, m, n, 0] = transmission_xx
-                                    phase_tensor[i, j, k, l, m, n, 0] = phase_xx
-                                    transmission_tensor[i, j, k, l, m, n, 1] = transmission_yx
-                                    phase_tensor[i, j, k, l, m, n, 1] = phase_yx
-                                    transmission_tensor[i, j, k, l, m, n, 2] = transmission_xy
-                                    phase_tensor[i, j, k, l, m, n, 2] = phase_xy
-                                    transmission_tensor[i, j, k, l, m, n, 3] = transmission_yy
-                                    phase_tensor[i, j, k, l, m, n, 3] = phase_yy
-                                    transmission_tensor[i, j, k, l, m, n, 4] = transmission_LL
-                                    phase_tensor[i, j, k, l, m, n, 4] = phase_LL
-                                    transmission_tensor[i, j, k, l, m, n, 5] = transmission_RL
-                                    phase_tensor[i, j, k, l, m, n, 5] = phase_RL
-                                    transmission_tensor[i, j, k, l, m, n, 6] = transmission_LR
-                                    phase_tensor[i, j, k, l, m, n, 6] = phase_LR
-                                    transmission_tensor[i, j, k, l, m, n, 7] = transmission_RR
-                                    phase_tensor[i, j, k, l, m, n, 7] = phase_RR
-
-                                    # 更新進度條
-                                    current_iteration += 1
-                                    progress = int((current_iteration / total_iterations) * 100)
-                                    self.progress_bar.setValue(progress)
-
-                            # 允許 UI 更新
-                            QApplication.processEvents()
-            self.data_sheet = {
-                "shape_type": params["shape_type"],
-                "Dimension_name": dimension_names,
-                "Wavelength": wavelength_list,
-                "Period": period_list,
-                "Thickness": thickness_list,
-                "Rx": Rx_list,
-                "Ry": Ry_list,
-                "Theta": theta_list,
-                "transmission_tensor": transmission_tensor.cpu().numpy(),
-                "phase_tensor": phase_tensor.cpu().numpy()
-            }
-        elif params["shape_type"] == "circle":
-            # R list
-            R_list = np.linspace(params["R_min"], params["R_max"], params["R_n"])
-            # 計算總迴圈數
-            total_iterations = (
-                len(wavelength_list) * len(period_list) * len(thickness_list) *
-                len(R_list)
-            )
-            dimension_names = [
-                "Wavelength (nm)", "Period (nm)", "Thickness (nm)",
-                "R (nm)"
-            ]
-            # 依序迴圈，計算每一組 RCWA(Wavelength, Period, Thickness, Wx, Wy, theta)存入空矩陣shape為(wavelength_n, period_n, thickness_n, Wx_n, Wy_n, theta_n)
-            # 創建一個 tensor，初始化為零
-            transmission_tensor = torch.zeros(len(wavelength_list), len(period_list), len(thickness_list), len(R_list), 8)
-            phase_tensor = torch.zeros_like(transmission_tensor)
-            # 進行批次計算
-            for i, wavelength in enumerate(wavelength_list):
-                for j, period in enumerate(period_list):
-                    for k, thickness in enumerate(thickness_list):
-                        for l, R in enumerate(R_list):
-                                    while self.is_paused:
-                                        QApplication.processEvents()
-                                    if not self.is_running:
-                                        return
-                                    # 模擬 RCWA 計算
-                                    rcwa_obj = RCWA(
-                                        device=params["device"],
-                                        shape_type=params["shape_type"],
-                                        harmonic_order=params["harmonic_order"],
-                                        wavelength=wavelength,
-                                        period=period,
-                                        substrate_material=params["substrate_material"],
-                                        slab_material=params["slab_material"],
-                                        slab_thickness=params["slab_thickness"],
-                                        metasurface_material=params["metasurface_material"],
-                                        metasurface_thickness=thickness,
-                                        filling_material=params["filling_material"],
-                                        filling_thickness=params["filling_thickness"],
-                                        output_material=params["output_material"],
-                                        R=R,
-                                    )
-                                    txx, txy, tyx, tyy = rcwa_obj.get_Sparameter()
-                                    transmission_xx = torch.abs(txx)**2
-                                    transmission_yy = torch.abs(tyy)**2
-                                    phase_xx = torch.angle(txx)
-                                    phase_yy = torch.angle(tyy)
-                                    transmission_xy = torch.abs(txy)**2
-                                    transmission_yx = torch.abs(tyx)**2
-                                    phase_xy = torch.angle(txy)
-                                    phase_yx = torch.angle(tyx)
-                                    tRL = 0.5*((txx - tyy) - 1j * (txy + tyx))
-                                    tRR = 0.5*((txx + tyy) + 1j * (txy - tyx))
-                                    tLR = 0.5*((txx - tyy) + 1j * (txy + tyx))
-                                    tLL = 0.5*((txx + tyy) - 1j * (txy - tyx))
-                                    transmission_RL = torch.abs(tRL)**2
-                                    transmission_LR = torch.abs(tLR)**2
-                                    phase_RL = torch.angle(tRL)
-                                    phase_LR = torch.angle(tLR)
-                                    transmission_RR = torch.abs(tRR)**2
-                                    transmission_LL = torch.abs(tLL)**2
-                                    phase_RR = torch.angle(tRR)
-                                    phase_LL = torch.angle(tLL)
-
-                                    transmission_tensor[i, j, k, l, 0] = transmission_xx
-                                    phase_tensor[i, j, k, l, 0] = phase_xx
-                                    transmission_tensor[i, j, k, l, 1] = transmission_yx
-                                    phase_tensor[i, j, k, l, 1] = phase_yx
-                                    transmission_tensor[i, j, k, l, 2] = transmission_xy
-                                    phase_tensor[i, j, k, l, 2] = phase_xy
-                                    transmission_tensor[i, j, k, l, 3] = transmission_yy
-                                    phase_tensor[i, j, k, l, 3] = phase_yy
-                                    transmission_tensor[i, j, k, l, 4] = transmission_LL
-                                    phase_tensor[i, j, k, l, 4] = phase_LL
-                                    transmission_tensor[i, j, k, l, 5] = transmission_RL
-                                    phase_tensor[i, j, k, l, 5] = phase_RL
-                                    transmission_tensor[i, j, k, l, 6] = transmission_LR
-                                    phase_tensor[i, j, k, l, 6] = phase_LR
-                                    transmission_tensor[i, j, k, l, 7] = transmission_RR
-                                    phase_tensor[i, j, k, l, 7] = phase_RR
-
-                                    # 更新進度條
-                                    current_iteration += 1
-                                    progress = int((current_iteration / total_iterations) * 100)
-                                    self.progress_bar.setValue(progress)
-
-                                    # 允許 UI 更新
-                                    QApplication.processEvents()
-            self.data_sheet = {
-                "shape_type": params["shape_type"],
-                "Dimension_name": dimension_names,
-                "Wavelength": wavelength_list,
-                "Period": period_list,
-                "Thickness": thickness_list,
-                "R": R_list,
-                "transmission_tensor": transmission_tensor.cpu().numpy(),
-                "phase_tensor": phase_tensor.cpu().numpy()
-            }
-        elif params["shape_type"] == "square":
-            # Wx list
-            Wx_list = np.linspace(params["Wx_min"], params["Wx_max"], params["Wx_n"])
-            # theta list
-            theta_list = np.linspace(params["theta_min"], params["theta_max"], params["theta_n"])
-            # 計算總迴圈數
-            total_iterations = (
-                len(wavelength_list) * len(period_list) * len(thickness_list) *
-                len(Wx_list) * len(theta_list)
-            )
-            dimension_names = [
-                "Wavelength (nm)", "Period (nm)", "Thickness (nm)",
-                "W (nm)", "Rotation Angle (deg)"
-            ]
-            # 依序迴圈，計算每一組 RCWA(Wavelength, Period, Thickness, Wx, Wy, theta)存入空矩陣shape為(wavelength_n, period_n, thickness_n, Wx_n, Wy_n, theta_n)
-            # 創建一個 tensor，初始化為零
-            transmission_tensor = torch.zeros(len(wavelength_list), len(period_list), len(thickness_list), len(Wx_list), len(theta_list), 8)
-            phase_tensor = torch.zeros_like(transmission_tensor)
-            # 進行批次計算
-            for i, wavelength in enumerate(wavelength_list):
-                for j, period in enumerate(period_list):
-                    for k, thickness in enumerate(thickness_list):
-                        for l, Wx in enumerate(Wx_list):
-                                for m, theta in enumerate(theta_list):
-                                    while self.is_paused:
-                                        QApplication.processEvents()
-                                    if not self.is_running:
-                                        return
-                                    # 模擬 RCWA 計算
-                                    rcwa_obj = RCWA(
-                                        device=params["device"],
-                                        shape_type=params["shape_type"],
-                                        harmonic_order=params["harmonic_order"],
-                                        wavelength=wavelength,
-                                        period=period,
-                                        substrate_material=params["substrate_material"],
-                                        slab_material=params["slab_material"],
-                                        slab_thickness=params["slab_thickness"],
-                                        metasurface_material=params["metasurface_material"],
-                                        metasurface_thickness=thickness,
-                                        filling_material=params["filling_material"],
-                                        filling_thickness=params["filling_thickness"],
-                                        output_material=params["output_material"],
-                                        Wx=Wx,
-                                        theta=theta,
-                                    )
-                                    txx, txy, tyx, tyy = rcwa_obj.get_Sparameter()
-                                    transmission_xx = torch.abs(txx)**2
-                                    transmission_yy = torch.abs(tyy)**2
-                                    phase_xx = torch.angle(txx)
-                                    phase_yy = torch.angle(tyy)
-                                    transmission_xy = torch.abs(txy)**2
-                                    transmission_yx = torch.abs(tyx)**2
-                                    phase_xy = torch.angle(txy)
-                                    phase_yx = torch.angle(tyx)
-                                    tRL = 0.5*((txx - tyy) - 1j * (txy + tyx))
-                                    tRR = 0.5*((txx + tyy) + 1j * (txy - tyx))
-                                    tLR = 0.5*((txx - tyy) + 1j * (txy + tyx))
-                                    tLL = 0.5*((txx + tyy) - 1j * (txy - tyx))
-                                    transmission_RL = torch.abs(tRL)**2
-                                    transmission_LR = torch.abs(tLR)**2
-                                    phase_RL = torch.angle(tRL)
-                                    phase_LR = torch.angle(tLR)
-                                    transmission_RR = torch.abs(tRR)**2
-                                    transmission_LL = torch.abs(tLL)**2
-                                    phase_RR = torch.angle(tRR)
-                                    phase_LL = torch.angle(tLL)
-
-                                    transmission_tensor[i, j, k, l, m, 0] = transmission_xx
-                                    phase_tensor[i, j, k, l, m, 0] = phase_xx
-                                    transmission_tensor[i, j, k, l, m, 1] = transmission_yx
-                                    phase_tensor[i, j, k, l, m, 1] = phase_yx
-                                    transmission_tensor[i, j, k, l, m, 2] = transmission_xy
-                                    phase_tensor[i, j, k, l, m, 2] = phase_xy
-                                    transmission_tensor[i, j, k, l, m, 3] = transmission_yy
-                                    phase_tensor[i, j, k, l, m, 3] = phase_yy
-                                    transmission_tensor[i, j, k, l, m, 4] = transmission_LL
-                                    phase_tensor[i, j, k, l, m, 4] = phase_LL
-                                    transmission_tensor[i, j, k, l, m, 5] = transmission_RL
-                                    phase_tensor[i, j, k, l, m, 5] = phase_RL
-                                    transmission_tensor[i, j, k, l, m, 6] = transmission_LR
-                                    phase_tensor[i, j, k, l, m, 6] = phase_LR
-                                    transmission_tensor[i, j, k, l, m, 7] = transmission_RR
-                                    phase_tensor[i, j, k, l, m, 7] = phase_RR
-
-                                    # 更新進度條
-                                    current_iteration += 1
-                                    progress = int((current_iteration / total_iterations) * 100)
-                                    self.progress_bar.setValue(progress)
-
-                                    # 允許 UI 更新
-                                    QApplication.processEvents()
-            self.data_sheet = {
-                "shape_type": params["shape_type"],
-                "Dimension_name": dimension_names,
-                "Wavelength": wavelength_list,
-                "Period": period_list,
-                "Thickness": thickness_list,
-                "Wx": Wx_list,
-                "Theta": theta_list,
-                "transmission_tensor": transmission_tensor.cpu().numpy(),
-                "phase_tensor": phase_tensor.cpu().numpy()
-            }
-        elif params["shape_type"] == "hollow_square":
-            # Wx list
-            Wx_list = np.linspace(params["Wx_min"], params["Wx_max"], params["Wx_n"])
-            # hollow_W list
-            hollow_W_list = np.linspace(params["hollow_W_min"], params["hollow_W_max"], params["hollow_W_n"])
-            # theta list
-            theta_list = np.linspace(params["theta_min"], params["theta_max"], params["theta_n"])
-            # 計算總迴圈數
-            total_iterations = (
-                len(wavelength_list) * len(period_list) * len(thickness_list) *
-                len(Wx_list) * len(hollow_W_list) * len(theta_list)
-            )
-            dimension_names = [
-                "Wavelength (nm)", "Period (nm)", "Thickness (nm)",
-                "W (nm)", "Hollow Width (nm)", "Rotation Angle (deg)"
-            ]
-            # 依序迴圈，計算每一組 RCWA(Wavelength, Period, Thickness, Wx, Wy, theta)存入空矩陣shape為(wavelength_n, period_n, thickness_n, Wx_n, Wy_n, theta_n)
-            # 創建一個 tensor，初始化為零
-            transmission_tensor = torch.zeros(len(wavelength_list), len(period_list), len(thickness_list), len(Wx_list), len(hollow_W_list), len(theta_list), 8)
-            phase_tensor = torch.zeros_like(transmission_tensor)
-            # 進行批次計算
-            for i, wavelength in enumerate(wavelength_list):
-                for j, period in enumerate(period_list):
-                    for k, thickness in enumerate(thickness_list):
-                        for l, Wx in enumerate(Wx_list):
-                            for m, hollow_W in enumerate(hollow_W_list):
-                                for n, theta in enumerate(theta_list):
-                                    while self.is_paused:
-                                        QApplication.processEvents()
-                                    if not self.is_running:
-                                        return
-                                    # 模擬 RCWA 計算
-                                    rcwa_obj = RCWA(
-                                        device=params["device"],
-                                        shape_type=params["shape_type"],
-                                        harmonic_order=params["harmonic_order"],
-                                        wavelength=wavelength,
-                                        period=period,
-                                        substrate_material=params["substrate_material"],
-                                        slab_material=params["slab_material"],
-                                        slab_thickness=params["slab_thickness"],
-                                        metasurface_material=params["metasurface_material"],
-                                        metasurface_thickness=thickness,
-                                        filling_material=params["filling_material"],
-                                        filling_thickness=params["filling_thickness"],
-                                        output_material=params["output_material"],
-                                        Wx=Wx,
-                                        hollow_W=hollow_W,
-                                        theta=theta,
-                                    )
-                                    txx, txy, tyx, tyy = rcwa_obj.get_Sparameter()
-                                    transmission_xx = torch.abs(txx)**2
-                                    transmission_yy = torch.abs(tyy)**2
-                                    phase_xx = torch.angle(txx)
-                                    phase_yy = torch.angle(tyy)
-                                    transmission_xy = torch.abs(txy)**2
-                                    transmission_yx = torch.abs(tyx)**2
-                                    phase_xy = torch.angle(txy)
-                                    phase_yx = torch.angle(tyx)
-                                    tRL = 0.5*((txx - tyy) - 1j * (txy + tyx))
-                                    tRR = 0.5*((txx + tyy) + 1j * (txy - tyx))
-                                    tLR = 0.5*((txx - tyy) + 1j * (txy + tyx))
-                                    tLL = 0.5*((txx + tyy) - 1j * (txy - tyx))
-                                    transmission_RL = torch.abs(tRL)**2
-                                    transmission_LR = torch.abs(tLR)**2
-                                    phase_RL = torch.angle(tRL)
-                                    phase_LR = torch.angle(tLR)
-                                    transmission_RR = torch.abs(tRR)**2
-                                    transmission_LL = torch.abs(tLL)**2
-                                    phase_RR = torch.angle(tRR)
-                                    phase_LL = torch.angle(tLL)
-                                    
-                                    transmission_tensor[i, j, k, l, m, n, 0] = transmission_xx
-                                    phase_tensor[i, j, k, l, m, n, 0] = phase_xx
-                                    transmission_tensor[i, j, k, l, m, n, 1] = transmission_yx
-                                    phase_tensor[i, j, k, l, m, n, 1] = phase_yx
-                                    transmission_tensor[i, j, k, l, m, n, 2] = transmission_xy
-                                    phase_tensor[i, j, k, l, m, n, 2] = phase_xy
-                                    transmission_tensor[i, j, k, l, m, n, 3] = transmission_yy
-                                    phase_tensor[i, j, k, l, m, n, 3] = phase_yy
-                                    transmission_tensor[i, j, k, l, m, n, 4] = transmission_LL
-                                    phase_tensor[i, j, k, l, m, n, 4] = phase_LL
-                                    transmission_tensor[i, j, k, l, m, n, 5] = transmission_RL
-                                    phase_tensor[i, j, k, l, m, n, 5] = phase_RL
-                                    transmission_tensor[i, j, k, l, m, n, 6] = transmission_LR
-                                    phase_tensor[i, j, k, l, m, n, 6] = phase_LR
-                                    transmission_tensor[i, j, k, l, m, n, 7] = transmission_RR
-                                    phase_tensor[i, j, k, l, m, n, 7] = phase_RR
-
-                                    # 更新進度條
-                                    current_iteration += 1
-                                    progress = int((current_iteration / total_iterations) * 100)
-                                    self.progress_bar.setValue(progress)
-                        
-                                    # 允許 UI 更新
-                                    QApplication.processEvents()
-            self.data_sheet = {
-                "shape_type": params["shape_type"],
-                "Dimension_name": dimension_names,
-                "Wavelength": wavelength_list,
-                "Period": period_list,
-                "Thickness": thickness_list,
-                "Wx": Wx_list,
-                "Hollow_W": hollow_W_list,
-                "Theta": theta_list,
-                "transmission_tensor": transmission_tensor.cpu().numpy(),
-                "phase_tensor": phase_tensor.cpu().numpy()
-                }
-        elif params["shape_type"] == "hollow_circle":
-            # R list
-            R_list = np.linspace(params["R_min"], params["R_max"], params["R_n"])
-            # hollow_R list
-            hollow_R_list = np.linspace(params["hollow_R_min"], params["hollow_R_max"], params["hollow_R_n"])
-            # 計算總迴圈數
-            total_iterations = (
-                len(wavelength_list) * len(period_list) * len(thickness_list) *
-                len(R_list) * len(hollow_R_list)
-            )
-
-            # 依序迴圈，計算每一組 RCWA(Wavelength, Period, Thickness, Wx, Wy, theta)存入空矩陣shape為(wavelength_n, period_n, thickness_n, Wx_n, Wy_n, theta_n)
-            # 創建一個 tensor，初始化為零
-            transmission_tensor = torch.zeros(len(wavelength_list), len(period_list), len(thickness_list), len(R_list), len(hollow_R_list), 8)
-            phase_tensor = torch.zeros_like(transmission_tensor)
-            # 進行批次計算
-            for i, wavelength in enumerate(wavelength_list):
-                for j, period in enumerate(period_list):
-                    for k, thickness in enumerate(thickness_list):
-                        for l, R in enumerate(R_list):
-                            for m, hollow_R in enumerate(hollow_R_list):
-                                while self.is_paused:
-                                        QApplication.processEvents()
-                                if not self.is_running:
-                                    return
-                                # 模擬 RCWA 計算
-                                rcwa_obj = RCWA(
-                                    device=params["device"],
-                                    shape_type=params["shape_type"],
-                                    harmonic_order=params["harmonic_order"],
-                                    wavelength=wavelength,
-                                    period=period,
-                                    substrate_material=params["substrate_material"],
-                                    slab_material=params["slab_material"],
-                                    slab_thickness=params["slab_thickness"],
-                                    metasurface_material=params["metasurface_material"],
-                                    metasurface_thickness=thickness,
-                                    filling_material=params["filling_material"],
-                                    filling_thickness=params["filling_thickness"],
-                                    output_material=params["output_material"],
-                                    R=R,
-                                    hollow_R=hollow_R,
-                                )
-                                txx, txy, tyx, tyy = rcwa_obj.get_Sparameter()
-                                transmission_xx = torch.abs(txx)**2
-                                transmission_yy = torch.abs(tyy)**2
-                                phase_xx = torch.angle(txx)
-                                phase_yy = torch.angle(tyy)
-                                transmission_xy = torch.abs(txy)**2
-                                transmission_yx = torch.abs(tyx)**2
-                                phase_xy = torch.angle(txy)
-                                phase_yx = torch.angle(tyx)
-                                tRL = 0.5*((txx - tyy) - 1j * (txy + tyx))
-                                tRR = 0.5*((txx + tyy) + 1j * (txy - tyx))
-                                tLR = 0.5*((txx - tyy) + 1j * (txy + tyx))
-                                tLL = 0.5*((txx + tyy) - 1j * (txy - tyx))
-                                transmission_RL = torch.abs(tRL)**2
-                                transmission_LR = torch.abs(tLR)**2
-                                phase_RL = torch.angle(tRL)
-                                phase_LR = torch.angle(tLR)
-                                transmission_RR = torch.abs(tRR)**2
-                                transmission_LL = torch.abs(tLL)**2
-                                phase_RR = torch.angle(tRR)
-                                phase_LL = torch.angle(tLL)
-
-                                phase_tensor[i, j, k, l, m, 0] = phase_xx
-                                phase_tensor[i, j, k, l, m, 1] = phase_yx
-                                phase_tensor[i, j, k, l, m, 2] = phase_xy
-                                phase_tensor[i, j, k, l, m, 3] = phase_yy
-                                phase_tensor[i, j, k, l, m, 4] = phase_LL
-                                phase_tensor[i, j, k, l, m, 5] = phase_RL
-                                phase_tensor[i, j, k, l, m, 6] = phase_LR
-                                phase_tensor[i, j, k, l, m, 7] = phase_RR
-                                transmission_tensor[i, j, k, l, m, 0] = transmission_xx
-                                transmission_tensor[i, j, k, l, m, 1] = transmission_yx
-                                transmission_tensor[i, j, k, l, m, 2] = transmission_xy
-                                transmission_tensor[i, j, k, l, m, 3] = transmission_yy
-                                transmission_tensor[i, j, k, l, m, 4] = transmission_LL
-                                transmission_tensor[i, j, k, l, m, 5] = transmission_RL
-                                transmission_tensor[i, j, k, l, m, 6] = transmission_LR
-                                transmission_tensor[i, j, k, l, m, 7] = transmission_RR
-
-                                
-
-                                # 更新進度條
-                                current_iteration += 1
-                                progress = int((current_iteration / total_iterations) * 100)
-                                self.progress_bar.setValue(progress)
-                                
-                                # 允許 UI 更新
-                                QApplication.processEvents()
-            self.data_sheet = {
-                "shape_type": params["shape_type"],
-                "Wavelength": wavelength_list,
-                "Period": period_list,
-                "Thickness": thickness_list,
-                "R": R_list,
-                "Hollow_R": hollow_R_list,
-                "transmission_tensor": transmission_tensor.cpu().numpy(),
-                "phase_tensor": phase_tensor.cpu().numpy()
-            }
+        sampling = self.sampling_combo.currentText()
+        if sampling == "Adaptive":
+            self.adaptive_calculation(params)
+            return
+        if sampling in ("Sobol", "LHS"):
+            self.sampled_calculation(params, sampling.lower())
+            return
+        engine = SweepEngine(params, output_dir=RESULT_DIR, cache=self.result_cache)
+        if not self.confirm_sweep(engine):
+            self.is_running = False
+            self.batch_button.setText("batch calculate")
+            return
+        checkpoint = Checkpoint(CHECKPOINT_FILE)
+        data_sheet = engine.run(on_point=self.on_sweep_point, checkpoint=checkpoint)
+        print(self.result_cache.stats())
+        if TIMER.enabled:
+            print(TIMER.report())
+        if data_sheet is not None:
+            self.data_sheet = data_sheet
+        self.is_running = False
+        self.is_paused = False
+        self.batch_button.setText("batch calculate")
+
+    def adaptive_calculation(self, params):
+        """自適應細分取樣 (Adaptive)：每個軸的 N 為粗網格點數，結果為 scattered data_sheet。"""
+        from Adaptive import AdaptiveSweep
+        sweep = AdaptiveSweep(params, cache=self.result_cache)
+        data_sheet = sweep.run(on_point=self.on_sweep_point)
+        print(self.result_cache.stats())
+        if data_sheet is not None:
+            print(f"自適應取樣完成：{len(data_sheet['jones_tensor'])} 點")
+            self.data_sheet = data_sheet
+        self.is_running = False
+        self.is_paused = False
+        self.batch_button.setText("batch calculate")
+
+    def sampled_calculation(self, params, method):
+        """準隨機取樣 (Sampling)：在各掃描軸的 [min, max] 內取 Samples 個點，結果為 scattered data_sheet。"""
+        from Sampling import QuasiRandomSweep
+        sweep = QuasiRandomSweep(params, int(self.samples_input.text()), method=method, cache=self.result_cache)
+        data_sheet = sweep.run(on_point=self.on_sweep_point)
+        print(self.result_cache.stats())
+        if data_sheet is not None:
+            print(f"{method} 取樣完成：{len(data_sheet['jones_tensor'])} 點")
+            self.data_sheet = data_sheet
         self.is_running = False
         self.is_paused = False
         self.batch_button.setText("batch calculate")
+
+    def confirm_sweep(self, engine):
+        """顯示掃描前的估計；記憶體不足時拒絕，ETA 超過 CONFIRM_ETA_SECONDS 時詢問是否繼續。"""
+        from Preflight import estimate, format_estimate
+        preflight = estimate(engine, calibration_points=CALIBRATION_POINTS)
+        report = format_estimate(preflight)
+        print(report)
+        if preflight["action"] == "refuse":
+            QMessageBox.warning(self, "Batch calculation", report)
+            return False
+        if (preflight["eta_seconds"] or 0) > CONFIRM_ETA_SECONDS:
+            answer = QMessageBox.question(self, "Batch calculation", report + "\n\n是否開始計算？")
+            return answer == QMessageBox.Yes
+        return True
+
+    def on_sweep_point(self, done, total):
+        """
+        SweepEngine 每算完一個點呼叫一次：更新進度條、處理暫停，回傳 False 代表中止。
+        """
+        # 更新進度條
+        self.progress_bar.setValue(int((done / total) * 100))
+        # 允許 UI 更新
+        QApplication.processEvents()
+        while self.is_paused:
+            QApplication.processEvents()
+        return self.is_running
             
 
     def save_tensors_to_file(self):
         """
-        使用者選擇檔案格式、位置與檔名，將 Tensors 保存為 .mat、.npy 或 .txt 檔
+        使用者選擇檔案格式、位置與檔名，將 data_sheet 保存為 .rcwad 分塊資料集，
+        或匯出成 .mat / 舊版 .npy 檔
         """
-        # 彈出檔案儲存對話框，允許選擇 .mat、.npy 或 .txt 格式
+        # 彈出檔案儲存對話框，允許選擇 .rcwad、.mat 或 .npy 格式
         options = QFileDialog.Options()
         file_path, selected_filter = QFileDialog.getSaveFileName(
             self,
             "Save File",
             "",
-            "NumPy file (*.npy)",
+            ";;".join(SAVE_FILTERS),
             options=options
         )
 
         if file_path:
-            # 判斷選擇的檔案格
-
-            if selected_filter == "NumPy file (*.npy)" or file_path.endswith(".npy"):
-                # 保存為 .npy 檔
-                np.save(file_path, {
-                    "data_sheet": self.data_sheet
-                })
-                print(f"Tensors saved as NumPy file to {file_path}")
-
-                # 修改路徑後綴為 .mat
-                mat_file_path = file_path[:-4] + ".mat"
-
-                # 保存為 .mat 檔
-                sio.savemat(mat_file_path, {
-                    "data_sheet": self.data_sheet
-                })
-                print(f"Tensors also saved as MAT file to {mat_file_path}")
-                
+            # 判斷選擇的檔案格式，沒有副檔名時依選擇的格式補上
+            extension = SAVE_FILTERS.get(selected_filter, ".rcwad")
+            if not file_path.endswith((".rcwad", ".mat", ".npy")):
+                file_path += extension
+            if not file_path.endswith(".rcwad"):
+                save_data_sheet(file_path, self.data_sheet)
+                return
+            # .rcwad 在背景執行緒寫出，避免大型資料集存檔時凍結視窗
+            self.save_button.setEnabled(False)
+            self.export_writer = DatasetWriter(
+                file_path, self.data_sheet, codec=self.codec_combo.currentText()
+            ).start()
+            self.export_timer = QTimer(self)
+            self.export_timer.timeout.connect(self.poll_export)
+            self.export_timer.start(200)
+
+    def poll_export(self):
+        """定期檢查背景存檔的進度。"""
+        writer = self.export_writer
+        self.progress_bar.setValue(int(writer.progress * 100))
+        if not writer.done:
+            return
+        self.export_timer.stop()
+        self.save_button.setEnabled(True)
+        if writer.error is not None:
+            print(f"存檔失敗: {writer.error}")
 
     def openDataVisualizer(self):
         """
         按下按鈕後，依照 self.data_sheet 是否為 None 來決定要怎麼開 DataVisualizer。
         """
+        from DataVisualize import DataVisualize
         if self.data_sheet is not None:
             # 情況一：直接將 data_sheet 傳給 DataVisualizer
             self.vis_window = DataVisualize(data_sheet=self.data_sheet)
@@ -1619,15 +1145,10 @@ def main():
         print("此應用程式只能在授權的設備上執行")
         sys.exit() """
 
-    # Check expiry date
+    # Check expiry date：先以最後一次驗證過的時間檢查，網路時間在視窗顯示後於背景確認
     expiry_date = read_expiry_date_from_json('expiry_date.json')
-    current_date = get_network_time()
-
-    if current_date is None:
-        print("無法驗證當前日期，請檢察網路")
-        sys.exit()
-
-    if current_date > expiry_date:
+    last_known_time = read_last_known_time()
+    if last_known_time is not None and last_known_time > expiry_date:
         print("該用戶已過期")
         sys.exit()
     app = QApplication(sys.argv)
@@ -1638,8 +1159,11 @@ def main():
     window = MainWindow()
     window.setGeometry(200, 100, 800, 600)  
     window.show()
+    window.start_expiry_check(expiry_date)
     sys.exit(app.exec_())
 
 
 if __name__ == "__main__":
+    # 以 PyInstaller 打包時，spawn 的 worker 會重新執行 exe：freeze_support 讓它直接進入 worker 而不是再開一個 GUI
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,324 @@
+"""
+無 GUI 的批次計算入口：讀取 JSON / TOML 掃描設定檔，透過 SweepEngine 跑 RCWA，
+輸出與 GUI「Save Tensors to File」相同的 data_sheet (.rcwad 分塊資料集，或依副檔名輸出 .mat / .npy)。
+
+    python rcwa_batch.py sweep.json -o result.rcwad
+    python rcwa_batch.py sweep.json -o result.rcwad --checkpoint sweep.ckpt.npz --resume
+    python rcwa_batch.py sweep.json -o result.rcwad --store sweep_results/ --mat result.mat
+    python rcwa_batch.py sweep.json -o result.rcwad --timing --timing-log timing.jsonl
+    python rcwa_batch.py sweep.json -o result.rcwad --profile 10:20 --profile-dir profiles/
+    python rcwa_batch.py sweep.json --estimate
+    python rcwa_batch.py --extend result.rcwad --axis Wavelength --range 1000 1100 11 -o extended.rcwad
+    python rcwa_batch.py sweep.json --extend legacy.npy --axis Wx --values 120,140 -o extended.rcwad
+    python rcwa_batch.py sweep.json -o adaptive.rcwad --adaptive --tolerance 0.01 --phase-tolerance 0.05
+    python rcwa_batch.py sweep.json -o sobol.rcwad --sobol 4096 --seed 0
+    python rcwa_batch.py --to-grid adaptive.rcwad -o grid.rcwad
+
+設定檔的鍵與 MainWindow.get_gui_parameters() 相同，掃描軸可寫成
+"wavelength_min" / "wavelength_max" / "wavelength_n"，或集中寫在 "sweep" 區塊：
+
+    {
+        "shape_type": "rectangle",
+        "metasurface_material": "aSiH.txt",
+        ...
+        "sweep": {"wavelength": [900, 1000, 11], "Wx": [100, 300, 21], ...}
+    }
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+from SweepEngine import SweepEngine, axis_specs, extend_data_sheet
+from DataIO import save_data_sheet, load_data_sheet, export_mat
+from Checkpoint import Checkpoint
+from ResultCache import ResultCache, DEFAULT_CACHE_FILE
+from Timing import TIMER
+from Profiling import SweepProfiler, parse_window, DEFAULT_PROFILE_DIR
+from Preflight import estimate, format_estimate
+from Adaptive import AdaptiveSweep
+from Sampling import QuasiRandomSweep
+from Scattered import to_grid
+
+# 與 GUI 預設值一致的非掃描參數
+DEFAULT_SPEC = {
+    "device": "cpu",
+    "harmonic_order": 7,
+    "slab_thickness": 500.,
+    "filling_thickness": 500.,
+}
+
+REQUIRED_KEYS = [
+    "shape_type", "substrate_material", "slab_material",
+    "metasurface_material", "filling_material", "output_material",
+]
+
+
+def load_spec(file_path):
+    """讀取 JSON 或 TOML 設定檔，回傳與 get_gui_parameters() 相同形式的 params。"""
+    if file_path.endswith(".toml"):
+        import tomllib
+        with open(file_path, "rb") as f:
+            spec = tomllib.load(f)
+    else:
+        with open(file_path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    return spec_to_params(spec)
+
+
+def spec_to_params(spec):
+    params = dict(DEFAULT_SPEC)
+    params.update({key: value for key, value in spec.items() if key != "sweep"})
+    for param, (vmin, vmax, n) in spec.get("sweep", {}).items():
+        params[param + "_min"] = float(vmin)
+        params[param + "_max"] = float(vmax)
+        params[param + "_n"] = int(n)
+
+    missing = [key for key in REQUIRED_KEYS if key not in params]
+    for _, param, _ in axis_specs(params.get("shape_type", "rectangle")):
+        missing += [param + suffix for suffix in ("_min", "_max", "_n") if param + suffix not in params]
+    if missing:
+        raise ValueError(f"設定檔缺少參數: {', '.join(missing)}")
+
+    params["device"] = torch.device(params["device"])
+    params["harmonic_order"] = int(params["harmonic_order"])
+    return params
+
+
+def run(params, output=None, batch_size=None, order=None, report_every=100, checkpoint=None, output_dir=None,
+        cache=None, mat=None, codec="zlib:1", profile=None, profile_dir=DEFAULT_PROFILE_DIR,
+        calibration_points=3, force=False, estimate_only=False, workers=None, threads=None, dtype=None,
+        symmetry=True, scale_invariance=True):
+    """
+    執行掃描並印出 throughput 統計，回傳 data_sheet。
+    profile=(start, count) 時剖析該段走訪到的掃描點 (見 Profiling)，檔名取自輸出檔名。
+    開始前先估計記憶體與 ETA (Preflight)：結果放不下記憶體時改為串流寫入磁碟，
+    單點求解就超過記憶體時拒絕執行 (force=True 仍執行)；estimate_only=True 時只印估計。
+    """
+    engine = SweepEngine(params, order=order, batch_size=batch_size, output_dir=output_dir, cache=cache,
+                         workers=workers, threads=threads, dtype=dtype, symmetry=symmetry,
+                         scale_invariance=scale_invariance)
+    print(f"batch_size={engine.batch_size}, workers={engine.workers}, threads={engine.threads or 'default'}, "
+          f"dtype={engine.fixed_kwargs['dtype']}")
+    preflight = estimate(engine, calibration_points=calibration_points)
+    print(format_estimate(preflight))
+    if estimate_only:
+        return None
+    if preflight["action"] == "refuse" and not force:
+        raise SystemExit(f"拒絕執行：{preflight['reason']} (--force 強制執行)")
+    if preflight["action"] == "stream":
+        engine.output_dir = os.path.splitext(output or "data_sheet")[0] + "_store"
+        print(f"結果改為串流寫入 {engine.output_dir}")
+    profiler = None
+    if profile is not None:
+        name = os.path.splitext(os.path.basename(output))[0] if output else engine.name
+        profiler = SweepProfiler(name, *profile, output_dir=profile_dir)
+    print(f"shape_type={engine.shape_type}, grid={engine.shape}, total={engine.total} points")
+    start = time.perf_counter()
+
+    def on_point(done, total):
+        if done % report_every == 0 or done == total:
+            elapsed = time.perf_counter() - start
+            rate = done / elapsed if elapsed > 0 else 0.
+            eta = (total - done) / rate if rate > 0 else 0.
+            print(f"[{done}/{total}] {rate:.2f} points/s, ETA {eta:.0f} s", file=sys.stderr)
+
+    data_sheet = engine.run(on_point=on_point, checkpoint=checkpoint, profiler=profiler)
+    elapsed = time.perf_counter() - start
+    print(f"完成 {engine.total} 點，耗時 {elapsed:.2f} s，"
+          f"{engine.total / elapsed if elapsed > 0 else 0.:.2f} points/s，"
+          f"{1000 * elapsed / max(engine.total, 1):.1f} ms/point")
+    if cache is not None:
+        print(cache.stats())
+    if TIMER.enabled:
+        print(TIMER.report())
+
+    if output is not None:
+        save_data_sheet(output, data_sheet, codec=codec)
+    if mat is not None:
+        export_mat(data_sheet, mat)
+    return data_sheet
+
+
+def run_adaptive(params, output=None, transmission_tol=0.01, phase_tol=0.05, max_level=4, max_points=None,
+                 report_every=100, mat=None, codec="zlib:1", **engine_kwargs):
+    """自適應細分取樣 (Adaptive)：params 的 N 為粗網格的點數，回傳 scattered data_sheet。"""
+    sweep = AdaptiveSweep(params, transmission_tol=transmission_tol, phase_tol=phase_tol,
+                          max_level=max_level, max_points=max_points, **engine_kwargs)
+    print(f"shape_type={sweep.engine.shape_type}, coarse grid={tuple(sweep.coarse.tolist())}, "
+          f"finest lattice={tuple(sweep.fine.tolist())} ({int(np.prod(sweep.fine))} points), budget={sweep.budget}")
+    start = time.perf_counter()
+    reported = [0]
+
+    def on_point(done, budget):
+        if done - reported[0] >= report_every:
+            reported[0] = done
+            print(f"[{done}/{budget}] {done / (time.perf_counter() - start):.2f} points/s", file=sys.stderr)
+
+    data_sheet = sweep.run(on_point=on_point)
+    elapsed = time.perf_counter() - start
+    points = len(data_sheet["jones_tensor"])
+    print(f"完成 {points} 點 (最細網格的 {100 * points / np.prod(sweep.fine):.1f}%)，耗時 {elapsed:.2f} s")
+    if output is not None:
+        save_data_sheet(output, data_sheet, codec=codec)
+    if mat is not None:
+        export_mat(data_sheet, mat)
+    return data_sheet
+
+
+def run_sampled(params, samples, method="sobol", seed=None, output=None, report_every=100, mat=None, codec="zlib:1",
+                **engine_kwargs):
+    """準隨機取樣 (Sampling)：在各掃描軸的 [min, max] 內取 samples 個點，回傳 scattered data_sheet。"""
+    sweep = QuasiRandomSweep(params, samples, method=method, seed=seed, **engine_kwargs)
+    grid_points = int(np.prod([len(sweep.axes[d].values) for d in sweep.sample_dims]))
+    print(f"shape_type={sweep.engine.shape_type}, {method} samples={samples} over "
+          f"{', '.join(sweep.axes[d].name for d in sweep.sample_dims)} (grid: {grid_points} points)")
+    start = time.perf_counter()
+    reported = [0]
+
+    def on_point(done, total):
+        if done - reported[0] >= report_every:
+            reported[0] = done
+            print(f"[{done}/{total}] {done / (time.perf_counter() - start):.2f} points/s", file=sys.stderr)
+
+    data_sheet = sweep.run(on_point=on_point)
+    print(f"完成 {samples} 點，耗時 {time.perf_counter() - start:.2f} s")
+    if output is not None:
+        save_data_sheet(output, data_sheet, codec=codec)
+    if mat is not None:
+        export_mat(data_sheet, mat)
+    return data_sheet
+
+
+def extend(args):
+    """--extend：讀取既有資料集，沿 --axis 新增數值後另存新檔。"""
+    data_sheet = load_data_sheet(args.extend)
+    params = load_spec(args.spec) if args.spec else None
+    if args.values is not None:
+        new_values = [float(v) for v in args.values.split(",")]
+    else:
+        vmin, vmax, n = args.range
+        new_values = np.linspace(vmin, vmax, int(n))
+    cache = None if args.no_cache else ResultCache(args.cache)
+    start = time.perf_counter()
+    data_sheet = extend_data_sheet(data_sheet, args.axis, new_values, params=params,
+                                   batch_size=args.batch_size, output_dir=args.store, cache=cache,
+                                   workers=args.workers, threads=args.threads, dtype=args.dtype,
+                                   symmetry=not args.no_symmetry, scale_invariance=not args.no_scale_invariance)
+    print(f"延伸完成，耗時 {time.perf_counter() - start:.2f} s")
+    if cache is not None:
+        print(cache.stats())
+        cache.close()
+    if TIMER.enabled:
+        print(TIMER.report())
+    save_data_sheet(args.output, data_sheet, codec=args.codec)
+    if args.mat is not None:
+        export_mat(data_sheet, args.mat)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless RCWA batch calculation")
+    parser.add_argument("spec", nargs="?", default=None, help="掃描設定檔 (.json 或 .toml)")
+    parser.add_argument("-o", "--output", default="data_sheet.rcwad", help="輸出檔 (.rcwad、.mat 或 .npy)")
+    parser.add_argument("--mat", default=None, help="另外匯出一份 .mat")
+    parser.add_argument("--codec", default="zlib:1", help=".rcwad 的壓縮方式：none、zlib[:level]、bz2[:level]、lzma[:preset]；加上 q<bits>+ 前綴 (例如 q16+zlib:6) 則以有誤差上限的量化壓縮複數陣列")
+    parser.add_argument("--batch-size", type=int, default=None, help="每批寫入的點數 (預設取本機調校設定，否則 64)")
+    parser.add_argument("--workers", type=int, default=None, help="平行求解的 process 數 (預設取本機調校設定，否則 1)")
+    parser.add_argument("--threads", type=int, default=None, help="每個 process 的 torch 執行緒數 (預設取本機調校設定)")
+    parser.add_argument("--dtype", default=None, choices=["complex64", "complex128"], help="求解精度 (預設取本機調校設定，否則 complex64)")
+    parser.add_argument("--no-symmetry", action="store_true", help="不以對稱性合併等價的點 (每個點都實際求解)")
+    parser.add_argument("--no-scale-invariance", action="store_true",
+                        help="材料在波段內平坦時也不以尺度不變性合併等比例的 (波長, 週期, 厚度, 尺寸)")
+    parser.add_argument("--order", default=None, help="迴圈順序，由外到內以逗號分隔，例如 Theta,Wavelength,...")
+    parser.add_argument("--report-every", type=int, default=100, help="每幾個點印一次進度")
+    parser.add_argument("--store", default=None, help="結果直接串流寫入此目錄下的 memmap (.npy)，記憶體用量與掃描大小無關")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FILE, help="結果快取 (sqlite) 的位置")
+    parser.add_argument("--no-cache", action="store_true", help="不使用結果快取")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint 檔 (.npz)，掃描中定期存檔")
+    parser.add_argument("--checkpoint-every", type=int, default=500, help="每幾個點存一次 checkpoint")
+    parser.add_argument("--checkpoint-seconds", type=float, default=300., help="每幾秒存一次 checkpoint")
+    parser.add_argument("--resume", action="store_true", help="從 --checkpoint 恢復，跳過已算完的點")
+    parser.add_argument("--timing", action="store_true", help="記錄各求解階段的耗時並在結束時印出摘要 (同 RCWA_TIMING=1)")
+    parser.add_argument("--timing-log", default=None, help="逐點把各階段耗時寫成 JSON lines (同 RCWA_TIMING_LOG)")
+    parser.add_argument("--profile", default=None, metavar="START:COUNT",
+                        help="以 torch.profiler 與 cProfile 剖析走訪到的第 START 點起的 COUNT 個點 (含剔除、合併與快取命中的點；同 RCWA_PROFILE)")
+    parser.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR, help="剖析結果 (.trace.json / .pstats) 的輸出目錄")
+    parser.add_argument("--calibration-points", type=int, default=3, help="估計 ETA 時實際求解的點數 (0 不校準)")
+    parser.add_argument("--estimate", action="store_true", help="只印出點數、記憶體與 ETA 估計，不執行掃描")
+    parser.add_argument("--force", action="store_true", help="估計超過可用記憶體時仍然執行")
+    parser.add_argument("--adaptive", action="store_true", help="自適應細分取樣：設定檔的 N 為粗網格點數，只細分變化劇烈的區域")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="--adaptive 的穿透率容許誤差")
+    parser.add_argument("--phase-tolerance", type=float, default=0.05, help="--adaptive 的相位容許誤差 (rad)")
+    parser.add_argument("--max-level", type=int, default=4, help="--adaptive 的最大細分層數")
+    parser.add_argument("--max-points", type=int, default=None, help="--adaptive 的求解點數上限")
+    parser.add_argument("--sobol", type=int, default=None, metavar="N", help="準隨機取樣：在各掃描軸的 [min, max] 內取 N 個 Sobol 點")
+    parser.add_argument("--lhs", type=int, default=None, metavar="N", help="準隨機取樣：在各掃描軸的 [min, max] 內取 N 個 Latin hypercube 點")
+    parser.add_argument("--seed", type=int, default=None, help="--sobol / --lhs 的亂數種子 (固定種子可重現取樣點)")
+    parser.add_argument("--to-grid", default=None, help="把 scattered 資料集 (.rcwad) 內插成網格資料集，存到 -o")
+    parser.add_argument("--extend", default=None, help="延伸既有的 data_sheet (.rcwad 或 .npy)，只計算新增的數值；沒有 Parameters 的舊版 .npy 需另給設定檔")
+    parser.add_argument("--axis", default=None, help="--extend 要延伸的掃描軸，例如 Wavelength、Wx、Theta")
+    parser.add_argument("--range", nargs=3, type=float, metavar=("MIN", "MAX", "N"), help="--extend 新增的數值 (linspace)")
+    parser.add_argument("--values", default=None, help="--extend 新增的數值，以逗號分隔")
+    args = parser.parse_args(argv)
+    if args.timing or args.timing_log:
+        TIMER.enable(args.timing_log)
+
+    if args.to_grid:
+        save_data_sheet(args.output, to_grid(load_data_sheet(args.to_grid)), codec=args.codec)
+        return
+    if args.extend:
+        if not args.axis or (args.range is None and args.values is None):
+            parser.error("--extend 需要 --axis 以及 --range 或 --values")
+        extend(args)
+        return
+    if args.spec is None:
+        parser.error("需要掃描設定檔")
+    params = load_spec(args.spec)
+    order = args.order.split(",") if args.order else None
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = Checkpoint(args.checkpoint, every_points=args.checkpoint_every, every_seconds=args.checkpoint_seconds)
+        if not args.resume:
+            checkpoint.clear()
+    elif args.resume:
+        parser.error("--resume 需要搭配 --checkpoint")
+    if args.sobol is not None and args.lhs is not None:
+        parser.error("--sobol 與 --lhs 只能擇一")
+    cache = None if args.no_cache else ResultCache(args.cache)
+    if args.sobol is not None or args.lhs is not None:
+        method, samples = ("sobol", args.sobol) if args.sobol is not None else ("lhs", args.lhs)
+        run_sampled(params, samples, method=method, seed=args.seed, output=args.output,
+                    report_every=args.report_every, mat=args.mat, codec=args.codec, batch_size=args.batch_size,
+                    cache=cache, workers=args.workers, threads=args.threads, dtype=args.dtype,
+                    symmetry=not args.no_symmetry, scale_invariance=not args.no_scale_invariance)
+        if cache is not None:
+            cache.close()
+        return
+    if args.adaptive:
+        run_adaptive(params, output=args.output, transmission_tol=args.tolerance, phase_tol=args.phase_tolerance,
+                     max_level=args.max_level, max_points=args.max_points, report_every=args.report_every,
+                     mat=args.mat, codec=args.codec, batch_size=args.batch_size, cache=cache,
+                     workers=args.workers, threads=args.threads, dtype=args.dtype,
+                     symmetry=not args.no_symmetry, scale_invariance=not args.no_scale_invariance)
+        if cache is not None:
+            cache.close()
+        return
+    run(params, output=args.output, batch_size=args.batch_size, order=order,
+        report_every=args.report_every, checkpoint=checkpoint, output_dir=args.store, cache=cache, mat=args.mat, codec=args.codec,
+        profile=parse_window(args.profile) if args.profile else None, profile_dir=args.profile_dir,
+        calibration_points=args.calibration_points, force=args.force, estimate_only=args.estimate,
+        workers=args.workers, threads=args.threads, dtype=args.dtype, symmetry=not args.no_symmetry,
+        scale_invariance=not args.no_scale_invariance)
+    if cache is not None:
+        cache.close()
+    TIMER.close_log()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,38 @@
+"""
+以已存的資料集 (網格或 scattered 的 .rcwad / .npy) 訓練代理模型 (Surrogate)，印出 holdout 誤差並存成 .pt。
+
+    python train_surrogate.py result.rcwad -o result.surrogate.pt
+    python train_surrogate.py sobol.rcwad -o sobol.surrogate.pt --members 8 --hidden 128 --steps 20000
+"""
+import argparse
+
+from DataIO import load_data_sheet
+from Surrogate import Surrogate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="訓練 Jones 矩陣的代理模型")
+    parser.add_argument("data", help="資料集 (.rcwad 或 .npy)")
+    parser.add_argument("-o", "--output", default="surrogate.pt", help="輸出的模型檔")
+    parser.add_argument("--holdout", type=float, default=0.1, help="不參與訓練、用來評估誤差的點比例")
+    parser.add_argument("--hidden", type=int, default=64, help="每層的神經元數")
+    parser.add_argument("--layers", type=int, default=3, help="隱藏層數")
+    parser.add_argument("--members", type=int, default=4, help="ensemble 的成員數 (不確定度由成員間的離散度估計)")
+    parser.add_argument("--steps", type=int, default=5000, help="訓練步數")
+    parser.add_argument("--batch-size", type=int, default=512, help="mini-batch 大小")
+    parser.add_argument("--learning-rate", type=float, default=3e-3, help="最大學習率 (one-cycle)")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子 (初始化、holdout 分割)")
+    args = parser.parse_args(argv)
+
+    surrogate = Surrogate.train(load_data_sheet(args.data), holdout=args.holdout, hidden=args.hidden,
+                                layers=args.layers, members=args.members, steps=args.steps,
+                                batch_size=args.batch_size, learning_rate=args.learning_rate, seed=args.seed,
+                                log_every=max(1, args.steps // 10))
+    for name, value in surrogate.report.items():
+        print(f"{name}: {value:.4g}" if isinstance(value, float) else f"{name}: {value}")
+    surrogate.save(args.output)
+    print(f"模型已存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
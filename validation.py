@@ -0,0 +1,369 @@
+"""
+數值回歸驗證：確保求解器的加速修改沒有悄悄改變結果。
+  - golden：固定的一組 meta-atom (8 種形狀 x 材料 x harmonic order) 與儲存的複數 Jones 矩陣 (golden_jones.json)
+  - energy：無損耗結構在只有 0 階傳播時，穿透 + 反射功率 = 1
+  - reciprocity：反向入射的穿透 Jones 矩陣等於正向的轉置
+  - slab：均勻薄膜 (經由 slab 層與經由 FFT/Toeplitz 的圖案層兩條路徑) 與 Fresnel/Airy 公式比較
+  - extend：沿軸延伸的資料集 (含舊格式 transmission / phase) 與直接掃描聯集軸的結果相同
+  - library：PhaseLibrary.nearest 以某個 atom 自己的 t 查詢時回傳該 atom (新舊格式皆同)
+  - interpolation：GridInterpolator 在格點上 (linear / cubic) 重現格點的值
+  - surrogate：代理模型在訓練點上的誤差有上限，存檔再讀回的預測不變；舊格式的訓練資料與新格式相同
+  - compare：向量化比較兩個掃描資料集，回報最大振幅與相位偏差
+
+    python validation.py check                     # golden + 物理檢查，失敗時結束碼 1
+    python validation.py record                    # 以目前的求解器重新產生 golden_jones.json
+    python validation.py compare fast.rcwad reference.rcwad
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import torch
+
+import Materials
+from RCWA import RCWA
+from SweepEngine import SweepEngine, Axis, axis_specs, solve_point, data_sheet_axes, extend_data_sheet
+from DataIO import load_data_sheet
+from Pruning import thin_film_transmission
+from Jones import sheet_jones, jones_to_channels, channel_amplitudes
+from PhaseLibrary import PhaseLibrary
+from Interpolation import GridInterpolator, query_points
+from Surrogate import Surrogate, training_data
+from benchmark import BASE_KWARGS, SHAPE_KWARGS
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_jones.json")
+GOLDEN_MATERIALS = ["aSiH.txt", "SiN.txt"]
+GOLDEN_ORDERS = [3, 7]
+
+# complex64 求解在不同機器 / BLAS 間的捨入差異遠小於此
+AMP_TOL = 1e-4
+PHASE_TOL = 1e-3
+# 振幅低於此值時相位沒有意義，不列入相位偏差
+AMP_FLOOR = 1e-3
+
+# 無損耗、只有 0 階傳播 (period < wavelength / n_substrate) 的物理檢查條件
+LOSSLESS_KWARGS = dict(BASE_KWARGS, wavelength=1200., period=500., metasurface_material="SiN.txt")
+PHYSICS_TOL = {"complex64": 1e-3, "complex128": 1e-8}
+# 資料集層級檢查用的小掃描 (circle、N=3，只有 R 軸變化)；同一個求解器的結果只差 complex64 的捨入
+SWEEP_PARAMS = dict(BASE_KWARGS, shape_type="circle", harmonic_order=3, device="cpu")
+DATASET_TOL = 1e-5
+# 小型代理模型 (固定種子、1000 步) 在 16 個訓練點上的 |ΔJ| RMS 上限
+SURROGATE_TOL = 0.05
+
+
+def golden_cases():
+    """回傳 [(name, kwargs)]：golden 參考點的求解參數。"""
+    cases = []
+    for shape_type, shape_kwargs in SHAPE_KWARGS.items():
+        for material in GOLDEN_MATERIALS:
+            for order in GOLDEN_ORDERS:
+                kwargs = dict(BASE_KWARGS, **shape_kwargs, shape_type=shape_type,
+                              metasurface_material=material, harmonic_order=order)
+                cases.append((f"{shape_type}/{os.path.splitext(material)[0]}/N{order}", kwargs))
+    return cases
+
+
+def jones_deviation(a, b, amp_floor=AMP_FLOOR):
+    """
+    逐元素比較兩組複數係數，回傳 (振幅偏差, 相位偏差)；
+    相位偏差取 [-pi, pi] 內的絕對值，任一邊振幅低於 amp_floor 的元素相位偏差記為 0。
+    """
+    a = np.asarray(a)
+    b = np.asarray(b)
+    amp_a = np.abs(a)
+    amp_b = np.abs(b)
+    phase = np.abs(np.angle(a * np.conj(b)))
+    phase[np.minimum(amp_a, amp_b) < amp_floor] = 0.
+    return np.abs(amp_a - amp_b), phase
+
+
+def _jones_to_json(jones):
+    return [[[float(v.real), float(v.imag)] for v in row] for row in np.asarray(jones)]
+
+
+def _jones_from_json(rows):
+    return np.array([[complex(re, im) for re, im in row] for row in rows])
+
+
+def record_golden(file_path=GOLDEN_FILE):
+    """以目前的求解器 (預設的 complex64 路徑) 產生 golden 檔。"""
+    cases = []
+    for name, kwargs in golden_cases():
+        jones = solve_point(dict(kwargs, device=torch.device("cpu")))
+        cases.append({"name": name, "kwargs": kwargs, "jones": _jones_to_json(jones)})
+        print(f"recorded {name}", file=sys.stderr)
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump({"amp_tol": AMP_TOL, "phase_tol": PHASE_TOL, "cases": cases}, f, indent=1)
+    print(f"{len(cases)} golden cases saved to {file_path}")
+
+
+def check_golden(file_path=GOLDEN_FILE, amp_tol=None, phase_tol=None):
+    """重新計算每個 golden 點，回傳 [(name, 振幅偏差, 相位偏差, 是否通過)]。"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    amp_tol = golden["amp_tol"] if amp_tol is None else amp_tol
+    phase_tol = golden["phase_tol"] if phase_tol is None else phase_tol
+    results = []
+    for case in golden["cases"]:
+        jones = solve_point(dict(case["kwargs"], device=torch.device("cpu")))
+        amp, phase = jones_deviation(jones, _jones_from_json(case["jones"]))
+        results.append((case["name"], float(amp.max()), float(phase.max()),
+                        bool(amp.max() <= amp_tol and phase.max() <= phase_tol)))
+    return results
+
+
+def _zero_order(sim, direction, port):
+    """0 階、xy 偏振的 2x2 S 參數矩陣 [[xx, xy], [yx, yy]] (列為輸出、行為輸入偏振)。"""
+    return np.array([
+        [complex(sim.S_parameters(orders=[0, 0], direction=direction, port=port,
+                                  polarization=out_pol + in_pol, ref_order=[0, 0]))
+         for in_pol in "xy"]
+        for out_pol in "xy"
+    ])
+
+
+def check_energy_reciprocity(dtype_name="complex64", order=5):
+    """
+    對每種形狀的無損耗結構回傳 [(name, 能量誤差, 互易性誤差)]：
+      能量誤差 = max |1 - (|t|^2 + |r|^2) 對輸出偏振求和|
+      互易性誤差 = max |t_backward - t_forward^T|
+    """
+    dtype = torch.complex64 if dtype_name == "complex64" else torch.complex128
+    results = []
+    for shape_type, shape_kwargs in SHAPE_KWARGS.items():
+        kwargs = dict(LOSSLESS_KWARGS, **shape_kwargs, shape_type=shape_type, harmonic_order=order, dtype=dtype)
+        sim = RCWA(**kwargs).solve()
+        t = _zero_order(sim, "forward", "transmission")
+        r = _zero_order(sim, "forward", "reflection")
+        power = (np.abs(t)**2 + np.abs(r)**2).sum(axis=0)
+        t_backward = _zero_order(sim, "backward", "transmission")
+        results.append((shape_type, float(np.abs(1. - power).max()), float(np.abs(t_backward - t.T).max())))
+    return results
+
+
+def check_slab(dtype_name="complex64", order=3, thickness=300.):
+    """
+    均勻 SiN 薄膜與 Airy 公式比較，回傳 [(路徑, txx 誤差, 交叉偏振大小)]。
+    路徑 slab：薄膜放在 slab 層；路徑 patterned：圖案層的柱體與填充為同一材料 (經過 FFT/Toeplitz)。
+    """
+    dtype = torch.complex64 if dtype_name == "complex64" else torch.complex128
+    wavelength = LOSSLESS_KWARGS["wavelength"]
+    lamb0 = torch.tensor(wavelength, dtype=torch.float64)
+    indices = [complex(Materials.Material.forward(wavelength=lamb0, name=name)) for name in
+               (LOSSLESS_KWARGS["substrate_material"], "SiN.txt", LOSSLESS_KWARGS["output_material"])]
+    expected = thin_film_transmission(indices, [thickness], wavelength)
+    paths = {
+        "slab": dict(slab_material="SiN.txt", slab_thickness=thickness, metasurface_thickness=0.),
+        "patterned": dict(filling_material="SiN.txt", metasurface_thickness=thickness),
+    }
+    results = []
+    for path, overrides in paths.items():
+        kwargs = dict(LOSSLESS_KWARGS, **SHAPE_KWARGS["rectangle"], **overrides,
+                      shape_type="rectangle", harmonic_order=order, dtype=dtype)
+        t = _zero_order(RCWA(**kwargs).solve(), "forward", "transmission")
+        results.append((path, float(abs(t[0, 0] - expected)), float(abs(t[0, 1]))))
+    return results
+
+
+def small_sweep(dtype_name="complex64", **values):
+    """以 SWEEP_PARAMS 掃描一個小網格，values 為各軸的數值 (例如 R=[100., 140.])，其餘軸取 BASE_KWARGS。"""
+    axes = [Axis(key, param, name, np.atleast_1d(np.asarray(values.get(key, SWEEP_PARAMS.get(param)), dtype=float)))
+            for key, param, name in axis_specs(SWEEP_PARAMS["shape_type"])]
+    return SweepEngine(SWEEP_PARAMS, axes=axes, workers=1, dtype=dtype_name).run()
+
+
+def legacy_sheet(data_sheet):
+    """把 data_sheet 轉成 GUI 舊格式：只有 transmission / phase、沒有 Parameters。"""
+    transmission, phase = jones_to_channels(np.asarray(data_sheet["jones_tensor"]))
+    legacy = {key: value for key, value in data_sheet.items() if key not in ("jones_tensor", "Parameters")}
+    legacy.update(transmission_tensor=transmission, phase_tensor=phase)
+    return legacy
+
+
+def check_extend(dtype_name="complex64"):
+    """
+    R = [100, 140] 的資料集延伸 [120, 160] 後應與直接掃描 [100, 120, 140, 160] 相同；
+    舊格式 (只有 transmission / phase、沒有 Parameters) 的同一份資料以 params 延伸也要相同。
+    回傳 [(name, max |Δt|)]。
+    """
+    reference = np.asarray(small_sweep(dtype_name, R=[100., 120., 140., 160.])["jones_tensor"])
+    base = small_sweep(dtype_name, R=[100., 140.])
+    results = []
+    for name, sheet, params in (("jones", base, None), ("legacy", legacy_sheet(base), SWEEP_PARAMS)):
+        extended = extend_data_sheet(sheet, "R", [120., 160.], params=params, workers=1, dtype=dtype_name)
+        results.append((name, float(np.abs(np.asarray(extended["jones_tensor"]) - reference).max())))
+    return results
+
+
+def check_phase_library(dtype_name="complex64", channel=0):
+    """以每個 atom 自己的複數穿透係數查詢 nearest，回傳 [(格式, 找錯的 atom 數)]。"""
+    sheet = small_sweep(dtype_name, R=np.linspace(60., 200., 8))
+    t = channel_amplitudes(np.asarray(sheet["jones_tensor"]).reshape(-1, 2, 2), channel)
+    results = []
+    for name, library_sheet in (("jones", sheet), ("legacy", legacy_sheet(sheet))):
+        atoms, _ = PhaseLibrary.from_data_sheet(library_sheet).nearest(t, channel=channel)
+        results.append((name, int(np.count_nonzero(atoms != np.arange(len(t))))))
+    return results
+
+
+def check_interpolation(dtype_name="complex64"):
+    """在 (Wavelength, R) 網格的格點上內插，回傳 [(method/格式, max |Δt|)]。"""
+    sheet = small_sweep(dtype_name, Wavelength=[900., 940., 980., 1020.], R=[80., 120., 160., 200.])
+    wavelength, r = np.meshgrid(sheet["Wavelength"], sheet["R"], indexing="ij")
+    points = query_points(sheet, Wavelength=wavelength, R=r)
+    reference = np.asarray(sheet["jones_tensor"]).reshape(-1, 2, 2)
+    results = []
+    for name, interpolation_sheet in (("jones", sheet), ("legacy", legacy_sheet(sheet))):
+        for method in ("linear", "cubic"):
+            jones = GridInterpolator(interpolation_sheet, method=method)(points)
+            results.append((f"{method}/{name}", float(np.abs(jones - reference).max())))
+    return results
+
+
+def check_surrogate(dtype_name="complex64", steps=1000):
+    """
+    以 16 個 R 的小掃描訓練代理模型，回傳 [(name, 數值, 上限)]：舊格式與新格式訓練資料的差、
+    訓練點上的 |ΔJ| RMS，以及存檔再讀回後預測的差。
+    """
+    sheet = small_sweep(dtype_name, R=np.linspace(60., 200., 16))
+    points, jones = training_data(sheet)
+    _, legacy_jones = training_data(legacy_sheet(sheet))
+    surrogate = Surrogate.train(sheet, holdout=0., hidden=32, members=2, steps=steps)
+    predicted, _ = surrogate.predict(points)
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "surrogate.pt")
+        surrogate.save(file_path)
+        reloaded, _ = Surrogate.load(file_path).predict(points)
+    return [
+        ("legacy training data", float(np.abs(legacy_jones - jones).max()), DATASET_TOL),
+        ("train rmse", surrogate.evaluate(points, jones)["jones_rmse"], SURROGATE_TOL),
+        ("save/load", float(np.abs(reloaded - predicted).max()), 0.),
+    ]
+
+
+def compare_datasets(a, b, amp_floor=AMP_FLOOR, chunk_points=1 << 20):
+    """
+    比較兩個掃描資料集 (data_sheet 或檔名)，沿第一個掃描軸分塊向量化計算，
+    回傳 {"max_amp", "max_phase", "amp_at", "phase_at", "elements"}：
+    *_at 為最大偏差所在點的各軸數值，elements 為各 Jones 元素各自的最大偏差。
+    舊格式 (只有 transmission / phase) 的資料集以 sheet_jones 重建 Jones 矩陣後比較。
+    兩者的 shape_type 與掃描軸數值必須相同。
+    """
+    sheet_a = load_data_sheet(a) if isinstance(a, str) else a
+    sheet_b = load_data_sheet(b) if isinstance(b, str) else b
+    if sheet_a["shape_type"] != sheet_b["shape_type"]:
+        raise ValueError(f"shape_type 不同: {sheet_a['shape_type']} / {sheet_b['shape_type']}")
+    axes = data_sheet_axes(sheet_a)
+    for axis, other in zip(axes, data_sheet_axes(sheet_b)):
+        if axis.values.shape != other.values.shape or not np.allclose(axis.values, other.values):
+            raise ValueError(f"掃描軸 {axis.key} 的數值不同，無法逐點比較")
+
+    jones_a = sheet_jones(sheet_a)
+    jones_b = sheet_jones(sheet_b)
+    names = ["txx", "txy", "tyx", "tyy"]
+    element_shape = (2, 2)
+
+    shape = tuple(len(axis.values) for axis in axes)
+    step = max(1, chunk_points // max(1, int(np.prod(shape[1:]))))
+    best = {"amp": (-1., None), "phase": (-1., None)}
+    element_max = {"amp": np.zeros(element_shape), "phase": np.zeros(element_shape)}
+    for start in range(0, shape[0], step):
+        stop = min(start + step, shape[0])
+        block_a = np.asarray(jones_a[start:stop])
+        block_b = np.asarray(jones_b[start:stop])
+        deviations = dict(zip(("amp", "phase"), jones_deviation(block_a, block_b, amp_floor)))
+        for key, deviation in deviations.items():
+            element_max[key] = np.maximum(element_max[key], deviation.reshape((-1,) + element_shape).max(axis=0))
+            flat = int(np.argmax(deviation))
+            if deviation.flat[flat] > best[key][0]:
+                index = np.unravel_index(flat, deviation.shape)
+                best[key] = (float(deviation.flat[flat]), (index[0] + start,) + index[1:len(shape)])
+
+    def location(index):
+        return {axis.key: float(axis.values[i]) for axis, i in zip(axes, index)}
+
+    return {
+        "max_amp": best["amp"][0],
+        "max_phase": best["phase"][0],
+        "amp_at": location(best["amp"][1]),
+        "phase_at": location(best["phase"][1]),
+        "elements": {
+            name: {"amp": float(amp), "phase": float(phase)}
+            for name, amp, phase in zip(names, element_max["amp"].ravel(), element_max["phase"].ravel())
+        },
+    }
+
+
+def run_checks(golden_file=GOLDEN_FILE, dtype_name="complex64"):
+    """執行 golden 與物理檢查並印出結果，全部通過時回傳 True。"""
+    ok = True
+    tol = PHYSICS_TOL[dtype_name]
+    if os.path.exists(golden_file):
+        for name, amp, phase, passed in check_golden(golden_file):
+            ok &= passed
+            print(f"{'ok  ' if passed else 'FAIL'} golden {name}: amp {amp:.2e}, phase {phase:.2e} rad")
+    else:
+        print(f"找不到 {golden_file}，略過 golden 檢查 (先執行 validation.py record)")
+    for name, energy, reciprocity in check_energy_reciprocity(dtype_name):
+        passed = energy <= tol and reciprocity <= tol
+        ok &= passed
+        print(f"{'ok  ' if passed else 'FAIL'} energy/reciprocity {name}: "
+              f"|1-(T+R)| {energy:.2e}, |t_b - t_f^T| {reciprocity:.2e}")
+    for path, error, cross in check_slab(dtype_name):
+        passed = error <= tol and cross <= tol
+        ok &= passed
+        print(f"{'ok  ' if passed else 'FAIL'} Airy slab ({path}): |t - t_airy| {error:.2e}, |txy| {cross:.2e}")
+    for name, error in check_extend(dtype_name):
+        passed = error <= DATASET_TOL
+        ok &= passed
+        print(f"{'ok  ' if passed else 'FAIL'} extend ({name}): |t - t_full| {error:.2e}")
+    for name, wrong in check_phase_library(dtype_name):
+        ok &= wrong == 0
+        print(f"{'ok  ' if wrong == 0 else 'FAIL'} library nearest ({name}): {wrong} atoms mismatched")
+    for name, error in check_interpolation(dtype_name):
+        passed = error <= DATASET_TOL
+        ok &= passed
+        print(f"{'ok  ' if passed else 'FAIL'} interpolation on nodes ({name}): |t - t_node| {error:.2e}")
+    for name, value, limit in check_surrogate(dtype_name):
+        passed = value <= limit
+        ok &= passed
+        print(f"{'ok  ' if passed else 'FAIL'} surrogate {name}: {value:.2e} (<= {limit:.0e})")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RCWA numerical regression harness")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    check = subparsers.add_parser("check", help="golden 參考點與能量守恆、互易性、Airy 薄膜與資料集檢查")
+    check.add_argument("--golden", default=GOLDEN_FILE)
+    check.add_argument("--dtype", default="complex64", choices=sorted(PHYSICS_TOL), help="物理檢查的求解精度")
+    record = subparsers.add_parser("record", help="以目前的求解器重新產生 golden 檔")
+    record.add_argument("--golden", default=GOLDEN_FILE)
+    compare = subparsers.add_parser("compare", help="比較兩個掃描資料集")
+    compare.add_argument("a")
+    compare.add_argument("b")
+    compare.add_argument("--amp-tol", type=float, default=None, help="超過時結束碼為 1")
+    compare.add_argument("--phase-tol", type=float, default=None, help="超過時結束碼為 1 (rad)")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        record_golden(args.golden)
+        return 0
+    if args.command == "check":
+        return 0 if run_checks(args.golden, args.dtype) else 1
+
+    report = compare_datasets(args.a, args.b)
+    print(f"max amplitude deviation {report['max_amp']:.3e} at {report['amp_at']}")
+    print(f"max phase deviation {report['max_phase']:.3e} rad at {report['phase_at']}")
+    for name, element in report["elements"].items():
+        print(f"  {name}: amp {element['amp']:.3e}, phase {element['phase']:.3e} rad")
+    failed = ((args.amp_tol is not None and report["max_amp"] > args.amp_tol) or
+              (args.phase_tol is not None and report["max_phase"] > args.phase_tol))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())